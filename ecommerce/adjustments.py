@@ -0,0 +1,104 @@
+"""
+Set-based bulk adjustments of product price, stock and visibility.
+
+Each adjustment runs as ``UPDATE ... SET col = F(col) ...`` over chunks of
+primary keys, one transaction per chunk, so large repricings never hold a
+long write lock and never load model instances.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F, Value, DecimalField, IntegerField
+from django.db.models.functions import Greatest, Round
+from django.utils import timezone
+
+from .inventory import absorb_stock_edits
+from .models import Product
+from .signals import products_changed
+
+
+CHUNK_SIZE = 5000
+
+
+def filter_products(queryset, filters):
+    """Narrow a product queryset by the scope filters of a bulk adjustment"""
+    if filters.get('ids'):
+        queryset = queryset.filter(pk__in=filters['ids'])
+    if filters.get('skus'):
+        queryset = queryset.filter(sku__in=filters['skus'])
+    if filters.get('category') is not None:
+        queryset = queryset.filter(category_id=filters['category'])
+    if filters.get('category_name'):
+        queryset = queryset.filter(category__name=filters['category_name'])
+    if filters.get('is_active') is not None:
+        queryset = queryset.filter(is_active=filters['is_active'])
+    if filters.get('search'):
+        queryset = queryset.filter(name__icontains=filters['search'])
+    if filters.get('min_price') is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters.get('max_price') is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters.get('max_stock') is not None:
+        queryset = queryset.filter(stock__lte=filters['max_stock'])
+    return queryset
+
+
+def build_updates(price_percent=None, price_amount=None, stock_set=None,
+                  stock_delta=None, is_active=None):
+    """Translate an adjustment into ``update()`` keyword expressions"""
+    price_field = DecimalField(max_digits=10, decimal_places=2)
+    updates = {}
+    if price_percent is not None:
+        factor = Decimal(1) + Decimal(price_percent) / Decimal(100)
+        updates['price'] = Greatest(
+            Round(F('price') * Value(factor, output_field=price_field), 2, output_field=price_field),
+            Value(Decimal('0.00'), output_field=price_field),
+        )
+    elif price_amount is not None:
+        updates['price'] = Greatest(
+            F('price') + Value(Decimal(price_amount), output_field=price_field),
+            Value(Decimal('0.00'), output_field=price_field),
+        )
+    if stock_set is not None:
+        updates['stock'] = Value(max(int(stock_set), 0), output_field=IntegerField())
+    elif stock_delta is not None:
+        updates['stock'] = Greatest(F('stock') + int(stock_delta), 0)
+    if is_active is not None:
+        updates['is_active'] = bool(is_active)
+    return updates
+
+
+def iter_pk_chunks(queryset, chunk_size=CHUNK_SIZE):
+    """Yield lists of primary keys in ascending order using keyset pagination"""
+    last_pk = 0
+    queryset = queryset.order_by('pk').values_list('pk', flat=True)
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def adjust_products(queryset, chunk_size=CHUNK_SIZE, **adjustment):
+    """
+    Apply a bulk adjustment to every product in ``queryset``.
+    Returns the number of rows updated.
+    """
+    updates = build_updates(**adjustment)
+    if not updates:
+        return 0
+
+    affected = 0
+    for pks in iter_pk_chunks(queryset, chunk_size):
+        with transaction.atomic():
+            # update() skips auto_now; bumping updated_at makes carts reprice
+            affected += Product.objects.filter(pk__in=pks).update(
+                updated_at=timezone.now(), **updates
+            )
+            if 'stock' in updates:
+                absorb_stock_edits(pks)
+            transaction.on_commit(
+                lambda pks=pks: products_changed.send(sender=Product, pks=pks)
+            )
+    return affected
@@ -1,5 +1,78 @@
-from django.contrib import admin
-from .models import Category, Product, Order, OrderItem
+import json
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.admin.options import get_content_type_for_model
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections, transaction
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.functional import cached_property
+from rest_framework.exceptions import ValidationError
+from .models import (
+    Category, Product, Promotion, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Cart, CartItem, Job,
+    ProductEvent, RevokedToken, Warehouse, WarehouseStock,
+)
+from .adjustments import adjust_products
+from .inventory import absorb_stock_edits, refresh_totals
+from .serializers import BulkAdjustSerializer
+from .signals import products_changed
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that estimates the row count of unfiltered querysets on large
+    tables instead of running an exact COUNT(*) over the whole table on
+    every page view.
+    Filtered querysets (search, list filters, date drilldown) are counted exactly.
+    """
+    estimate_threshold = 100000
+    
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset)
+            if estimate is not None and estimate > self.estimate_threshold:
+                return estimate
+        return super().count
+
+
+# How stale the changelist's whole-table count may be on SQLite and MySQL
+ROW_COUNT_CACHE_SECONDS = 60
+
+
+def estimate_row_count(queryset):
+    """Cheap row count estimate for a whole table, or None if unavailable"""
+    model = queryset.model
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class WHERE relname = %s',
+                [model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return row[0] if row and row[0] >= 0 else None
+    if connection.vendor in ('sqlite', 'mysql'):
+        # No maintained row estimate here (MAX(pk) overstates after bulk
+        # deletes such as archive_orders): count exactly, at most once per
+        # ROW_COUNT_CACHE_SECONDS per table
+        key = f'admin-row-count:{queryset.db}:{model._meta.db_table}'
+        count = cache.get(key)
+        if count is None:
+            count = model._default_manager.using(queryset.db).count()
+            cache.set(key, count, ROW_COUNT_CACHE_SECONDS)
+        return count
+    return None
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist defaults for tables that may hold millions of rows"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
 
 @admin.register(Category)
@@ -8,22 +81,70 @@ class CategoryAdmin(admin.ModelAdmin):
     search_fields = ['name', 'description']
     list_filter = ['created_at']
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(products_count=Count('products'))
+    
     def get_products_count(self, obj):
-        return obj.products.count()
+        return obj.products_count
     get_products_count.short_description = 'Products Count'
+    get_products_count.admin_order_field = 'products_count'
+
+
+class ProductActionForm(ActionForm):
+    value = forms.CharField(
+        required=False,
+        label='Value',
+        help_text='Percentage, amount or quantity for the adjustment actions'
+    )
+
+
+def _bulk_adjust_action(label, argument):
+    """Build an admin action running a set-based adjustment with the action form value"""
+    def action(modeladmin, request, queryset):
+        # Same limits as the API: finite, in range, within the column's digits
+        field = BulkAdjustSerializer().fields[argument]
+        try:
+            value = field.run_validation(request.POST.get('value', '').strip())
+        except ValidationError as exc:
+            modeladmin.message_user(request, f'{label}: {" ".join(exc.detail)}', messages.ERROR)
+            return
+        updated = adjust_products(queryset, **{argument: value})
+        modeladmin.message_user(request, f'{updated} products updated.', messages.SUCCESS)
+    action.__name__ = f'adjust_{argument}'
+    action.short_description = label
+    return action
+
+
+class WarehouseStockInline(admin.TabularInline):
+    model = WarehouseStock
+    extra = 0
+    fields = ['warehouse', 'quantity', 'updated_at']
+    readonly_fields = ['updated_at']
 
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdmin):
     list_display = ['name', 'category', 'price', 'stock', 'is_active', 'created_at']
     list_filter = ['category', 'is_active', 'created_at']
-    search_fields = ['name', 'description']
+    search_fields = ['name', 'sku', 'description']
     list_editable = ['price', 'stock', 'is_active']
+    list_select_related = ['category']
+    autocomplete_fields = ['category']
     readonly_fields = ['created_at', 'updated_at']
+    inlines = [WarehouseStockInline]
+    action_form = ProductActionForm
+    actions = [
+        _bulk_adjust_action('Change price by percentage', 'price_percent'),
+        _bulk_adjust_action('Change price by amount', 'price_amount'),
+        _bulk_adjust_action('Set stock', 'stock_set'),
+        _bulk_adjust_action('Increase/decrease stock', 'stock_delta'),
+        'activate_products',
+        'deactivate_products',
+    ]
     
     fieldsets = (
         ('Basic Information', {
-            'fields': ('name', 'description', 'category')
+            'fields': ('name', 'sku', 'description', 'category')
         }),
         ('Pricing & Stock', {
             'fields': ('price', 'stock')
@@ -39,30 +160,142 @@ class ProductAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
     )
+    
+    def changelist_view(self, request, extra_context=None):
+        # list_editable saves are collected by save_model/log_change and
+        # written as one bulk UPDATE and one bulk INSERT of log entries
+        request._bulk_edits = {}
+        request._bulk_log = []
+        with transaction.atomic():
+            response = super().changelist_view(request, extra_context)
+            edits = request._bulk_edits
+            if edits:
+                fields = set()
+                for _, changed in edits.values():
+                    fields.update(changed)
+                Product.objects.bulk_update(
+                    [obj for obj, _ in edits.values()],
+                    sorted(fields) + ['updated_at'],
+                    batch_size=500
+                )
+                LogEntry.objects.bulk_create(request._bulk_log)
+                absorb_stock_edits([pk for pk, (_, changed) in edits.items() if 'stock' in changed])
+                pks = list(edits)
+                transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks))
+        return response
+    
+    @admin.action(description='Activate selected products')
+    def activate_products(self, request, queryset):
+        updated = adjust_products(queryset, is_active=True)
+        self.message_user(request, f'{updated} products activated.', messages.SUCCESS)
+    
+    @admin.action(description='Deactivate selected products')
+    def deactivate_products(self, request, queryset):
+        updated = adjust_products(queryset, is_active=False)
+        self.message_user(request, f'{updated} products deactivated.', messages.SUCCESS)
+    
+    def save_model(self, request, obj, form, change):
+        edits = getattr(request, '_bulk_edits', None)
+        if edits is None or not change:
+            return super().save_model(request, obj, form, change)
+        obj.updated_at = timezone.now()
+        edits[obj.pk] = (obj, form.changed_data)
+    
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        # Warehouse rows edited inline win over the stock field
+        if any(formset.has_changed() for formset in formsets):
+            pks = [form.instance.pk]
+            refresh_totals(pks)
+            transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks, fields=['stock']))
+    
+    def log_change(self, request, obj, message):
+        log = getattr(request, '_bulk_log', None)
+        if log is None:
+            return super().log_change(request, obj, message)
+        log.append(LogEntry(
+            user_id=request.user.pk,
+            content_type_id=get_content_type_for_model(obj).pk,
+            object_id=str(obj.pk),
+            object_repr=str(obj)[:200],
+            action_flag=CHANGE,
+            change_message=json.dumps(message) if isinstance(message, list) else message,
+        ))
+
+
+@admin.register(Warehouse)
+class WarehouseAdmin(admin.ModelAdmin):
+    list_display = ['code', 'name', 'priority', 'is_active', 'created_at']
+    list_editable = ['priority', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['code', 'name']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        # Product.stock only counts active warehouses
+        if change and 'is_active' in form.changed_data:
+            pks = list(WarehouseStock.objects.filter(warehouse=obj).values_list('product_id', flat=True))
+            refresh_totals(pks)
+            transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks, fields=['stock']))
+
+
+@admin.register(Promotion)
+class PromotionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'scope', 'kind', 'value', 'product', 'category', 'min_subtotal', 'starts_at', 'ends_at', 'is_active']
+    list_filter = ['scope', 'kind', 'is_active']
+    search_fields = ['name']
+    list_select_related = ['product', 'category']
+    autocomplete_fields = ['product', 'category']
+    date_hierarchy = 'starts_at'
+    
+    fieldsets = (
+        ('Discount', {
+            'fields': ('name', 'kind', 'value')
+        }),
+        ('Applies To', {
+            'fields': ('scope', 'product', 'category', 'min_subtotal')
+        }),
+        ('Schedule', {
+            'fields': ('starts_at', 'ends_at', 'is_active')
+        }),
+    )
 
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
-    readonly_fields = ['product', 'quantity', 'price', 'get_subtotal']
+    readonly_fields = ['product', 'quantity', 'price', 'get_subtotal', 'get_shipped_from']
     can_delete = False
     
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related('product').prefetch_related('allocations__warehouse')
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+    
     def get_subtotal(self, obj):
         return obj.subtotal
     get_subtotal.short_description = 'Subtotal'
+    
+    def get_shipped_from(self, obj):
+        return ', '.join(f'{allocation.quantity}x {allocation.warehouse.code}' for allocation in obj.allocations.all())
+    get_shipped_from.short_description = 'Shipped from'
 
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(LargeTableAdmin):
     list_display = ['id', 'user', 'status', 'total_amount', 'created_at']
-    list_filter = ['status', 'created_at']
+    list_filter = ['status']
+    date_hierarchy = 'created_at'
     search_fields = ['user__username', 'user__email', 'shipping_address']
-    readonly_fields = ['total_amount', 'created_at', 'updated_at']
+    list_select_related = ['user']
+    autocomplete_fields = ['user']
+    readonly_fields = ['total_amount', 'discount_amount', 'created_at', 'updated_at']
     inlines = [OrderItemInline]
     
     fieldsets = (
         ('Order Information', {
-            'fields': ('user', 'status', 'total_amount')
+            'fields': ('user', 'status', 'total_amount', 'discount_amount')
         }),
         ('Shipping Details', {
             'fields': ('shipping_address', 'phone_number')
@@ -75,12 +308,102 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(LargeTableAdmin):
     list_display = ['order', 'product', 'quantity', 'price', 'get_subtotal']
-    list_filter = ['order__created_at']
+    date_hierarchy = 'order__created_at'
     search_fields = ['order__id', 'product__name']
+    list_select_related = ['order__user', 'product']
+    raw_id_fields = ['order']
+    autocomplete_fields = ['product']
     readonly_fields = ['get_subtotal']
     
     def get_subtotal(self, obj):
         return obj.subtotal
-    get_subtotal.short_description = 'Subtotal'
\ No newline at end of file
+    get_subtotal.short_description = 'Subtotal'
+
+
+class ArchivedOrderItemInline(admin.TabularInline):
+    model = ArchivedOrderItem
+    fields = ['product', 'product_name', 'quantity', 'price']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+    
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedOrder)
+class ArchivedOrderAdmin(LargeTableAdmin):
+    """Read-only view of orders moved to the archive by archive_orders"""
+    list_display = ['id', 'user', 'status', 'total_amount', 'created_at', 'archived_at']
+    list_filter = ['status']
+    date_hierarchy = 'created_at'
+    search_fields = ['user__username', 'user__email', 'shipping_address']
+    list_select_related = ['user']
+    inlines = [ArchivedOrderItemInline]
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ProductEvent)
+class ProductEventAdmin(LargeTableAdmin):
+    """Read-only view of the append-only analytics counters"""
+    list_display = ['period_start', 'product_id', 'kind', 'count', 'sampled']
+    list_filter = ['kind', 'sampled']
+    date_hierarchy = 'period_start'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RevokedToken)
+class RevokedTokenAdmin(admin.ModelAdmin):
+    """Revoked refresh tokens; rows are deleted by purge_revoked_tokens once expired"""
+    list_display = ['jti', 'revoked_at', 'expires_at']
+    search_fields = ['jti']
+    date_hierarchy = 'revoked_at'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class CartItemInline(admin.TabularInline):
+    model = CartItem
+    extra = 0
+    readonly_fields = ['product', 'quantity', 'unit_price', 'priced_at']
+    can_delete = False
+
+
+@admin.register(Cart)
+class CartAdmin(admin.ModelAdmin):
+    list_display = ['user', 'item_count', 'subtotal', 'updated_at']
+    search_fields = ['user__username', 'user__email']
+    readonly_fields = ['user', 'subtotal', 'item_count', 'created_at', 'updated_at']
+    inlines = [CartItemInline]
+
+
+@admin.register(Job)
+class JobAdmin(LargeTableAdmin):
+    list_display = ['id', 'name', 'status', 'attempts', 'max_attempts', 'run_at', 'locked_by', 'updated_at']
+    list_filter = ['status', 'name']
+    search_fields = ['name', 'dedup_key']
+    readonly_fields = ['created_at', 'updated_at']
+    actions = ['retry_jobs']
+    
+    @admin.action(description='Retry selected jobs now')
+    def retry_jobs(self, request, queryset):
+        updated = queryset.exclude(status='running').update(
+            status='queued', run_at=timezone.now(), attempts=0, locked_until=None
+        )
+        self.message_user(request, f'{updated} jobs queued for retry.', messages.SUCCESS)
\ No newline at end of file
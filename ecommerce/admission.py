@@ -0,0 +1,266 @@
+"""
+Admission control with priority classes.
+
+Each worker process admits at most ``ADMISSION_CAPACITY`` requests at a
+time. Routes map to classes (``ADMISSION_ROUTES``); every class has its own
+concurrency ``limit``, a bounded wait ``queue`` and a queue ``timeout``, and
+higher-priority classes can hold ``reserved`` slots that lower classes never
+take, so checkout keeps capacity while browsing traffic spikes.
+
+Freed slots go to waiters in priority order, FIFO within a class. A request
+is shed with 503 straight away when its queue is full or when the expected
+wait (queue position times the class's recent service time) exceeds its
+timeout, rather than after waiting that long.
+
+Live gauges are per process; shed counts are also added to the shared cache
+so the admin endpoint sees every worker's.
+"""
+import asyncio
+import logging
+import math
+import re
+import threading
+from collections import deque
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger(__name__)
+
+SHED_REASONS = ('queue_full', 'deadline', 'timeout')
+# Weight of the newest request in the per-class service time average
+SERVICE_TIME_WEIGHT = 0.2
+INITIAL_SERVICE_TIME = 0.05
+
+
+class RouteClass:
+    def __init__(self, name, config):
+        self.name = name
+        self.priority = config['priority']
+        self.limit = config['limit']
+        self.queue = config['queue']
+        self.timeout = config['timeout']
+        self.reserved = config.get('reserved', 0)
+        self.in_flight = 0
+        self.waiters = deque()
+        self.service_time = INITIAL_SERVICE_TIME
+        self.admitted = 0
+        self.max_queue = 0
+        self.shed = dict.fromkeys(SHED_REASONS, 0)
+
+    def as_dict(self):
+        return {
+            'priority': self.priority,
+            'limit': self.limit,
+            'reserved': self.reserved,
+            'queue_limit': self.queue,
+            'timeout': self.timeout,
+            'in_flight': self.in_flight,
+            'queue_depth': len(self.waiters),
+            'max_queue_depth': self.max_queue,
+            'admitted': self.admitted,
+            'shed': dict(self.shed),
+            'service_ms': round(self.service_time * 1000, 1),
+        }
+
+
+class Waiter:
+    __slots__ = ('route_class', 'granted', 'event', 'loop', 'future')
+
+    def __init__(self, route_class, loop=None):
+        self.route_class = route_class
+        self.granted = False
+        self.loop = loop
+        self.event = threading.Event() if loop is None else None
+        self.future = loop.create_future() if loop is not None else None
+
+    def wake(self):
+        self.granted = True
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.resolve)
+
+    def resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Shed(Exception):
+    def __init__(self, route_class, reason, retry_after):
+        self.route_class = route_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Gate:
+    """Slots for one process, shared by its threads and its event loop"""
+
+    def __init__(self, capacity, classes):
+        self.capacity = capacity
+        self.classes = {name: RouteClass(name, config) for name, config in classes.items()}
+        self.ordered = sorted(self.classes.values(), key=lambda route_class: route_class.priority)
+        self.in_flight = 0
+        self.lock = threading.Lock()
+
+    def reserved_above(self, route_class):
+        """Reserved slots higher-priority classes have not used yet"""
+        return sum(
+            max(other.reserved - other.in_flight, 0)
+            for other in self.ordered if other.priority < route_class.priority
+        )
+
+    def has_room(self, route_class):
+        return (
+            route_class.in_flight < route_class.limit
+            and self.in_flight < self.capacity - self.reserved_above(route_class)
+        )
+
+    def estimate_wait(self, route_class):
+        ahead = sum(len(other.waiters) for other in self.ordered if other.priority <= route_class.priority)
+        slots = max(min(route_class.limit, self.capacity - self.reserved_above(route_class)), 1)
+        return (ahead + 1) * route_class.service_time / slots
+
+    def take(self, route_class):
+        route_class.in_flight += 1
+        route_class.admitted += 1
+        self.in_flight += 1
+
+    def enter(self, route_class, loop=None):
+        """Admit now (returns None), queue (returns a Waiter) or raise Shed"""
+        with self.lock:
+            queued_ahead = any(other.waiters for other in self.ordered if other.priority <= route_class.priority)
+            if not queued_ahead and self.has_room(route_class):
+                self.take(route_class)
+                return None
+            estimate = self.estimate_wait(route_class)
+            if len(route_class.waiters) >= route_class.queue:
+                raise self.shed(route_class, 'queue_full', estimate)
+            if estimate > route_class.timeout:
+                raise self.shed(route_class, 'deadline', estimate)
+            waiter = Waiter(route_class, loop)
+            route_class.waiters.append(waiter)
+            route_class.max_queue = max(route_class.max_queue, len(route_class.waiters))
+            return waiter
+
+    def withdraw(self, waiter):
+        """Leave the queue. Returns False when a slot was granted meanwhile"""
+        with self.lock:
+            if waiter.granted:
+                return False
+            waiter.route_class.waiters.remove(waiter)
+            return True
+
+    def abandon(self, waiter):
+        """Shed a waiter whose timeout ran out, unless it was admitted meanwhile"""
+        if self.withdraw(waiter):
+            with self.lock:
+                raise self.shed(waiter.route_class, 'timeout', self.estimate_wait(waiter.route_class))
+
+    def leave(self, route_class, seconds):
+        with self.lock:
+            route_class.in_flight -= 1
+            self.in_flight -= 1
+            route_class.service_time += SERVICE_TIME_WEIGHT * (seconds - route_class.service_time)
+            for other in self.ordered:
+                while other.waiters and self.has_room(other):
+                    self.take(other)
+                    other.waiters.popleft().wake()
+
+    def shed(self, route_class, reason, estimate):
+        route_class.shed[reason] += 1
+        return Shed(route_class, reason, max(math.ceil(estimate), 1))
+
+    def acquire(self, route_class):
+        waiter = self.enter(route_class)
+        if waiter is not None and not waiter.event.wait(route_class.timeout):
+            self.abandon(waiter)
+
+    async def aacquire(self, route_class):
+        waiter = self.enter(route_class, asyncio.get_running_loop())
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), route_class.timeout)
+        except asyncio.TimeoutError:
+            self.abandon(waiter)
+        except asyncio.CancelledError:
+            # Client went away while queued: hand back a slot granted meanwhile
+            if not self.withdraw(waiter):
+                self.leave(route_class, route_class.service_time)
+            raise
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'capacity': self.capacity,
+                'in_flight': self.in_flight,
+                'classes': {route_class.name: route_class.as_dict() for route_class in self.ordered},
+            }
+
+
+def compile_routes(routes):
+    """[(compiled path, methods or None, class name or None)], first match wins"""
+    return [
+        (
+            re.compile(route['path']),
+            {method.upper() for method in route['methods']} if route.get('methods') else None,
+            route['class'],
+        )
+        for route in routes
+    ]
+
+
+def classify(routes, default, path, method):
+    """Class name for a request, or None when it bypasses admission control"""
+    for pattern, methods, name in routes:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name
+    return default
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_gate():
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                _gate = Gate(settings.ADMISSION_CAPACITY, settings.ADMISSION_CLASSES)
+    return _gate
+
+
+def get_cache():
+    return caches[getattr(settings, 'ADMISSION_CACHE', 'default')]
+
+
+def shed_key(name, reason):
+    return f'adm-shed:{name}:{reason}'
+
+
+def record_shed(shed, path):
+    cache = get_cache()
+    key = shed_key(shed.route_class.name, shed.reason)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    logger.warning(
+        'Shed %s request to %s (%s), queue depth %d',
+        shed.route_class.name, path, shed.reason, len(shed.route_class.waiters),
+    )
+
+
+def shed_counts(classes=None):
+    """Shed requests per class and reason across all workers"""
+    classes = settings.ADMISSION_CLASSES if classes is None else classes
+    keys = {shed_key(name, reason): (name, reason) for name in classes for reason in SHED_REASONS}
+    counts = get_cache().get_many(list(keys))
+    stats = {name: dict.fromkeys(SHED_REASONS, 0) for name in classes}
+    for key, (name, reason) in keys.items():
+        stats[name][reason] = counts.get(key, 0)
+    return stats
@@ -0,0 +1,225 @@
+"""
+Buffered product view and impression ingestion.
+
+Clients post batches of product ids per event kind. ``EventBuffer`` counts
+them in memory per (product, kind, minute), so a hot product costs one dict
+increment per event, and a background thread per process writes the counts
+to the append-only ``ProductEvent`` table in bulk inserts every
+``ANALYTICS_FLUSH_SECONDS`` or sooner once ``ANALYTICS_FLUSH_EVENTS`` events
+are pending.
+
+Memory is bounded by the number of distinct counters. Above
+``ANALYTICS_SAMPLE_ABOVE`` of ``ANALYTICS_MAX_KEYS`` new counters are only
+started for one event in ``ANALYTICS_SAMPLE_RATE``, weighted by the rate and
+flagged ``sampled``; at the limit they are dropped. Events for existing
+counters are always kept. A failed flush puts its counts back, within the
+same limit, for the next attempt.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Sum
+
+from .models import Product, ProductEvent
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = tuple(kind for kind, _ in ProductEvent.KIND_CHOICES)
+BUCKET_SECONDS = 60
+INSERT_BATCH_SIZE = 500
+ID_CHUNK_SIZE = 500
+
+
+def parse_events(data):
+    """
+    Validate ``{"view": [ids], "impression": [ids]}`` and return a list of
+    (product id, kind) pairs. Raises ValueError with a message for clients.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('Expected an object mapping event kinds to lists of product ids.')
+    unknown = set(data) - set(KINDS)
+    if unknown:
+        raise ValueError(f'Unknown event kinds: {", ".join(sorted(unknown))}. Choose from: {", ".join(KINDS)}.')
+    events = []
+    for kind in KINDS:
+        ids = data.get(kind, [])
+        if not isinstance(ids, list):
+            raise ValueError(f'"{kind}" must be a list of product ids.')
+        for product_id in ids:
+            # bool is an int subclass; reject it along with strings and floats
+            if type(product_id) is not int or product_id <= 0:
+                raise ValueError(f'"{kind}" must only contain product ids.')
+            events.append((product_id, kind))
+    if len(events) > settings.ANALYTICS_MAX_BATCH:
+        raise ValueError(f'At most {settings.ANALYTICS_MAX_BATCH} events per request.')
+    return events
+
+
+class EventBuffer:
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Serializes flushes, so the exit flush waits for one in progress
+        self.flushing = threading.Lock()
+        self.counts = {}
+        self.sampled = set()
+        self.pending = 0
+        self.skipped = 0
+        self.stats = Counter()
+        self.wakeup = threading.Event()
+        self.pid = None
+
+    def ensure_flusher(self):
+        """Start the flush thread in this process (again after a fork)"""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            if self.pid is not None:
+                # Forked child: the parent's buffered counts are the parent's to write
+                self.counts, self.sampled, self.pending = {}, set(), 0
+            self.pid = os.getpid()
+        thread = threading.Thread(target=self.run, name='analytics-flush', daemon=True)
+        thread.start()
+
+    def add(self, events, now=None):
+        """Count events. Returns (accepted, dropped)"""
+        self.ensure_flusher()
+        bucket = int((time.time() if now is None else now) // BUCKET_SECONDS) * BUCKET_SECONDS
+        max_keys = settings.ANALYTICS_MAX_KEYS
+        sample_above = int(max_keys * settings.ANALYTICS_SAMPLE_ABOVE)
+        rate = settings.ANALYTICS_SAMPLE_RATE
+        accepted = dropped = 0
+        with self.lock:
+            counts = self.counts
+            for product_id, kind in events:
+                key = (product_id, kind, bucket)
+                if key in counts:
+                    counts[key] += 1
+                    accepted += 1
+                elif len(counts) < sample_above:
+                    counts[key] = 1
+                    accepted += 1
+                elif len(counts) < max_keys:
+                    self.skipped += 1
+                    if self.skipped % rate:
+                        self.stats['sampled_out'] += 1
+                        continue
+                    counts[key] = rate
+                    self.sampled.add(key)
+                    accepted += 1
+                else:
+                    dropped += 1
+            self.pending += accepted
+            self.stats['accepted'] += accepted
+            self.stats['dropped'] += dropped
+            if self.pending >= settings.ANALYTICS_FLUSH_EVENTS or len(counts) >= sample_above:
+                self.wakeup.set()
+        return accepted, dropped
+
+    def run(self):
+        while True:
+            self.wakeup.wait(settings.ANALYTICS_FLUSH_SECONDS)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Write buffered counts. Returns the number of rows inserted"""
+        with self.flushing:
+            return self.flush_buffered()
+
+    def flush_buffered(self):
+        with self.lock:
+            counts, sampled = self.counts, self.sampled
+            self.counts, self.sampled, self.pending = {}, set(), 0
+        if not counts:
+            return 0
+        start = time.perf_counter()
+        try:
+            rows = write(counts, sampled)
+        except Exception:
+            logger.exception('Flushing %d product event counters failed; keeping them for the next flush', len(counts))
+            self.stats['flush_errors'] += 1
+            self.restore(counts, sampled)
+            return 0
+        self.stats['flushes'] += 1
+        self.stats['rows'] += rows
+        self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000)
+        return rows
+
+    def restore(self, counts, sampled):
+        with self.lock:
+            for key, count in counts.items():
+                if key in self.counts or len(self.counts) < settings.ANALYTICS_MAX_KEYS:
+                    self.counts[key] = self.counts.get(key, 0) + count
+                    if key in sampled:
+                        self.sampled.add(key)
+                else:
+                    self.stats['dropped'] += count
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'buffered_counters': len(self.counts),
+                'pending_events': self.pending,
+                **self.stats,
+            }
+
+
+def write(counts, sampled):
+    """Bulk insert counters for products that exist"""
+    product_ids = sorted({key[0] for key in counts})
+    existing = set()
+    for start in range(0, len(product_ids), ID_CHUNK_SIZE):
+        chunk = product_ids[start:start + ID_CHUNK_SIZE]
+        existing.update(Product.objects.filter(id__in=chunk).values_list('id', flat=True))
+    rows = [
+        ProductEvent(
+            product_id=product_id,
+            kind=kind,
+            period_start=datetime.fromtimestamp(bucket, tz=dt_timezone.utc),
+            count=count,
+            sampled=(product_id, kind, bucket) in sampled,
+        )
+        for (product_id, kind, bucket), count in counts.items()
+        if product_id in existing
+    ]
+    with transaction.atomic():
+        ProductEvent.objects.bulk_create(rows, batch_size=INSERT_BATCH_SIZE)
+    return len(rows)
+
+
+def top_products(since, limit=20):
+    """Products with the most views since ``since``, with their impressions"""
+    totals = (
+        ProductEvent.objects.filter(period_start__gte=since)
+        .values('product_id', 'kind')
+        .annotate(total=Sum('count'))
+    )
+    products = {}
+    for row in totals:
+        entry = products.setdefault(row['product_id'], {'product_id': row['product_id'], 'view': 0, 'impression': 0})
+        entry[row['kind']] = row['total']
+    ranked = sorted(products.values(), key=lambda entry: (entry['view'], entry['impression']), reverse=True)
+    return ranked[:limit]
+
+
+buffer = EventBuffer()
+
+
+@atexit.register
+def flush_at_exit():
+    """Write what is buffered when a worker shuts down cleanly"""
+    if buffer.pid == os.getpid():
+        buffer.flush()
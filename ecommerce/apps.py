@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class EcommerceConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'ecommerce'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_delete, post_save
+        from .db import configure_sqlite
+        from .models import Category, Product, Promotion
+        from .querylog import install as install_query_log
+        from .signals import products_changed
+        from .snapshot import catalog_changed
+        from . import inventory, promotions, singleflight
+        from . import tasks  # noqa: F401  registers job handlers
+        from . import checks  # noqa: F401  registers system checks
+
+        connection_created.connect(configure_sqlite, dispatch_uid='ecommerce_configure_sqlite')
+        connection_created.connect(install_query_log, dispatch_uid='ecommerce_install_query_log')
+        for prefix, receiver in (('snapshot', catalog_changed), ('singleflight', singleflight.catalog_changed)):
+            for model in (Category, Product, Promotion):
+                post_save.connect(receiver, sender=model, dispatch_uid=f'ecommerce_{prefix}_save_{model.__name__}')
+                post_delete.connect(receiver, sender=model, dispatch_uid=f'ecommerce_{prefix}_delete_{model.__name__}')
+            products_changed.connect(receiver, dispatch_uid=f'ecommerce_{prefix}_products_changed')
+        post_save.connect(promotions.promotion_changed, sender=Promotion, dispatch_uid='ecommerce_promotions_save')
+        post_delete.connect(promotions.promotion_changed, sender=Promotion, dispatch_uid='ecommerce_promotions_delete')
+        post_save.connect(inventory.product_saved, sender=Product, dispatch_uid='ecommerce_inventory_product_save')
@@ -0,0 +1,109 @@
+"""
+Hot/cold order storage.
+
+Finished orders (delivered or cancelled) older than a cutoff are moved from
+Order/OrderItem into ArchivedOrder/ArchivedOrderItem in chunked transactions.
+Operational queries keep using the hot tables only; customer history lists
+are summary rows from both, combined with a UNION by ``order_summaries``.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+CHUNK_SIZE = 1000
+
+ORDER_FIELDS = [
+    'id', 'user_id', 'status', 'total_amount', 'discount_amount', 'shipping_address',
+    'phone_number', 'created_at', 'updated_at',
+]
+
+SUMMARY_FIELDS = ['id', 'status', 'total_amount', 'item_count', 'created_at']
+
+ITEM_MODELS = {Order: OrderItem, ArchivedOrder: ArchivedOrderItem}
+
+
+def archivable_orders(days):
+    cutoff = timezone.now() - timedelta(days=days)
+    return Order.objects.filter(status__in=ARCHIVABLE_STATUSES, updated_at__lt=cutoff)
+
+
+def archive_chunk(order_ids):
+    """Copy a chunk of orders and their items to the archive and delete the hot rows"""
+    with transaction.atomic():
+        # Re-check inside the transaction in case an order changed meanwhile
+        orders = list(
+            Order.objects.filter(id__in=order_ids, status__in=ARCHIVABLE_STATUSES)
+            .order_by().values(*ORDER_FIELDS)
+        )
+        ids = [order['id'] for order in orders]
+        items = OrderItem.objects.filter(order_id__in=ids).values(
+            'id', 'order_id', 'product_id', 'product__name', 'quantity', 'price'
+        )
+        ArchivedOrder.objects.bulk_create([ArchivedOrder(**order) for order in orders], batch_size=500)
+        ArchivedOrderItem.objects.bulk_create([
+            ArchivedOrderItem(
+                id=item['id'],
+                order_id=item['order_id'],
+                product_id=item['product_id'],
+                product_name=item['product__name'],
+                quantity=item['quantity'],
+                price=item['price'],
+            )
+            for item in items
+        ], batch_size=500)
+        # Cascades to the hot order items and status events
+        Order.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def archive_orders(days, chunk_size=CHUNK_SIZE, limit=None):
+    """Archive finished orders older than ``days``. Returns the number moved"""
+    moved = 0
+    while limit is None or moved < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - moved)
+        ids = list(archivable_orders(days).order_by('id').values_list('id', flat=True)[:size])
+        if not ids:
+            break
+        moved += archive_chunk(ids)
+    return moved
+
+
+def filter_orders(queryset, filters):
+    """Narrow a hot or archived order queryset by the list filters"""
+    if filters.get('status'):
+        queryset = queryset.filter(status__in=filters['status'])
+    if filters.get('created_after') is not None:
+        queryset = queryset.filter(created_at__gte=filters['created_after'])
+    if filters.get('created_before') is not None:
+        queryset = queryset.filter(created_at__lt=filters['created_before'])
+    return queryset
+
+
+def summarize(queryset):
+    """
+    Summary rows ({id, status, total_amount, item_count, created_at}) for an
+    order queryset. ``item_count`` is a correlated aggregate rather than a
+    JOIN + GROUP BY, so a LIMITed page only touches the items of its own rows.
+    """
+    item_count = (
+        ITEM_MODELS[queryset.model].objects.filter(order=OuterRef('pk')).order_by()
+        .values('order').annotate(total=Sum('quantity')).values('total')
+    )
+    return queryset.order_by().annotate(
+        item_count=Coalesce(Subquery(item_count, output_field=IntegerField()), 0)
+    ).values(*SUMMARY_FIELDS)
+
+
+def order_summaries(hot, archived=None):
+    """Newest-first summary rows of hot orders, plus archived ones when given"""
+    summaries = summarize(hot)
+    if archived is not None:
+        summaries = summaries.union(summarize(archived), all=True)
+    return summaries.order_by('-created_at', '-id')
@@ -0,0 +1,180 @@
+"""
+Production serving of static and media files for deployments without a
+separate web server.
+
+- Content-hashed static names get far-future ``immutable`` caching; other
+  files are revalidated with ``ETag``/``Last-Modified``.
+- Precompressed ``.br``/``.gz`` variants written by collectstatic are chosen
+  by ``Accept-Encoding``.
+- ``If-None-Match``/``If-Modified-Since`` answer 304 and single ``Range``
+  requests answer 206.
+- Full responses are ``FileResponse`` objects, which WSGI servers send with
+  ``wsgi.file_wrapper`` (``sendfile`` on gunicorn) instead of copying the
+  file through Python.
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^.]+$')
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+ENCODINGS = [('br', '.br'), ('gzip', '.gz')]
+CHUNK_SIZE = 64 * 1024
+
+
+def resolve(document_root, path):
+    try:
+        full_path = safe_join(document_root, path)
+    except ValueError:
+        raise Http404('Not found.')
+    try:
+        stats = os.stat(full_path)
+    except OSError:
+        raise Http404('Not found.')
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404('Not found.')
+    return full_path, stats
+
+
+def etag_for(stats, encoding=None):
+    tag = f'{stats.st_mtime_ns:x}-{stats.st_size:x}'
+    return quote_etag(f'{tag}-{encoding}' if encoding else tag)
+
+
+def not_modified(request, etag, mtime):
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(',')]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return '*' in tags or etag in [tag.removeprefix('W/') for tag in tags]
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since', ''))
+    return since is not None and int(mtime) <= since
+
+
+def accepted_encodings(header):
+    """Codings in an Accept-Encoding header, minus those refused with q=0"""
+    accepted = set()
+    for token in header.split(','):
+        name, _, params = token.partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """(start, end) inclusive for a single satisfiable byte range, None to ignore, False if unsatisfiable"""
+    match = RANGE.match(header.strip())
+    if not match or not (match[1] or match[2]):
+        return None
+    if not match[1]:
+        length = int(match[2])
+        if length == 0:
+            return False
+        return max(size - length, 0), size - 1
+    start = int(match[1])
+    end = int(match[2]) if match[2] else size - 1
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def iter_range(path, start, length):
+    with open(path, 'rb') as stream:
+        stream.seek(start)
+        while length > 0:
+            chunk = stream.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, document_root, cache_control, precompressed=False):
+    if request.method not in ('GET', 'HEAD'):
+        response = HttpResponse(status=405)
+        response['Allow'] = 'GET, HEAD'
+        return response
+
+    full_path, stats = resolve(document_root, path)
+    content_type, _ = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    range_header = request.headers.get('Range')
+
+    # Ranges address the identity representation, so never pair them with a variant
+    encoding = None
+    if precompressed and range_header is None:
+        accepted = accepted_encodings(request.headers.get('Accept-Encoding', ''))
+        for name, suffix in ENCODINGS:
+            if name in accepted:
+                try:
+                    variant_stats = os.stat(full_path + suffix)
+                except OSError:
+                    continue
+                encoding, full_path, stats = name, full_path + suffix, variant_stats
+                break
+
+    etag = etag_for(stats, encoding)
+    headers = {
+        'Cache-Control': cache_control,
+        'ETag': etag,
+        'Last-Modified': http_date(stats.st_mtime),
+        'Accept-Ranges': 'bytes',
+    }
+    if precompressed:
+        headers['Vary'] = 'Accept-Encoding'
+
+    if not_modified(request, etag, stats.st_mtime):
+        response = HttpResponseNotModified()
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    status = 200
+    start, length = 0, stats.st_size
+    if range_header is not None and request.headers.get('If-Range', etag) == etag:
+        byte_range = parse_range(range_header, stats.st_size)
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stats.st_size}'
+            return response
+        if byte_range is not None:
+            status = 206
+            start, length = byte_range[0], byte_range[1] - byte_range[0] + 1
+            headers['Content-Range'] = f'bytes {byte_range[0]}-{byte_range[1]}/{stats.st_size}'
+
+    if request.method == 'HEAD':
+        response = HttpResponse(status=status, content_type=content_type)
+    elif status == 206:
+        response = StreamingHttpResponse(iter_range(full_path, start, length), status=206, content_type=content_type)
+    else:
+        response = FileResponse(open(full_path, 'rb'), content_type=content_type)
+    for name, value in headers.items():
+        response[name] = value
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Content-Length'] = str(length)
+    return response
+
+
+def serve_static(request, path):
+    """Collected static files; content-hashed names are cached forever"""
+    if HASHED_NAME.search(path):
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f'public, max-age={settings.STATIC_MAX_AGE}'
+    return serve_file(request, path, settings.STATIC_ROOT, cache_control, precompressed=True)
+
+
+def serve_media(request, path):
+    """Uploaded media; revalidated with ETag/Last-Modified after MEDIA_MAX_AGE"""
+    cache_control = f'public, max-age={settings.MEDIA_MAX_AGE}'
+    return serve_file(request, path, settings.MEDIA_ROOT, cache_control)
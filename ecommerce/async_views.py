@@ -0,0 +1,301 @@
+"""
+Async read path for the catalog endpoints.
+
+DRF views are synchronous, so under ASGI every catalog read would hold a
+worker thread for its whole duration. These plain Django async views serve
+GET/HEAD for the catalog with the async ORM and reuse the DRF serializers to
+produce identical payloads; every other method is handed to the existing
+sync viewsets, which keep owning writes.
+"""
+import asyncio
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Count, Q
+from django.http import JsonResponse, StreamingHttpResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+from . import promotions, singleflight
+from .events import broker, ticket_user_id
+from .models import Category, Product, OrderStatusEvent
+from .serializers import CategorySerializer, ProductSerializer
+
+
+PAGE_SIZE = settings.REST_FRAMEWORK.get('PAGE_SIZE', 12)
+FEATURED_COUNT = 8
+
+# Fields accepted by ?ordering=, mirroring the sync OrderingFilter defaults
+PRODUCT_ORDERING_FIELDS = {
+    'id', 'sku', 'name', 'price', 'stock', 'is_active',
+    'created_at', 'updated_at', 'category', 'category__name',
+}
+
+
+def wants_browsable_api(request):
+    """True when the client asked for the DRF browsable API rather than JSON"""
+    requested = request.GET.get('format')
+    if requested:
+        return requested == 'api'
+    return 'text/html' in request.headers.get('Accept', '')
+
+
+def read_async(async_view, sync_view, snapshot_view=None):
+    """
+    Serve GET/HEAD with ``async_view`` and hand every other method (and the
+    browsable API) to the sync DRF view. ``snapshot_view`` is tried first for
+    reads; it returns None when the catalog snapshot cannot answer.
+    """
+    handler = sync_to_async(sync_view)
+
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD') and not wants_browsable_api(request):
+            if snapshot_view is not None:
+                # Memory-mapped reads, cheaper than a thread hop or a query
+                response = snapshot_view(request, *args, **kwargs)
+                if response is not None:
+                    return response
+            if settings.ASYNC_CATALOG_READS:
+                return await async_view(request, *args, **kwargs)
+        return await handler(request, *args, **kwargs)
+
+    # Lets the slow-query log name the viewset action owning the route
+    view.sync_view = sync_view
+    # DRF enforces CSRF itself for session-authenticated writes. Set the flag
+    # directly: csrf_exempt() does not preserve coroutine functions on Django 4.2
+    view.csrf_exempt = True
+    return view
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+def not_found(detail='Not found.'):
+    return json_response({'detail': detail}, status=404)
+
+
+def active_products(request):
+    """Async counterpart of ProductViewSet.get_queryset()"""
+    queryset = Product.objects.filter(is_active=True).select_related('category')
+    category_id = request.GET.get('category')
+    if category_id:
+        queryset = queryset.filter(category_id=category_id)
+    return queryset
+
+
+def order_products(request, queryset):
+    """Apply ?ordering= like DRF's OrderingFilter, ignoring unknown fields"""
+    param = request.GET.get('ordering')
+    if not param:
+        return queryset
+    terms = [
+        term.strip() for term in param.split(',')
+        if term.strip().lstrip('-') in PRODUCT_ORDERING_FIELDS
+    ]
+    return queryset.order_by(*terms) if terms else queryset
+
+
+def page_links(request, page, last_page):
+    """next/previous URLs as PageNumberPagination builds them"""
+    url = request.build_absolute_uri()
+    if page < last_page:
+        next_link = replace_query_param(url, 'page', page + 1)
+    else:
+        next_link = None
+    if page == 1:
+        previous_link = None
+    elif page == 2:
+        previous_link = remove_query_param(url, 'page')
+    else:
+        previous_link = replace_query_param(url, 'page', page - 1)
+    return next_link, previous_link
+
+
+async def page_data(request, queryset, serializer_class, **context):
+    """A page the same way PageNumberPagination builds it, or None for an invalid page"""
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+
+    count = await queryset.acount()
+    last_page = max((count + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    if page < 1 or page > last_page:
+        return None
+
+    start = (page - 1) * PAGE_SIZE
+    objects = [obj async for obj in queryset[start:start + PAGE_SIZE]]
+    next_link, previous_link = page_links(request, page, last_page)
+    serializer = serializer_class(objects, many=True, context={'request': request, **context})
+    return {
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': serializer.data,
+    }
+
+
+def page_response(data):
+    return not_found('Invalid page.') if data is None else json_response(data)
+
+
+async def paginate(request, queryset, serializer_class, **context):
+    return page_response(await page_data(request, queryset, serializer_class, **context))
+
+
+async def category_list(request):
+    """GET /api/categories/"""
+    queryset = Category.objects.annotate(
+        active_products_count=Count('products', filter=Q(products__is_active=True))
+    )
+    data = await singleflight.aget_or_compute(
+        singleflight.request_key('categories', request),
+        lambda: page_data(request, queryset, CategorySerializer),
+    )
+    return page_response(data)
+
+
+async def product_list(request):
+    """GET /api/products/"""
+    queryset = order_products(request, active_products(request))
+    return await paginate(request, queryset, ProductSerializer, promotions=await promotions.acurrent())
+
+
+async def product_detail(request, pk):
+    """GET /api/products/{id}/"""
+    try:
+        product = await active_products(request).aget(pk=pk)
+    except Product.DoesNotExist:
+        return not_found()
+    pricing = await promotions.acurrent()
+    serializer = ProductSerializer(product, context={'request': request, 'promotions': pricing})
+    return json_response(serializer.data)
+
+
+async def product_featured(request):
+    """GET /api/products/featured/"""
+    async def compute():
+        products = [product async for product in active_products(request)[:FEATURED_COUNT]]
+        context = {'request': request, 'promotions': await promotions.acurrent()}
+        return ProductSerializer(products, many=True, context=context).data
+
+    data = await singleflight.aget_or_compute(singleflight.request_key('featured', request), compute)
+    return json_response(data)
+
+
+async def product_search(request):
+    """GET /api/products/search/?q={query}"""
+    queryset = active_products(request)
+    query = request.GET.get('q', '')
+    if query:
+        queryset = queryset.filter(Q(name__icontains=query) | Q(description__icontains=query))
+    products = [product async for product in queryset]
+    context = {'request': request, 'promotions': await promotions.acurrent()}
+    serializer = ProductSerializer(products, many=True, context=context)
+    return json_response(serializer.data)
+
+
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MILLISECONDS = 5000
+EVENT_BATCH_SIZE = 100
+
+
+@sync_to_async
+def authenticate_stream(request):
+    """
+    Resolve the user from a Bearer header or a ``?ticket=`` from
+    POST /api/orders/events/ticket/ (EventSource cannot send headers).
+    Returns None when unauthenticated.
+    """
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is not None:
+        try:
+            user = auth.get_user(auth.get_validated_token(raw_token))
+        except (InvalidToken, TokenError, AuthenticationFailed):
+            return None
+        return user if user.is_active else None
+    user_id = ticket_user_id(request.GET.get('ticket', ''))
+    if user_id is None:
+        return None
+    return User.objects.filter(pk=user_id, is_active=True).first()
+
+
+@sync_to_async
+def events_after(user_id, last_id):
+    return list(OrderStatusEvent.objects.filter(user_id=user_id, id__gt=last_id)[:EVENT_BATCH_SIZE])
+
+
+def format_sse(event):
+    return f"id: {event.id}\nevent: order_status\ndata: {json.dumps(event.as_dict())}\n\n"
+
+
+async def order_events(request):
+    """
+    GET /api/orders/events/ - Server-Sent Events stream of the user's order
+    status changes. Reconnecting clients resume after ``Last-Event-ID``.
+    """
+    user = await authenticate_stream(request)
+    if user is None:
+        return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        last_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_id = None
+    if last_id is None:
+        # Fresh connection: only stream changes from now on
+        latest = await OrderStatusEvent.objects.filter(user_id=user.id).order_by('-id').values_list('id', flat=True).afirst()
+        last_id = latest or 0
+
+    async def catch_up():
+        nonlocal last_id
+        while True:
+            events = await events_after(user.id, last_id)
+            for event in events:
+                last_id = event.id
+                yield format_sse(event)
+            if len(events) < EVENT_BATCH_SIZE:
+                return
+
+    async def stream():
+        # Subscribe before replaying so nothing slips in between
+        subscription = broker.subscribe(user.id)
+        try:
+            yield f"retry: {SSE_RETRY_MILLISECONDS}\n\n"
+            async for message in catch_up():
+                yield message
+            queue = subscription[1]
+            while True:
+                try:
+                    await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                    woken = True
+                except asyncio.TimeoutError:
+                    woken = False
+                while not queue.empty():
+                    queue.get_nowait()
+                # Local events only wake the stream up: events are always read
+                # from the table after last_id, so one committed by another
+                # process with a lower id than a local one is not skipped.
+                # Timeouts pick up other processes' events (and ones dropped
+                # for a slow client), else send a heartbeat for proxies.
+                sent = False
+                async for message in catch_up():
+                    sent = True
+                    yield message
+                if not sent and not woken:
+                    yield ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(user.id, subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,350 @@
+"""
+Online backups of the SQLite database.
+
+Copying ``db.sqlite3`` while workers write to it can capture a torn file,
+and locking it for the whole copy stalls checkout. ``backup`` uses SQLite's
+online backup API instead, ``BACKUP_PAGES_PER_STEP`` pages at a time with
+``BACKUP_STEP_SLEEP`` seconds between steps. Each step only holds a read
+lock for as long as it takes to copy those pages.
+
+In WAL mode (see ``SQLITE_PRAGMAS``) the source connection first opens a
+read transaction. Every step then copies from that one snapshot: writes
+committed meanwhile go to the WAL and neither block nor restart the backup,
+which otherwise starts over whenever another connection writes. In rollback
+journal mode that transaction would lock writers out, so steps run without
+it and the backup restarts on writes (``restarts`` in the report).
+
+While the backup runs, a probe connection repeatedly takes the write lock
+(``BEGIN IMMEDIATE``, then rolls back without writing) and records how long
+it waited: the longest wait is the worst stall a writer saw.
+
+A finished copy passes ``PRAGMA integrity_check`` before it is kept. It is
+gzipped (``BACKUP_COMPRESS``) with a JSON manifest holding its SHA-256, and
+only the newest ``BACKUP_KEEP`` backups are kept. ``restore`` checks the
+checksum and integrity again before copying the backup over the database,
+through the backup API as well.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'db-'
+SUFFIXES = ('.sqlite3', '.sqlite3.gz')
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """A backup or restore could not be made or failed verification"""
+
+
+def database_path(alias='default'):
+    database = settings.DATABASES[alias]
+    if database['ENGINE'] != 'django.db.backends.sqlite3':
+        raise BackupError('Backups only support SQLite databases')
+    return Path(database['NAME'])
+
+
+def busy_timeout(alias='default'):
+    return settings.DATABASES[alias].get('OPTIONS', {}).get('timeout', 5)
+
+
+def backup_dir():
+    return Path(settings.BACKUP_DIR)
+
+
+class WriterProbe(threading.Thread):
+    """Takes and releases the write lock every ``interval`` seconds, timing each wait"""
+
+    def __init__(self, path, interval, timeout):
+        super().__init__(name='backup-writer-probe', daemon=True)
+        self.path = path
+        self.interval = interval
+        self.timeout = timeout
+        self.stopped = threading.Event()
+        self.waits = []
+
+    def run(self):
+        connection = sqlite3.connect(str(self.path), timeout=self.timeout, isolation_level=None)
+        try:
+            while not self.stopped.wait(self.interval):
+                start = time.perf_counter()
+                connection.execute('BEGIN IMMEDIATE')
+                self.waits.append(time.perf_counter() - start)
+                connection.execute('ROLLBACK')
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+    @property
+    def max_wait(self):
+        return max(self.waits, default=0.0)
+
+
+class BackupReport:
+    """What a backup copied, how fast, and the worst writer stall while it ran"""
+
+    def __init__(self, source):
+        self.source = str(source)
+        self.path = None
+        self.journal_mode = None
+        self.pages = 0
+        self.page_size = 0
+        self.steps = 0
+        self.restarts = 0
+        self.stored_bytes = 0
+        self.sha256 = None
+        self.probes = 0
+        self.max_stall = 0.0
+        self.rotated = []
+        self.started = time.monotonic()
+        self.copy_elapsed = 0.0
+        self.elapsed = 0.0
+
+    @property
+    def database_bytes(self):
+        return self.pages * self.page_size
+
+    @property
+    def bytes_per_second(self):
+        return self.database_bytes / self.copy_elapsed if self.copy_elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'path': self.path,
+            'source': self.source,
+            'journal_mode': self.journal_mode,
+            'pages': self.pages,
+            'page_size': self.page_size,
+            'database_bytes': self.database_bytes,
+            'stored_bytes': self.stored_bytes,
+            'sha256': self.sha256,
+            'steps': self.steps,
+            'restarts': self.restarts,
+            'copy_seconds': round(self.copy_elapsed, 3),
+            'seconds': round(self.elapsed, 3),
+            'bytes_per_second': round(self.bytes_per_second),
+            'writer_probes': self.probes,
+            'max_writer_stall_ms': round(self.max_stall * 1000, 3),
+            'rotated': self.rotated,
+        }
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as handle:
+        for chunk in iter(lambda: handle.read(COPY_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def manifest_path(path):
+    return Path(f'{path}.json')
+
+
+def integrity(path):
+    """Result of PRAGMA integrity_check on a database file ('ok' when sound)"""
+    connection = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        rows = connection.execute('PRAGMA integrity_check').fetchall()
+    except sqlite3.DatabaseError as exc:
+        return str(exc)
+    finally:
+        connection.close()
+    return '; '.join(row[0] for row in rows)
+
+
+def copy_online(source, target, report, pages_per_step, step_sleep):
+    """Stepped backup API copy from an open source connection into ``target``"""
+    remaining_before = [None]
+
+    def progress(status, remaining, total):
+        report.steps += 1
+        # A step that made no headway started over from the first page
+        if remaining_before[0] is not None and remaining >= remaining_before[0]:
+            report.restarts += 1
+        remaining_before[0] = remaining
+        if remaining and step_sleep:
+            # Between steps no lock is held: writers go ahead
+            time.sleep(step_sleep)
+
+    destination = sqlite3.connect(str(target))
+    try:
+        source.backup(destination, pages=pages_per_step, progress=progress)
+        # A standalone file: no -wal/-shm needed to open it
+        destination.execute('PRAGMA journal_mode = DELETE')
+    finally:
+        destination.close()
+
+
+def backup(directory=None, pages_per_step=None, step_sleep=None, compress=None, keep=None,
+           probe_interval=None, alias='default'):
+    """Back the database up into ``directory`` (BACKUP_DIR). Returns a BackupReport"""
+    source_path = database_path(alias)
+    directory = Path(directory or backup_dir())
+    pages_per_step = settings.BACKUP_PAGES_PER_STEP if pages_per_step is None else pages_per_step
+    step_sleep = settings.BACKUP_STEP_SLEEP if step_sleep is None else step_sleep
+    compress = settings.BACKUP_COMPRESS if compress is None else compress
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    probe_interval = settings.BACKUP_PROBE_INTERVAL if probe_interval is None else probe_interval
+
+    directory.mkdir(parents=True, exist_ok=True)
+    report = BackupReport(source_path)
+    name = f'{PREFIX}{timezone.now():%Y%m%d-%H%M%S-%f}.sqlite3'
+    partial = directory / f'{name}.partial'
+
+    source = sqlite3.connect(str(source_path), timeout=busy_timeout(alias), isolation_level=None)
+    probe = WriterProbe(source_path, probe_interval, busy_timeout(alias)) if probe_interval else None
+    try:
+        report.journal_mode = source.execute('PRAGMA journal_mode').fetchone()[0].lower()
+        if report.journal_mode == 'wal':
+            # Pin one snapshot for every step; WAL writers are not blocked by it
+            source.execute('BEGIN')
+            source.execute('SELECT count(*) FROM sqlite_master').fetchone()
+        report.page_size = source.execute('PRAGMA page_size').fetchone()[0]
+        if probe:
+            probe.start()
+        start = time.monotonic()
+        copy_online(source, partial, report, pages_per_step, step_sleep)
+        report.copy_elapsed = time.monotonic() - start
+    except Exception:
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        if probe:
+            probe.stop()
+            report.probes = len(probe.waits)
+            report.max_stall = probe.max_wait
+        source.close()
+
+    checked = integrity(partial)
+    if checked != 'ok':
+        partial.unlink(missing_ok=True)
+        raise BackupError(f'Backup failed integrity_check: {checked}')
+    connection = sqlite3.connect(f'file:{partial}?mode=ro', uri=True)
+    try:
+        report.pages = connection.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        connection.close()
+
+    if compress:
+        path = directory / f'{name}.gz'
+        with open(partial, 'rb') as raw, gzip.open(path, 'wb', compresslevel=6) as packed:
+            shutil.copyfileobj(raw, packed, COPY_CHUNK_SIZE)
+        partial.unlink()
+    else:
+        path = directory / name
+        os.replace(partial, path)
+
+    report.path = str(path)
+    report.stored_bytes = path.stat().st_size
+    report.sha256 = file_sha256(path)
+    report.elapsed = time.monotonic() - report.started
+    manifest_path(path).write_text(json.dumps({
+        'created_at': timezone.now().isoformat(),
+        'source': str(source_path),
+        'compressed': compress,
+        'pages': report.pages,
+        'page_size': report.page_size,
+        'stored_bytes': report.stored_bytes,
+        'sha256': report.sha256,
+        'integrity': checked,
+    }, indent=2))
+    report.rotated = rotate(directory, keep)
+    logger.info(
+        'Backed up %d pages to %s in %.2fs (%.1f MiB/s), max writer stall %.1f ms',
+        report.pages, path, report.elapsed, report.bytes_per_second / 2 ** 20, report.max_stall * 1000,
+    )
+    return report
+
+
+def list_backups(directory=None):
+    """Backup files in ``directory``, oldest first"""
+    directory = Path(directory or backup_dir())
+    if not directory.is_dir():
+        return []
+    return sorted(
+        path for path in directory.iterdir()
+        if path.name.startswith(PREFIX) and path.name.endswith(SUFFIXES)
+    )
+
+
+def rotate(directory=None, keep=None):
+    """Delete all but the newest ``keep`` backups; returns the deleted paths"""
+    keep = settings.BACKUP_KEEP if keep is None else keep
+    backups = list_backups(directory)
+    expired = backups[:-keep] if keep > 0 else []
+    for path in expired:
+        path.unlink(missing_ok=True)
+        manifest_path(path).unlink(missing_ok=True)
+    return [str(path) for path in expired]
+
+
+def verify(path):
+    """
+    Check a backup against its manifest checksum and unpack it to a temporary
+    database file that passes integrity_check. Returns that file's path; the
+    caller deletes it.
+    """
+    path = Path(path)
+    manifest = manifest_path(path)
+    if not manifest.exists():
+        raise BackupError(f'No manifest for {path.name}')
+    expected = json.loads(manifest.read_text())['sha256']
+    if file_sha256(path) != expected:
+        raise BackupError(f'{path.name} does not match the checksum in its manifest')
+
+    handle, unpacked = tempfile.mkstemp(prefix='restore-', suffix='.sqlite3', dir=path.parent)
+    os.close(handle)
+    opener = gzip.open if path.name.endswith('.gz') else open
+    try:
+        with opener(path, 'rb') as packed, open(unpacked, 'wb') as raw:
+            shutil.copyfileobj(packed, raw, COPY_CHUNK_SIZE)
+    except (OSError, EOFError) as exc:
+        os.unlink(unpacked)
+        raise BackupError(f'Could not unpack {path.name}: {exc}')
+    checked = integrity(unpacked)
+    if checked != 'ok':
+        os.unlink(unpacked)
+        raise BackupError(f'{path.name} failed integrity_check: {checked}')
+    return unpacked
+
+
+def restore(path, target=None, alias='default'):
+    """
+    Verify a backup and copy it over ``target`` (the live database by default)
+    with the backup API, so other connections see either the old or the
+    restored database and never a partial file. Returns the target path.
+    """
+    target = Path(target or database_path(alias))
+    unpacked = verify(path)
+    try:
+        source = sqlite3.connect(unpacked)
+        destination = sqlite3.connect(str(target), timeout=busy_timeout(alias))
+        try:
+            source.backup(destination)
+        finally:
+            destination.close()
+            source.close()
+    finally:
+        os.unlink(unpacked)
+    checked = integrity(target)
+    if checked != 'ok':
+        raise BackupError(f'Restored database failed integrity_check: {checked}')
+    return target
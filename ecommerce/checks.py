@@ -0,0 +1,57 @@
+"""
+Deploy checks for settings that only work when every worker shares them.
+
+Rate limit buckets only limit anything when all workers count in the same
+cache. Read-your-writes replica pins only help when the worker serving the
+next read sees the pin. Single-flight caching relies on a lock and a
+generation number that every worker reads. The slow-query log and the shed
+counts are read by whichever process is asked, not the one that recorded
+them. With a process-local backend (the LocMem fallback when REDIS_URL is
+unset), each worker keeps its own state: limits multiply by the number of
+processes, clients read stale replicas after writing, other workers serve
+catalog responses from before an edit for up to SINGLE_FLIGHT_STALE_SECONDS,
+``slow_queries`` finds nothing and shed counts cover one worker.
+``check_shared_caches`` reports each of them as an error from ``manage.py
+check --deploy``.
+"""
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+
+# Backends whose entries are private to one process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+# Settings naming a cache every worker must share, and what breaks otherwise
+SHARED_CACHES = {
+    'RATE_LIMIT_CACHE': 'each worker counts its own rate limit buckets',
+    'REPLICA_PIN_CACHE': 'other workers miss read-your-writes pins and read from replicas',
+    'SINGLE_FLIGHT_CACHE': "catalog edits only invalidate the editing worker's responses",
+    'SLOW_QUERY_CACHE': 'the slow_queries command and other workers see an empty slow-query log',
+    'ADMISSION_CACHE': "the admission endpoint reports one worker's shed counts as everyone's",
+}
+
+
+def local_caches():
+    """(setting, alias) pairs of SHARED_CACHES that resolve to a process-local backend"""
+    found = []
+    for name in SHARED_CACHES:
+        alias = getattr(settings, name, 'default')
+        if settings.CACHES.get(alias, {}).get('BACKEND') in LOCAL_CACHE_BACKENDS:
+            found.append((name, alias))
+    return found
+
+
+@register(Tags.caches, deploy=True)
+def check_shared_caches(app_configs, **kwargs):
+    """One error per cache that must be shared by all workers but is process-local"""
+    return [
+        Error(
+            f'{name} ({alias!r}) uses a process-local cache backend: {SHARED_CACHES[name]}.',
+            hint='Set REDIS_URL or point it at a cache shared by all workers.',
+            id='ecommerce.E001',
+        )
+        for name, alias in local_caches()
+    ]
@@ -0,0 +1,92 @@
+"""
+Database connection helpers: replica selection, read-your-writes pinning and
+SQLite tuning applied when a connection is opened.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+# Per-request routing state, set by ReplicaRoutingMiddleware. Outside a
+# request (management commands, shell) it stays None and reads use the primary.
+_routing = contextvars.ContextVar('ecommerce_db_routing', default=None)
+
+
+class RoutingState:
+    """Whether the current request may read from replicas, and whether it wrote"""
+    __slots__ = ('use_replicas', 'wrote')
+
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith('replica')]
+
+
+def begin_request(use_replicas):
+    return _routing.set(RoutingState(use_replicas))
+
+
+def end_request(token):
+    state = _routing.get()
+    _routing.reset(token)
+    return state
+
+
+def mark_write():
+    state = _routing.get()
+    if state is not None:
+        state.wrote = True
+
+
+def read_alias():
+    """Alias the current context should read replicated models from"""
+    state = _routing.get()
+    if state is None or not state.use_replicas or state.wrote:
+        return 'default'
+    # Reads inside a write transaction must see that transaction's writes
+    if transaction.get_connection('default').in_atomic_block:
+        return 'default'
+    aliases = replica_aliases()
+    return random.choice(aliases) if aliases else 'default'
+
+
+def reporting_alias():
+    """Alias for reporting/export reads, which tolerate replica lag anywhere"""
+    aliases = replica_aliases()
+    return random.choice(aliases) if aliases else 'default'
+
+
+def _pin_cache():
+    return caches[getattr(settings, 'REPLICA_PIN_CACHE', 'default')]
+
+
+def pin_key(client_key):
+    return f'db-pin:{client_key}'
+
+
+def is_pinned(client_key):
+    return bool(client_key) and _pin_cache().get(pin_key(client_key)) is not None
+
+
+def pin_to_primary(client_key):
+    """Send this client's reads to the primary for REPLICA_STICKY_SECONDS"""
+    if client_key:
+        _pin_cache().set(pin_key(client_key), 1, timeout=settings.REPLICA_STICKY_SECONDS)
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """connection_created receiver applying SQLITE_PRAGMAS to new SQLite connections"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = dict(getattr(settings, 'SQLITE_PRAGMAS', {}))
+    if connection.alias.startswith('replica'):
+        pragmas['query_only'] = 'ON'
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
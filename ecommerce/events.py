@@ -0,0 +1,85 @@
+"""
+In-process pub/sub for order status events.
+
+Subscribers are asyncio queues owned by SSE connections; ``publish`` may be
+called from any thread (sync views, admin, workers) and hands events to each
+subscriber's event loop. Events published by other processes are not seen
+here. SSE streams treat a published event only as a wake-up and read what
+to send from the OrderStatusEvent table, on every wake-up and heartbeat.
+
+EventSource cannot send an Authorization header. Instead of putting the JWT
+in the stream URL, where access logs and browser history keep it, clients
+exchange it for a ticket: signed, only valid for opening this stream, and
+only for TICKET_MAX_AGE seconds.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.core import signing
+
+
+SUBSCRIBER_QUEUE_SIZE = 100
+TICKET_SALT = 'ecommerce.events.ticket'
+TICKET_MAX_AGE = 60
+
+
+class OrderEventBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """Register a queue for a user's events; call from the subscriber's event loop"""
+        subscription = (asyncio.get_running_loop(), asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE))
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, event):
+        """Deliver an OrderStatusEvent to the subscribers of its user"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(event.user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Subscriber's loop already closed; it unsubscribes on its way out
+                pass
+
+
+def _offer(queue, event):
+    # A slow subscriber drops events here and recovers them from the table
+    if not queue.full():
+        queue.put_nowait(event)
+
+
+broker = OrderEventBroker()
+
+
+def issue_ticket(user):
+    """Short-lived credential for opening the user's order events stream"""
+    return signing.TimestampSigner(salt=TICKET_SALT).sign(str(user.pk))
+
+
+def ticket_user_id(ticket):
+    """The user id a ticket was issued to, or None when invalid or expired"""
+    try:
+        value = signing.TimestampSigner(salt=TICKET_SALT).unsign(
+            ticket, max_age=TICKET_MAX_AGE
+        )
+    except signing.BadSignature:
+        return None
+    return int(value)
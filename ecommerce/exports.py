@@ -0,0 +1,126 @@
+"""
+Streaming bulk export of catalog and order data as NDJSON or CSV.
+
+Rows are read with ``values_list().iterator(chunk_size=...)`` so the database
+cursor is consumed in chunks and no model instances are built; output is
+produced in buffered blocks so memory stays flat regardless of table size.
+"""
+import csv
+import io
+import json
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .db import reporting_alias
+from .models import Product, Order, OrderItem
+
+
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+# resource name -> (queryset factory, exported columns)
+EXPORTS = {
+    'products': (
+        lambda: Product.objects.order_by('id'),
+        [
+            'id', 'sku', 'name', 'description', 'price', 'category_id', 'category__name',
+            'stock', 'image', 'is_active', 'created_at', 'updated_at'
+        ],
+    ),
+    'orders': (
+        lambda: Order.objects.order_by('id'),
+        [
+            'id', 'user_id', 'user__username', 'status', 'total_amount',
+            'shipping_address', 'phone_number', 'created_at', 'updated_at'
+        ],
+    ),
+    'order_items': (
+        lambda: OrderItem.objects.order_by('id'),
+        ['id', 'order_id', 'product_id', 'product__name', 'quantity', 'price'],
+    ),
+}
+
+
+def iter_rows(resource, chunk_size=CHUNK_SIZE):
+    """Return the columns and a chunked row iterator for a resource"""
+    queryset_factory, columns = EXPORTS[resource]
+    queryset = queryset_factory().using(reporting_alias())
+    rows = queryset.values_list(*columns).iterator(chunk_size=chunk_size)
+    return columns, rows
+
+
+def _column_name(column):
+    return column.replace('__', '_')
+
+
+def _ndjson_lines(columns, rows):
+    names = [_column_name(column) for column in columns]
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(dict(zip(names, row))) + '\n'
+
+
+def _csv_lines(columns, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([_column_name(column) for column in columns])
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _buffered(lines, size=BUFFER_SIZE):
+    """Group encoded lines into blocks of roughly ``size`` bytes"""
+    block = []
+    length = 0
+    for line in lines:
+        data = line.encode('utf-8')
+        block.append(data)
+        length += len(data)
+        if length >= size:
+            yield b''.join(block)
+            block = []
+            length = 0
+    if block:
+        yield b''.join(block)
+
+
+def gzip_stream(chunks, level=6):
+    """Compress a byte stream on the fly into a single gzip member"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(resource, export_format='ndjson', compress=False, chunk_size=CHUNK_SIZE):
+    """Return an iterator of bytes for the given resource and format"""
+    if resource not in EXPORTS:
+        raise ValueError(f"Unknown export resource: {resource}")
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    columns, rows = iter_rows(resource, chunk_size=chunk_size)
+    if export_format == 'csv':
+        lines = _csv_lines(columns, rows)
+    else:
+        lines = _ndjson_lines(columns, rows)
+
+    chunks = _buffered(lines)
+    if compress:
+        chunks = gzip_stream(chunks)
+    return chunks
@@ -0,0 +1,244 @@
+"""
+High-throughput product import from CSV or NDJSON.
+
+Input is parsed as a stream and processed in chunks. Categories are resolved
+through an in-memory name -> id map, existing products are matched by ``sku``
+with one query per chunk, and writes go through ``bulk_create``/``bulk_update``
+inside one transaction per chunk. ``dry_run`` computes the same diff without
+writing anything.
+"""
+import csv
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+
+from .inventory import absorb_stock_edits
+from .models import Category, Product
+from .signals import products_changed
+
+
+CHUNK_SIZE = 1000
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Files are UTF-8; the -sig codec also drops the BOM that Excel writes
+IMPORT_ENCODING = 'utf-8-sig'
+
+# Product fields an import row may set, besides the sku key and category
+UPDATE_FIELDS = ['name', 'description', 'price', 'category_id', 'stock', 'is_active']
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 't'}
+
+
+class ImportReport:
+    """Counters and timing collected while importing"""
+
+    def __init__(self, dry_run=False):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.failed = 0
+        self.categories_created = 0
+        self.errors = []
+        self.changes = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            'dry_run': self.dry_run,
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'failed': self.failed,
+            'categories_created': self.categories_created,
+            'errors': self.errors,
+            'changes': self.changes,
+            'elapsed_seconds': round(self.elapsed, 3),
+            'rows_per_second': round(self.rows_per_second, 1),
+        }
+
+
+def iter_records(stream, import_format):
+    """Yield (line_number, dict) pairs from a text stream"""
+    if import_format == 'csv':
+        reader = csv.DictReader(stream)
+        for record in reader:
+            yield reader.line_num, record
+    elif import_format == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as exc:
+                record = {'_error': f'invalid JSON: {exc}'}
+            yield line_number, record
+    else:
+        raise ValueError(f"Unknown import format: {import_format}")
+
+
+def _parse_bool(value):
+    if isinstance(value, bool):
+        return value
+    return str(value).strip().lower() in TRUE_VALUES
+
+
+def _parse_record(record, categories, report, dry_run):
+    """Convert a raw record into a dict of Product field values"""
+    if not isinstance(record, dict):
+        raise ValueError('record must be an object')
+    if '_error' in record:
+        raise ValueError(record['_error'])
+    sku = str(record.get('sku') or '').strip()
+    if not sku:
+        raise ValueError('sku is required')
+
+    category_name = str(record.get('category_name') or record.get('category') or '').strip()
+    if not category_name:
+        raise ValueError('category is required')
+    category_id = categories.get(category_name)
+    if category_id is None:
+        if dry_run:
+            category_id = -len(categories) - 1
+        else:
+            category_id = Category.objects.get_or_create(name=category_name)[0].id
+        categories[category_name] = category_id
+        report.categories_created += 1
+
+    try:
+        price = Decimal(str(record.get('price', '')).strip())
+        # NaN quantizes fine but fails every comparison after it
+        if not price.is_finite():
+            raise InvalidOperation
+        price = price.quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"invalid price {record.get('price')!r}")
+    if price < 0:
+        raise ValueError('price must not be negative')
+
+    stock = int(record.get('stock') or 0)
+    if stock < 0:
+        raise ValueError('stock must not be negative')
+
+    is_active = record.get('is_active')
+    return {
+        'sku': sku,
+        'name': str(record.get('name') or '').strip() or sku,
+        'description': str(record.get('description') or ''),
+        'price': price,
+        'category_id': category_id,
+        'stock': stock,
+        'is_active': True if is_active in (None, '') else _parse_bool(is_active),
+    }
+
+
+def _apply_chunk(chunk, report, dry_run, max_changes):
+    """Upsert one chunk of parsed rows"""
+    existing = Product.objects.filter(sku__in=chunk.keys()).only('id', 'sku', *UPDATE_FIELDS)
+    existing = {product.sku: product for product in existing}
+    now = timezone.now()
+
+    to_create = []
+    to_update = []
+    restocked = []
+    for sku, values in chunk.items():
+        product = existing.get(sku)
+        if product is None:
+            to_create.append(Product(**values))
+            if len(report.changes) < max_changes:
+                report.changes.append({'sku': sku, 'action': 'create'})
+            continue
+
+        changed = {
+            field: (getattr(product, field), values[field])
+            for field in UPDATE_FIELDS
+            if getattr(product, field) != values[field]
+        }
+        if not changed:
+            report.unchanged += 1
+            continue
+
+        for field, (_, new) in changed.items():
+            setattr(product, field, new)
+        # bulk_update bypasses auto_now, and carts reprice off updated_at
+        product.updated_at = now
+        to_update.append(product)
+        if 'stock' in changed:
+            restocked.append(product)
+        if len(report.changes) < max_changes:
+            report.changes.append({
+                'sku': sku,
+                'action': 'update',
+                'fields': {field: [str(old), str(new)] for field, (old, new) in changed.items()},
+            })
+
+    report.created += len(to_create)
+    report.updated += len(to_update)
+    if dry_run:
+        return
+
+    with transaction.atomic():
+        Product.objects.bulk_create(to_create, batch_size=500)
+        Product.objects.bulk_update(to_update, UPDATE_FIELDS + ['updated_at'], batch_size=500)
+        absorb_stock_edits([product.pk for product in to_create + restocked])
+        pks = [product.pk for product in to_update]
+        transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks))
+
+
+def import_products(stream, import_format='csv', dry_run=False, chunk_size=CHUNK_SIZE,
+                    max_changes=100, max_errors=100):
+    """
+    Upsert products from a text stream keyed by ``sku``.
+    Invalid rows are skipped and reported; duplicate skus within a chunk keep the last row.
+    Bytes that are not UTF-8 are reported as an error on the line where reading stopped.
+    """
+    report = ImportReport(dry_run=dry_run)
+    categories = dict(Category.objects.values_list('name', 'id'))
+
+    chunk = {}
+    records = iter_records(stream, import_format)
+    line_number = 0
+    while True:
+        try:
+            line_number, record = next(records)
+        except StopIteration:
+            break
+        except UnicodeDecodeError:
+            # The rest of the file cannot be read; keep what was read so far
+            report.failed += 1
+            report.errors.append({'line': line_number + 1, 'error': 'file is not valid UTF-8, import stopped'})
+            break
+        report.rows += 1
+        try:
+            values = _parse_record(record, categories, report, dry_run)
+        except (ValueError, TypeError) as exc:
+            report.failed += 1
+            if len(report.errors) < max_errors:
+                report.errors.append({'line': line_number, 'error': str(exc)})
+            continue
+
+        chunk[values['sku']] = values
+        if len(chunk) >= chunk_size:
+            _apply_chunk(chunk, report, dry_run, max_changes)
+            chunk = {}
+
+    if chunk:
+        _apply_chunk(chunk, report, dry_run, max_changes)
+
+    report.finish()
+    return report
@@ -0,0 +1,279 @@
+"""
+Per-warehouse stock and order allocation.
+
+``WarehouseStock`` holds the units of a product at each warehouse and is
+the source of truth. ``Product.stock`` stays as the precomputed total over
+active warehouses, so catalog reads (and the snapshot) remain single-row;
+every write here keeps it in step in the same transaction.
+
+Placing an order loads the availability of its products in one indexed
+query and plans, per line, which warehouses ship it, using as few
+warehouses as it can:
+
+- Each warehouse gets a bitmask of the lines it can ship complete.
+- The smallest set of warehouses whose masks cover every line that any
+  single warehouse can ship is searched exhaustively while the number of
+  combinations stays under ``ALLOCATION_EXACT_LIMIT``, else greedily.
+  Among equally small sets the lowest summed ``priority`` wins.
+- Lines no warehouse can ship alone are split, drawing on warehouses
+  already shipping first and then on the largest stock.
+
+The plan is applied with guarded decrements, so a concurrent order that
+took the stock meanwhile makes this one fail instead of overselling.
+
+Direct edits of ``Product.stock`` (admin, bulk adjustments, imports, the
+product API) are treated as edits at the default warehouse
+(``DEFAULT_WAREHOUSE_CODE``) by ``absorb_stock_edits``; setting less than
+the other warehouses hold takes the difference out of them.
+"""
+from itertools import combinations
+from math import comb
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import OrderAllocation, Product, Warehouse, WarehouseStock
+from .signals import products_changed
+
+
+CHUNK_SIZE = 500
+
+
+class Unavailable(Exception):
+    """Not enough stock across the active warehouses for a product"""
+
+    def __init__(self, product_id, requested, available):
+        super().__init__(f'Product {product_id}: {requested} requested, {available} available')
+        self.product_id = product_id
+        self.requested = requested
+        self.available = available
+
+
+def default_warehouse():
+    warehouse, _ = Warehouse.objects.get_or_create(
+        code=settings.DEFAULT_WAREHOUSE_CODE,
+        defaults={'name': settings.DEFAULT_WAREHOUSE_CODE.title()},
+    )
+    return warehouse
+
+
+def load_availability(product_ids):
+    """
+    ({product id: {warehouse id: units}}, {warehouse id: priority}) for the
+    active warehouses holding stock of the products
+    """
+    rows = WarehouseStock.objects.filter(
+        product_id__in=product_ids, quantity__gt=0, warehouse__is_active=True
+    ).values_list('product_id', 'warehouse_id', 'quantity', 'warehouse__priority')
+    availability = {}
+    priorities = {}
+    for product_id, warehouse_id, quantity, priority in rows:
+        availability.setdefault(product_id, {})[warehouse_id] = quantity
+        priorities[warehouse_id] = priority
+    return availability, priorities
+
+
+def smallest_cover(target, masks, priorities, limit):
+    """Fewest warehouses whose line masks together cover ``target``"""
+    # Drop warehouses another one covers at least as well at no worse priority
+    candidates = sorted(masks, key=lambda warehouse: (-masks[warehouse].bit_count(), priorities[warehouse], warehouse))
+    kept = []
+    for warehouse in candidates:
+        mask = masks[warehouse]
+        if not any(masks[other] | mask == masks[other] and priorities[other] <= priorities[warehouse] for other in kept):
+            kept.append(warehouse)
+
+    size = 1
+    while size <= len(kept) and comb(len(kept), size) <= limit:
+        best = None
+        for group in combinations(kept, size):
+            covered = 0
+            for warehouse in group:
+                covered |= masks[warehouse]
+            if covered & target == target:
+                cost = sum(priorities[warehouse] for warehouse in group)
+                if best is None or cost < best[0]:
+                    best = (cost, group)
+        if best is not None:
+            return list(best[1])
+        size += 1
+
+    # Too many combinations left to search: greedy set cover
+    chosen = []
+    remaining = target
+    while remaining:
+        warehouse = max(
+            kept,
+            key=lambda warehouse: ((masks[warehouse] & remaining).bit_count(), -priorities[warehouse]),
+        )
+        chosen.append(warehouse)
+        remaining &= ~masks[warehouse]
+    return chosen
+
+
+def plan(lines, availability, priorities, limit=None):
+    """
+    Allocate (product id, quantity) lines. Returns one [(warehouse id, units)]
+    list per line. Raises Unavailable when a product is short overall.
+    """
+    limit = settings.ALLOCATION_EXACT_LIMIT if limit is None else limit
+    masks = {}
+    for index, (product_id, quantity) in enumerate(lines):
+        stock = availability.get(product_id, {})
+        available = sum(stock.values())
+        if available < quantity:
+            raise Unavailable(product_id, quantity, available)
+        for warehouse, units in stock.items():
+            if units >= quantity:
+                masks[warehouse] = masks.get(warehouse, 0) | 1 << index
+
+    target = 0
+    for mask in masks.values():
+        target |= mask
+    chosen = smallest_cover(target, masks, priorities, limit) if target else []
+
+    allocations = []
+    for index, (product_id, quantity) in enumerate(lines):
+        if target >> index & 1:
+            warehouse = next(warehouse for warehouse in chosen if masks[warehouse] >> index & 1)
+            allocations.append([(warehouse, quantity)])
+            continue
+        # Split: warehouses already shipping first, then the largest stock
+        stock = availability[product_id]
+        order = sorted(stock, key=lambda warehouse: (warehouse not in chosen, -stock[warehouse], priorities[warehouse]))
+        parts = []
+        for warehouse in order:
+            units = min(stock[warehouse], quantity)
+            parts.append((warehouse, units))
+            quantity -= units
+            if warehouse not in chosen:
+                chosen.append(warehouse)
+            if not quantity:
+                break
+        allocations.append(parts)
+    return allocations
+
+
+def allocate(items):
+    """
+    Reserve stock for saved order items and record where each ships from.
+    Must run inside the order's transaction. Raises Unavailable.
+    """
+    lines = [(item.product_id, item.quantity) for item in items]
+    availability, priorities = load_availability([product_id for product_id, _ in lines])
+    allocations = plan(lines, availability, priorities)
+
+    records = []
+    for item, parts in zip(items, allocations):
+        for warehouse_id, units in parts:
+            # Guarded: another order may have taken the units since they were read
+            updated = WarehouseStock.objects.filter(
+                warehouse_id=warehouse_id, product_id=item.product_id, quantity__gte=units
+            ).update(quantity=F('quantity') - units)
+            if not updated:
+                raise Unavailable(item.product_id, item.quantity, availability[item.product_id].get(warehouse_id, 0))
+            records.append(OrderAllocation(item=item, warehouse_id=warehouse_id, quantity=units))
+        updated = Product.objects.filter(
+            pk=item.product_id, stock__gte=item.quantity
+        ).update(stock=F('stock') - item.quantity)
+        if not updated:
+            raise Unavailable(item.product_id, item.quantity, 0)
+    OrderAllocation.objects.bulk_create(records, batch_size=CHUNK_SIZE)
+
+    pks = [product_id for product_id, _ in lines]
+    transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks, fields=['stock']))
+    return records
+
+
+def restock(items):
+    """Return cancelled order items to the warehouses they were allocated from"""
+    items = list(items)
+    allocations = OrderAllocation.objects.filter(item__in=items).values_list('item_id', 'warehouse_id', 'quantity')
+    returned = {}
+    for item_id, warehouse_id, quantity in allocations:
+        returned.setdefault(item_id, []).append((warehouse_id, quantity))
+    main = None
+    for item in items:
+        # Orders placed before warehouses existed go back to the default one
+        if item.id not in returned:
+            main = main or default_warehouse()
+        for warehouse_id, quantity in returned.get(item.id, [(main and main.id, item.quantity)]):
+            updated = WarehouseStock.objects.filter(
+                warehouse_id=warehouse_id, product_id=item.product_id
+            ).update(quantity=F('quantity') + quantity)
+            if not updated:
+                WarehouseStock.objects.create(warehouse_id=warehouse_id, product_id=item.product_id, quantity=quantity)
+
+    # Units returned to a deactivated warehouse must not count as sellable
+    pks = sorted({item.product_id for item in items})
+    refresh_totals(pks)
+    transaction.on_commit(lambda: products_changed.send(sender=Product, pks=pks, fields=['stock']))
+
+
+def active_total():
+    """Subquery: a product's units across active warehouses"""
+    totals = (
+        WarehouseStock.objects.filter(product=OuterRef('pk'), warehouse__is_active=True)
+        .order_by().values('product').annotate(total=Sum('quantity')).values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def refresh_totals(product_ids=None):
+    """Recompute Product.stock from the warehouses, for some products or all"""
+    queryset = Product.objects.all() if product_ids is None else Product.objects.filter(pk__in=product_ids)
+    return queryset.update(stock=active_total())
+
+
+def absorb_stock_edits(product_ids):
+    """
+    Product.stock was written directly: make the active warehouses hold
+    exactly that many units. The default warehouse takes up the difference
+    from the others; an edit below what the others hold empties it and
+    takes the rest out of them, the warehouses that ship last first.
+    Returns {product id: resulting stock}.
+    """
+    main = default_warehouse()
+    product_ids = list(product_ids)
+    totals = {}
+    for start in range(0, len(product_ids), CHUNK_SIZE):
+        chunk = product_ids[start:start + CHUNK_SIZE]
+        targets = dict(Product.objects.filter(pk__in=chunk).values_list('pk', 'stock'))
+        others = {}
+        for row in (
+            WarehouseStock.objects.filter(product_id__in=chunk, warehouse__is_active=True, quantity__gt=0)
+            .exclude(warehouse=main).order_by('-warehouse__priority', '-warehouse__code')
+        ):
+            others.setdefault(row.product_id, []).append(row)
+
+        rows = []
+        drained = []
+        for product_id, stock in targets.items():
+            held = others.get(product_id, [])
+            excess = sum(row.quantity for row in held) - stock
+            for row in held:
+                if excess <= 0:
+                    break
+                taken = min(row.quantity, excess)
+                row.quantity -= taken
+                excess -= taken
+                drained.append(row)
+            rows.append(WarehouseStock(warehouse=main, product_id=product_id, quantity=max(-excess, 0)))
+        WarehouseStock.objects.bulk_update(drained, ['quantity'], batch_size=CHUNK_SIZE)
+        WarehouseStock.objects.bulk_create(
+            rows, update_conflicts=True, unique_fields=['warehouse', 'product'], update_fields=['quantity'],
+        )
+        refresh_totals(chunk)
+        totals.update(Product.objects.filter(pk__in=chunk).values_list('pk', 'stock'))
+    return totals
+
+
+def product_saved(sender, instance, created, update_fields=None, raw=False, **kwargs):
+    """Receiver for Product post_save: absorb stock set through the model"""
+    if raw or (update_fields is not None and 'stock' not in update_fields):
+        return
+    if created or instance.stock != getattr(instance, '_loaded_stock', instance.stock):
+        absorb_stock_edits([instance.pk])
+        instance._loaded_stock = instance.stock
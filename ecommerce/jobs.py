@@ -0,0 +1,194 @@
+"""
+Database-backed background job queue.
+
+Jobs are rows in ``Job``. Workers claim them with a conditional UPDATE that
+sets a lease (``locked_until``); a job whose lease expires without being
+acknowledged is claimed again, which gives at-least-once delivery. Failed
+jobs are retried with exponential backoff until ``max_attempts``.
+``dedup_key`` keeps at most one queued job per key.
+"""
+import logging
+import os
+import random
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+from django.db.models import F, Q, Subquery
+from django.utils import timezone
+
+from .models import Job
+
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def register(name):
+    """Decorator registering a function as the handler for jobs called ``name``"""
+    def decorator(func):
+        _registry[name] = func
+        return func
+    return decorator
+
+
+def get_handler(name):
+    return _registry.get(name)
+
+
+def enqueue(name, payload=None, dedup_key=None, delay=0, max_attempts=None):
+    """
+    Queue a job. The row is written in the caller's transaction, so it only
+    becomes visible to workers if that transaction commits. Returns the job,
+    or None when a queued job with the same ``dedup_key`` already exists.
+    """
+    if name not in _registry:
+        raise ValueError(f"No job handler registered for {name!r}")
+
+    job = Job(
+        name=name,
+        payload=payload or {},
+        dedup_key=dedup_key,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+    )
+    if dedup_key is None:
+        job.save()
+        return job
+    try:
+        with transaction.atomic():
+            job.save()
+    except IntegrityError:
+        return None
+    return job
+
+
+def retry_delay(attempts):
+    """Exponential backoff with jitter, in seconds"""
+    delay = min(settings.JOB_RETRY_BACKOFF * 2 ** max(attempts - 1, 0), settings.JOB_RETRY_BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def _available(now):
+    # Queued and due, or running with an expired lease (worker died or hung)
+    return Q(status='queued', run_at__lte=now) | Q(status='running', locked_until__lt=now)
+
+
+def claim(worker_id, limit=1, visibility_timeout=None):
+    """Lease up to ``limit`` due jobs to ``worker_id``"""
+    now = timezone.now()
+    timeout = visibility_timeout or settings.JOB_VISIBILITY_TIMEOUT
+    locked_until = now + timedelta(seconds=timeout)
+
+    # A single UPDATE ... WHERE id IN (SELECT ... LIMIT n) takes the write lock
+    # up front; the repeated availability check makes concurrent claims lose cleanly
+    due = Job.objects.filter(_available(now)).order_by('run_at', 'id').values('id')[:limit]
+    claimed = Job.objects.filter(_available(now), id__in=Subquery(due)).update(
+        status='running',
+        locked_by=worker_id,
+        locked_until=locked_until,
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    if not claimed:
+        return []
+    return list(Job.objects.filter(status='running', locked_by=worker_id, locked_until=locked_until))
+
+
+def _owned(job):
+    return Job.objects.filter(pk=job.pk, status='running', locked_by=job.locked_by, locked_until=job.locked_until)
+
+
+def complete(job):
+    """Acknowledge a job; a no-op if its lease was lost to another worker"""
+    _owned(job).update(status='done', locked_until=None, updated_at=timezone.now())
+
+
+def fail(job, error):
+    """Schedule a retry with backoff, or give up after max_attempts"""
+    now = timezone.now()
+    if job.attempts >= job.max_attempts:
+        _owned(job).update(status='failed', last_error=error, locked_until=None, updated_at=now)
+        return
+    try:
+        with transaction.atomic():
+            _owned(job).update(
+                status='queued',
+                run_at=now + timedelta(seconds=retry_delay(job.attempts)),
+                last_error=error,
+                locked_until=None,
+                updated_at=now,
+            )
+    except IntegrityError:
+        # A newer job with the same dedup key is already queued and supersedes this one
+        _owned(job).update(status='done', last_error=error, locked_until=None, updated_at=now)
+
+
+def run_job(job):
+    """Execute one claimed job and record the outcome. Returns True on success"""
+    handler = get_handler(job.name)
+    if handler is None:
+        fail(job, f"No job handler registered for {job.name!r}")
+        return False
+    try:
+        handler(**job.payload)
+    except Exception:
+        logger.exception('Job %s #%s failed (attempt %s/%s)', job.name, job.pk, job.attempts, job.max_attempts)
+        fail(job, traceback.format_exc())
+        return False
+    complete(job)
+    return True
+
+
+def purge(older_than_days):
+    """Delete finished jobs older than the given number of days"""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    deleted, _ = Job.objects.filter(status__in=['done', 'failed'], updated_at__lt=cutoff).delete()
+    return deleted
+
+
+class Worker(threading.Thread):
+    """Thread that claims and runs jobs until ``stop_event`` is set"""
+
+    def __init__(self, index, stop_event, batch_size=10, poll_interval=1.0,
+                 visibility_timeout=None, drain=False):
+        super().__init__(name=f'job-worker-{index}', daemon=True)
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{index}'
+        self.stop_event = stop_event
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.visibility_timeout = visibility_timeout
+        self.drain = drain
+        self.processed = 0
+        self.failed = 0
+
+    def run_once(self):
+        """Claim one batch and run it. Returns the number of jobs claimed"""
+        close_old_connections()
+        jobs = claim(self.worker_id, self.batch_size, self.visibility_timeout)
+        for job in jobs:
+            if run_job(job):
+                self.processed += 1
+            else:
+                self.failed += 1
+        return len(jobs)
+
+    def run(self):
+        try:
+            while not self.stop_event.is_set():
+                try:
+                    claimed = self.run_once()
+                except Exception:
+                    logger.exception('Job worker %s failed to claim or record jobs', self.worker_id)
+                    claimed = 0
+                if claimed:
+                    continue
+                if self.drain:
+                    return
+                self.stop_event.wait(self.poll_interval)
+        finally:
+            connection.close()
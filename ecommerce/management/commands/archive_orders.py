@@ -0,0 +1,36 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ecommerce.archive import CHUNK_SIZE, archivable_orders, archive_orders
+
+
+class Command(BaseCommand):
+    help = 'Moves delivered and cancelled orders older than a cutoff into the archive tables'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+            help=f'Archive orders last updated more than this many days ago (default: {settings.ORDER_ARCHIVE_AFTER_DAYS})'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Orders moved per transaction (default: {CHUNK_SIZE})'
+        )
+        parser.add_argument('--limit', type=int, default=None, help='Stop after archiving this many orders')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many orders would be archived')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = archivable_orders(options['days']).count()
+            self.stdout.write(self.style.WARNING(f'{count} orders would be archived (dry run)'))
+            return
+
+        start = time.monotonic()
+        moved = archive_orders(options['days'], chunk_size=options['chunk_size'], limit=options['limit'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Archived {moved} orders in {time.monotonic() - start:.2f}s'
+        ))
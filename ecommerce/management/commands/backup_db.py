@@ -0,0 +1,111 @@
+import os
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from ecommerce import backups
+
+
+class Command(BaseCommand):
+    help = (
+        'Backs up the SQLite database online, in small page steps so writers are not blocked; '
+        'also lists, verifies and restores backups'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help=f'Backup directory (default: BACKUP_DIR = {settings.BACKUP_DIR})')
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=None,
+            help=f'Pages copied per step (default: BACKUP_PAGES_PER_STEP = {settings.BACKUP_PAGES_PER_STEP})'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=None,
+            help=f'Seconds between steps (default: BACKUP_STEP_SLEEP = {settings.BACKUP_STEP_SLEEP})'
+        )
+        parser.add_argument(
+            '--keep',
+            type=int,
+            default=None,
+            help=f'Newest backups to keep, 0 keeps all (default: BACKUP_KEEP = {settings.BACKUP_KEEP})'
+        )
+        parser.add_argument('--no-compress', action='store_true', help='Store the copy without gzip')
+        parser.add_argument('--list', action='store_true', help='List existing backups')
+        parser.add_argument('--verify', metavar='BACKUP', help='Check a backup without restoring it')
+        parser.add_argument('--restore', metavar='BACKUP', help='Verify a backup and restore it')
+        parser.add_argument(
+            '--target',
+            default=None,
+            help='Database file to restore into (default: the configured database)'
+        )
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive',
+                            help='Do not ask before restoring over the configured database')
+
+    def handle(self, *args, **options):
+        try:
+            if options['list']:
+                return self.list(options)
+            if options['verify']:
+                return self.verify(options)
+            if options['restore']:
+                return self.restore(options)
+            return self.backup(options)
+        except backups.BackupError as exc:
+            raise CommandError(str(exc))
+
+    def backup(self, options):
+        report = backups.backup(
+            directory=options['dir'],
+            pages_per_step=options['pages'],
+            step_sleep=options['sleep'],
+            compress=False if options['no_compress'] else None,
+            keep=options['keep'],
+        )
+        mib = 2 ** 20
+        self.stdout.write(self.style.SUCCESS(f'✓ Backed up {report.source} to {report.path}'))
+        self.stdout.write(
+            f'  {report.pages} pages ({report.database_bytes / mib:.1f} MiB, {report.journal_mode}) '
+            f'in {report.steps} steps, {report.restarts} restarts'
+        )
+        self.stdout.write(
+            f'  copy {report.copy_elapsed:.2f}s at {report.bytes_per_second / mib:.1f} MiB/s, '
+            f'{report.elapsed:.2f}s in total'
+        )
+        self.stdout.write(f'  stored {report.stored_bytes / mib:.1f} MiB, sha256 {report.sha256}')
+        self.stdout.write(
+            f'  max writer stall {report.max_stall * 1000:.2f} ms over {report.probes} write-lock probes'
+        )
+        if report.journal_mode != 'wal':
+            self.stdout.write(self.style.WARNING(
+                '⚠ The database is not in WAL mode: every write restarts the copy. See SQLITE_PRAGMAS.'
+            ))
+        for path in report.rotated:
+            self.stdout.write(f'  rotated out {path}')
+
+    def list(self, options):
+        paths = backups.list_backups(options['dir'])
+        if not paths:
+            self.stdout.write(self.style.WARNING('⚠ No backups found'))
+            return
+        for path in paths:
+            self.stdout.write(f'{path}  {path.stat().st_size / 2 ** 20:.1f} MiB')
+
+    def verify(self, options):
+        unpacked = backups.verify(options['verify'])
+        os.unlink(unpacked)
+        self.stdout.write(self.style.SUCCESS(f'✓ {options["verify"]} matches its checksum and passes integrity_check'))
+
+    def restore(self, options):
+        target = options['target']
+        if target is None:
+            live = backups.database_path()
+            if options['interactive']:
+                answer = input(f'This replaces every row in {live} with {options["restore"]}. Type "yes" to continue: ')
+                if answer != 'yes':
+                    raise CommandError('Restore cancelled')
+            # Persistent connections must reopen on the restored file
+            connections.close_all()
+        restored = backups.restore(options['restore'], target=target)
+        self.stdout.write(self.style.SUCCESS(f'✓ Restored {options["restore"]} into {restored}'))
@@ -0,0 +1,97 @@
+import random
+import statistics
+import time
+from django.core.management.base import BaseCommand
+from ecommerce.inventory import Unavailable, plan
+
+
+class Command(BaseCommand):
+    help = (
+        'Allocates synthetic orders across synthetic warehouse stock in memory and '
+        'reports planning time and how many warehouses each order ships from'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lines', type=int, default=50, help='Lines per order (default: 50)')
+        parser.add_argument('--warehouses', type=int, default=20, help='Warehouses (default: 20)')
+        parser.add_argument('--orders', type=int, default=200, help='Orders to allocate (default: 200)')
+        parser.add_argument('--coverage', type=float, default=0.3,
+                            help='Chance a warehouse stocks a given product (default: 0.3)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        warehouses = list(range(1, options['warehouses'] + 1))
+        priorities = {warehouse: rng.randint(0, 5) for warehouse in warehouses}
+
+        timings = []
+        shipments = []
+        naive_shipments = []
+        splits = 0
+        short = 0
+        invalid = 0
+        for _ in range(options['orders']):
+            lines, availability = self.make_order(rng, warehouses, options)
+            start = time.perf_counter()
+            try:
+                allocations = plan(lines, availability, priorities)
+            except Unavailable:
+                short += 1
+                continue
+            timings.append((time.perf_counter() - start) * 1000)
+            invalid += not self.is_valid(lines, availability, allocations)
+            shipments.append(len({warehouse for parts in allocations for warehouse, _ in parts}))
+            splits += sum(len(parts) > 1 for parts in allocations)
+            naive_shipments.append(self.naive_shipments(lines, availability, priorities))
+
+        self.stdout.write(self.style.WARNING(
+            f'{len(timings)} orders of {options["lines"]} lines over {len(warehouses)} warehouses '
+            f'({short} skipped for lack of stock)'
+        ))
+        timings.sort()
+        self.stdout.write(f'{"plan median":<24} {statistics.median(timings):>10.3f} ms')
+        self.stdout.write(f'{"plan p99":<24} {timings[int(len(timings) * 0.99) - 1]:>10.3f} ms')
+        self.stdout.write(f'{"plan max":<24} {timings[-1]:>10.3f} ms')
+        self.stdout.write(f'{"warehouses per order":<24} {statistics.mean(shipments):>10.2f} (max {max(shipments)})')
+        self.stdout.write(
+            f'{"  line by line":<24} {statistics.mean(naive_shipments):>10.2f} (max {max(naive_shipments)})'
+        )
+        self.stdout.write(f'{"lines split":<24} {splits:>10}')
+        if invalid:
+            self.stdout.write(self.style.ERROR(f'✗ {invalid} allocations do not match their lines or the stock'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Every allocation covers its lines within available stock'))
+
+    def make_order(self, rng, warehouses, options):
+        lines = []
+        availability = {}
+        for product_id in rng.sample(range(1, 100000), options['lines']):
+            quantity = rng.choice([1, 1, 1, 2, 3, 5, 10])
+            stock = {
+                warehouse: rng.randint(0, 20)
+                for warehouse in warehouses
+                if rng.random() < options['coverage']
+            }
+            availability[product_id] = {warehouse: units for warehouse, units in stock.items() if units}
+            lines.append((product_id, quantity))
+        return lines, availability
+
+    def naive_shipments(self, lines, availability, priorities):
+        """Warehouses shipped from when each line takes the first warehouse by priority with enough stock"""
+        used = set()
+        for product_id, quantity in lines:
+            stock = availability[product_id]
+            for warehouse in sorted(stock, key=lambda warehouse: (stock[warehouse] < quantity, priorities[warehouse], warehouse)):
+                used.add(warehouse)
+                quantity -= min(stock[warehouse], quantity)
+                if not quantity:
+                    break
+        return len(used)
+
+    def is_valid(self, lines, availability, allocations):
+        """Every line fully allocated, never beyond a warehouse's stock"""
+        return len(allocations) == len(lines) and all(
+            sum(units for _, units in parts) == quantity
+            and all(0 < units <= availability[product_id].get(warehouse, 0) for warehouse, units in parts)
+            for (product_id, quantity), parts in zip(lines, allocations)
+        )
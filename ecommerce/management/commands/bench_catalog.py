@@ -0,0 +1,165 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test.utils import override_settings
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmarks concurrent-connection capacity of one worker process for the '
+        'catalog read endpoints: sync DRF views under WSGI vs async views under ASGI'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', type=str, default='/api/products/', help='Endpoint to request')
+        parser.add_argument(
+            '--connections',
+            type=int,
+            nargs='+',
+            default=[8, 64, 256],
+            help='Concurrent client connections to test (default: 8 64 256)'
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=512,
+            help='Requests per run (default: 512)'
+        )
+        parser.add_argument(
+            '--threads',
+            type=int,
+            default=8,
+            help='WSGI worker threads per process, like gunicorn --threads (default: 8)'
+        )
+        parser.add_argument(
+            '--client-delay',
+            type=float,
+            default=0.05,
+            help='Seconds each client takes to read the response, simulating slow clients (default: 0.05)'
+        )
+
+    def handle(self, *args, **options):
+        path, _, query = options['path'].partition('?')
+        total = options['requests']
+        delay = options['client_delay']
+
+        self.stdout.write(self.style.WARNING(
+            f'Benchmarking {options["path"]}: {total} requests per run, '
+            f'{delay * 1000:.0f} ms client read time, {options["threads"]} WSGI threads'
+        ))
+        self.stdout.write(f'{"server":<6} {"conns":>6} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"peak":>6}')
+
+        for connections in options['connections']:
+            with override_settings(ASYNC_CATALOG_READS=False):
+                wsgi = self.run_wsgi(path, query, total, connections, options['threads'], delay)
+            self.report('wsgi', connections, wsgi)
+
+            with override_settings(ASYNC_CATALOG_READS=True):
+                asgi = asyncio.run(self.run_asgi(path, query, total, connections, delay))
+            self.report('asgi', connections, asgi)
+
+    def report(self, server, connections, result):
+        elapsed, latencies, peak = result
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        self.stdout.write(
+            f'{server:<6} {connections:>6} {len(latencies) / elapsed:>9.1f} '
+            f'{p50:>9.1f} {p99:>9.1f} {peak:>6}'
+        )
+
+    def run_wsgi(self, path, query, total, connections, threads, delay):
+        """Clients wait for a free worker thread, which stays pinned while they read"""
+        handler = WSGIHandler()
+        in_flight = 0
+        peak = 0
+        lock = threading.Lock()
+
+        def request(submitted):
+            nonlocal in_flight, peak
+            with lock:
+                in_flight += 1
+                peak = max(peak, in_flight)
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_ACCEPT': 'application/json',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+            }
+            body = b''.join(handler(environ, lambda status, headers: None))
+            time.sleep(delay)
+            with lock:
+                in_flight -= 1
+            assert body
+            return time.monotonic() - submitted
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            # Only `connections` clients are connected at any moment
+            gate = threading.Semaphore(connections)
+
+            def client():
+                with gate:
+                    submitted = time.monotonic()
+                    return pool.submit(request, submitted).result()
+
+            with ThreadPoolExecutor(max_workers=connections) as clients:
+                latencies = list(clients.map(lambda _: client(), range(total)))
+        return time.monotonic() - start, latencies, peak
+
+    async def run_asgi(self, path, query, total, connections, delay):
+        """Each connection is a coroutine; slow reads do not hold a thread"""
+        application = ASGIHandler()
+        gate = asyncio.Semaphore(connections)
+        in_flight = 0
+        peak = 0
+
+        async def request():
+            nonlocal in_flight, peak
+            async with gate:
+                submitted = time.monotonic()
+                in_flight += 1
+                peak = max(peak, in_flight)
+                scope = {
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': 'GET',
+                    'scheme': 'http',
+                    'path': path,
+                    'raw_path': path.encode(),
+                    'query_string': query.encode(),
+                    'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+                    'server': ('localhost', 80),
+                    'client': ('127.0.0.1', 0),
+                }
+                body = []
+
+                async def receive():
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+                async def send(message):
+                    if message['type'] == 'http.response.body':
+                        body.append(message.get('body', b''))
+                        if not message.get('more_body'):
+                            await asyncio.sleep(delay)
+
+                await application(scope, receive, send)
+                in_flight -= 1
+                assert body
+                return time.monotonic() - submitted
+
+        start = time.monotonic()
+        latencies = await asyncio.gather(*(request() for _ in range(total)))
+        return time.monotonic() - start, list(latencies), peak
@@ -0,0 +1,119 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from ecommerce.models import Product, Promotion
+from ecommerce.promotions import Pricing, discount, to_cents
+
+
+class Command(BaseCommand):
+    help = (
+        'Prices synthetic products against synthetic promotions with the compiled engine '
+        'and with a rule-by-rule scan, checking both agree'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=10000, help='Products to price (default: 10000)')
+        parser.add_argument('--rules', type=int, default=1000, help='Active promotions (default: 1000)')
+        parser.add_argument('--categories', type=int, default=50, help='Categories (default: 50)')
+        parser.add_argument('--page-size', type=int, default=12, help='Products per page (default: 12)')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per measurement (default: 5)')
+        parser.add_argument('--seed', type=int, default=1, help='Random seed (default: 1)')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        products = [
+            Product(
+                id=index + 1,
+                category_id=rng.randint(1, options['categories']),
+                price=Decimal(rng.randint(100, 2000000)).scaleb(-2),
+            )
+            for index in range(options['products'])
+        ]
+        rules = [self.make_rule(rng, index + 1, now, options) for index in range(options['rules'])]
+        active = sum(rule.starts_at <= now and (rule.ends_at is None or rule.ends_at > now) for rule in rules)
+
+        self.stdout.write(self.style.WARNING(
+            f'{len(products)} products, {len(rules)} promotions ({active} in effect now), '
+            f'{options["categories"]} categories'
+        ))
+        compile_ms = self.measure(lambda: Pricing(rules, now), options['repeat'])
+        pricing = Pricing(rules, now)
+        price_ms = self.measure(lambda: pricing.price_products(products), options['repeat'])
+        compiled = [(product.sale_price, product.promotion_id) for product in products]
+
+        page = products[:options['page_size']]
+        page_us = self.measure(lambda: pricing.price_products(page), options['repeat'] * 100) * 1000
+
+        scan_ms = self.measure(lambda: self.scan(products, rules, now), 1)
+        scanned = self.scan(products, rules, now)
+        mismatches = sum(
+            (product.price if sale_price is None else sale_price) != expected
+            for product, (sale_price, _), expected in zip(products, compiled, scanned)
+        )
+        discounted = sum(sale_price is not None for sale_price, _ in compiled)
+
+        self.stdout.write(f'{"compile rules":<24} {compile_ms:>10.2f} ms')
+        self.stdout.write(f'{"price all (compiled)":<24} {price_ms:>10.2f} ms  ({discounted} discounted)')
+        self.stdout.write(f'{"price one page":<24} {page_us:>10.1f} us  ({len(page)} products)')
+        self.stdout.write(f'{"price all (rule scan)":<24} {scan_ms:>10.2f} ms  ({scan_ms / price_ms:.0f}x slower)')
+        if mismatches:
+            self.stdout.write(self.style.ERROR(f'✗ {mismatches} sale prices differ from the rule scan'))
+        else:
+            self.stdout.write(self.style.SUCCESS('✓ Compiled prices match the rule scan'))
+
+    def make_rule(self, rng, rule_id, now, options):
+        scope = rng.choices(['product', 'category', 'cart'], weights=[80, 15, 5])[0]
+        kind = rng.choice(['percent', 'fixed'])
+        value = Decimal(rng.randint(5, 50)) if kind == 'percent' else Decimal(rng.randint(50, 50000)).scaleb(-2)
+        # Most in effect now; some already over or not started yet
+        offset = rng.choice([-1, -1, -1, -1, -2, 1])
+        starts_at = now + timedelta(days=offset)
+        ends_at = starts_at + timedelta(days=rng.choice([1, 3, 7])) if offset != -2 else starts_at + timedelta(hours=1)
+        return Promotion(
+            id=rule_id,
+            name=f'Promotion {rule_id}',
+            kind=kind,
+            value=value,
+            scope=scope,
+            product_id=rng.randint(1, options['products']) if scope == 'product' else None,
+            category_id=rng.randint(1, options['categories']) if scope == 'category' else None,
+            min_subtotal=Decimal(rng.randint(0, 100000)) if scope == 'cart' else Decimal(0),
+            starts_at=starts_at,
+            ends_at=ends_at,
+        )
+
+    def scan(self, products, rules, now):
+        """Reference pricing: every rule checked against every product"""
+        prices = []
+        for product in products:
+            cents = to_cents(product.price)
+            best = 0
+            for rule in rules:
+                if rule.starts_at > now or (rule.ends_at is not None and rule.ends_at <= now):
+                    continue
+                if not (
+                    (rule.scope == 'product' and rule.product_id == product.id)
+                    or (rule.scope == 'category' and rule.category_id == product.category_id)
+                ):
+                    continue
+                if rule.kind == 'percent':
+                    off, _ = discount(cents, (to_cents(rule.value), rule.id, 0, None))
+                else:
+                    off, _ = discount(cents, (0, None, to_cents(rule.value), rule.id))
+                best = max(best, off)
+            prices.append(Decimal(cents - best).scaleb(-2))
+        return prices
+
+    def measure(self, func, repeat):
+        """Median milliseconds per call"""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,177 @@
+import asyncio
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test import RequestFactory
+from django.test.utils import override_settings
+from ecommerce import singleflight
+
+
+# Cache key name -> path of the endpoints cached with single-flight
+ENDPOINTS = {
+    'featured': '/api/products/featured/',
+    'categories': '/api/categories/',
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Fires a burst of simultaneous requests at a cached catalog endpoint right after '
+        'its cache entry is dropped (cold) or invalidated (stale), with and without single-flight'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            choices=sorted(ENDPOINTS),
+            default='featured',
+            help='Single-flight cached endpoint to request (default: featured)'
+        )
+        parser.add_argument('--clients', type=int, default=200, help='Simultaneous requests (default: 200)')
+        parser.add_argument(
+            '--server',
+            choices=['wsgi', 'asgi'],
+            default='wsgi',
+            help='Serve through threaded WSGI (sync views) or ASGI (async views) (default: wsgi)'
+        )
+        parser.add_argument(
+            '--query-delay',
+            type=float,
+            default=0.005,
+            help='Seconds added to every SQL query, standing in for a loaded database (default: 0.005)'
+        )
+
+    def handle(self, *args, **options):
+        path, query = ENDPOINTS[options['endpoint']], ''
+        self.queries = 0
+        self.lock = threading.Lock()
+        self.delay = options['query_delay']
+
+        # Count (and slow down) every query, on connections opened from here on
+        connections.close_all()
+        connection_created.connect(self.instrument, dispatch_uid='bench_thundering_herd')
+
+        self.stdout.write(self.style.WARNING(
+            f'{options["clients"]} simultaneous {options["server"].upper()} requests to {path}, '
+            f'{self.delay * 1000:.1f} ms added per query'
+        ))
+        self.stdout.write(
+            f'{"single-flight":<14} {"cache":<6} {"computed":>9} {"queries":>8} {"p50 ms":>9} {"p99 ms":>9}'
+        )
+        key = singleflight.request_key(options['endpoint'], RequestFactory().get(path, SERVER_NAME='localhost'))
+        overrides = {
+            'CATALOG_SNAPSHOT_READS': False,
+            'ASYNC_CATALOG_READS': options['server'] == 'asgi',
+            # The added query delay would flood the slow-query log
+            'SLOW_QUERY_THRESHOLD_MS': None,
+        }
+        try:
+            for enabled in (False, True):
+                with override_settings(SINGLE_FLIGHT_ENABLED=enabled, **overrides):
+                    for scenario in ('cold', 'stale'):
+                        self.run(options['server'], path, query, options['clients'])  # warm the entry
+                        if scenario == 'cold':
+                            singleflight.get_cache().delete(singleflight.entry_key(key))
+                        else:
+                            singleflight.invalidate()
+                        singleflight.stats.clear()
+                        self.queries = 0
+                        latencies = self.run(options['server'], path, query, options['clients'])
+                        self.report('on' if enabled else 'off', scenario, latencies)
+        finally:
+            connection_created.disconnect(dispatch_uid='bench_thundering_herd')
+            connections.close_all()
+
+    def instrument(self, sender, connection, **kwargs):
+        def wrapper(execute, sql, params, many, context):
+            with self.lock:
+                self.queries += 1
+            time.sleep(self.delay)
+            return execute(sql, params, many, context)
+
+        connection.execute_wrappers.append(wrapper)
+
+    def report(self, mode, scenario, latencies):
+        latencies.sort()
+        p50 = statistics.median(latencies) * 1000
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+        self.stdout.write(
+            f'{mode:<14} {scenario:<6} {singleflight.stats["computed"]:>9} {self.queries:>8} '
+            f'{p50:>9.1f} {p99:>9.1f}'
+        )
+
+    def run(self, server, path, query, clients):
+        if server == 'asgi':
+            return asyncio.run(self.run_asgi(path, query, clients))
+        return self.run_wsgi(path, query, clients)
+
+    def run_wsgi(self, path, query, clients):
+        """One thread per client, released together"""
+        handler = WSGIHandler()
+        barrier = threading.Barrier(clients)
+
+        def request(_):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': query,
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'REMOTE_ADDR': '127.0.0.1',
+                'HTTP_ACCEPT': 'application/json',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': BytesIO(),
+            }
+            barrier.wait()
+            start = time.monotonic()
+            statuses = []
+            body = b''.join(handler(environ, lambda status, headers: statuses.append(status)))
+            assert statuses[0].startswith('200') and body, statuses
+            return time.monotonic() - start
+
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            latencies = list(pool.map(request, range(clients)))
+        connections.close_all()
+        return latencies
+
+    async def run_asgi(self, path, query, clients):
+        """All clients start in the same event loop iteration"""
+        application = ASGIHandler()
+
+        async def request():
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': query.encode(),
+                'headers': [(b'host', b'localhost'), (b'accept', b'application/json')],
+                'server': ('localhost', 80),
+                'client': ('127.0.0.1', 0),
+            }
+            start = time.monotonic()
+            messages = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                messages.append(message)
+
+            await application(scope, receive, send)
+            assert messages[0]['status'] == 200, messages[0]
+            return time.monotonic() - start
+
+        latencies = await asyncio.gather(*(request() for _ in range(clients)))
+        return list(latencies)
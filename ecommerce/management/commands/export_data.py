@@ -0,0 +1,62 @@
+import sys
+import time
+from django.core.management.base import BaseCommand
+from ecommerce.exports import EXPORTS, EXPORT_FORMATS, CHUNK_SIZE, stream_export
+
+
+class Command(BaseCommand):
+    help = 'Streams products, orders or order items to a file or stdout as NDJSON or CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('resource', choices=list(EXPORTS), help='What to export')
+        parser.add_argument(
+            '--format',
+            dest='export_format',
+            choices=list(EXPORT_FORMATS),
+            default='ndjson',
+            help='Output format (default: ndjson)'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            default='-',
+            help='Output file path, "-" for stdout. A .gz suffix enables gzip compression'
+        )
+        parser.add_argument('--gzip', action='store_true', help='Force gzip compression')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows fetched per database round trip (default: {CHUNK_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        output = options['output']
+        compress = options['gzip'] or output.endswith('.gz')
+        chunks = stream_export(
+            options['resource'],
+            options['export_format'],
+            compress=compress,
+            chunk_size=options['chunk_size'],
+        )
+
+        start = time.monotonic()
+        written = 0
+        if output == '-':
+            stream = sys.stdout.buffer
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+            stream.flush()
+            return
+
+        with open(output, 'wb') as stream:
+            for chunk in chunks:
+                stream.write(chunk)
+                written += len(chunk)
+
+        elapsed = time.monotonic() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Exported {options["resource"]} to {output} '
+            f'({written / 1024:.1f} KiB in {elapsed:.2f}s)'
+        ))
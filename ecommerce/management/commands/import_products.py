@@ -0,0 +1,76 @@
+import gzip
+import io
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from ecommerce.imports import IMPORT_ENCODING, IMPORT_FORMATS, CHUNK_SIZE, import_products
+
+
+class Command(BaseCommand):
+    help = 'Upserts products from a CSV or NDJSON file keyed by sku'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='File to import, "-" for stdin. .gz files are decompressed')
+        parser.add_argument(
+            '--format',
+            dest='import_format',
+            choices=list(IMPORT_FORMATS),
+            help='Input format (default: guessed from the file extension, else csv)'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Report the diff without writing')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=CHUNK_SIZE,
+            help=f'Rows written per transaction (default: {CHUNK_SIZE})'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the full report as JSON')
+
+    def open_stream(self, path):
+        if path == '-':
+            return io.TextIOWrapper(sys.stdin.buffer, encoding=IMPORT_ENCODING, newline='')
+        try:
+            if path.endswith('.gz'):
+                return gzip.open(path, 'rt', encoding=IMPORT_ENCODING, newline='')
+            return open(path, 'r', encoding=IMPORT_ENCODING, newline='')
+        except OSError as e:
+            raise CommandError(f'Could not open {path}: {e}')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        import_format = options['import_format']
+        if not import_format:
+            import_format = 'ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv'
+
+        with self.open_stream(path) as stream:
+            report = import_products(
+                stream,
+                import_format,
+                dry_run=options['dry_run'],
+                chunk_size=options['chunk_size'],
+            )
+
+        if options['json']:
+            self.stdout.write(json.dumps(report.as_dict(), indent=2))
+            return
+
+        if report.dry_run:
+            self.stdout.write(self.style.WARNING('Dry run - no changes written'))
+            for change in report.changes:
+                if change['action'] == 'create':
+                    self.stdout.write(f'  + {change["sku"]}')
+                else:
+                    fields = ', '.join(f'{k}: {old} -> {new}' for k, (old, new) in change['fields'].items())
+                    self.stdout.write(f'  ~ {change["sku"]} ({fields})')
+
+        for error in report.errors:
+            self.stdout.write(self.style.WARNING(f'  ⚠ Line {error["line"]}: {error["error"]}'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {report.rows} rows: {report.created} created, {report.updated} updated, '
+            f'{report.unchanged} unchanged, {report.failed} failed, '
+            f'{report.categories_created} new categories'
+        ))
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {report.elapsed:.2f}s ({report.rows_per_second:,.0f} rows/s)'
+        ))
@@ -0,0 +1,24 @@
+import time
+from django.core.management.base import BaseCommand
+from ecommerce.models import RevokedToken
+from ecommerce.revocation import PURGE_BATCH_SIZE, purge_expired
+
+
+class Command(BaseCommand):
+    help = 'Deletes revocations of refresh tokens that have expired, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=PURGE_BATCH_SIZE,
+            help=f'Rows deleted per transaction (default: {PURGE_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        start = time.monotonic()
+        deleted = purge_expired(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Purged {deleted} expired revocations in {time.monotonic() - start:.2f}s, '
+            f'{RevokedToken.objects.count()} remain'
+        ))
@@ -0,0 +1,36 @@
+import sqlite3
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from ecommerce.db import replica_aliases
+
+
+class Command(BaseCommand):
+    help = 'Copies the primary SQLite database into each configured replica file (DATABASE_REPLICAS)'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('refresh_replicas only supports SQLite databases')
+
+        aliases = replica_aliases()
+        if not aliases:
+            self.stdout.write(self.style.WARNING('⚠ No replicas configured. Set DATABASE_REPLICAS to a comma-separated list of files.'))
+            return
+
+        for alias in aliases:
+            # Drop persistent connections so they reopen on the fresh copy
+            connections[alias].close()
+            start = time.monotonic()
+            source = sqlite3.connect(str(primary['NAME']))
+            target = sqlite3.connect(str(settings.DATABASES[alias]['NAME']))
+            try:
+                # The online backup API gives a consistent snapshot while the primary is in use
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ Refreshed {alias} ({settings.DATABASES[alias]["NAME"]}) in {time.monotonic() - start:.2f}s'
+            ))
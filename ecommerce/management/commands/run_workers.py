@@ -0,0 +1,102 @@
+import signal
+import subprocess
+import sys
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ecommerce.jobs import Worker, purge
+from ecommerce.tasks import schedule_backup, schedule_token_purge
+
+
+class Command(BaseCommand):
+    help = 'Runs background job workers (thread pool, optionally across several processes)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=4, help='Worker threads per process (default: 4)')
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=1,
+            help='Worker processes to start, each with --threads threads (default: 1)'
+        )
+        parser.add_argument('--batch-size', type=int, default=10, help='Jobs claimed per round trip (default: 10)')
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=1.0,
+            help='Seconds to wait when the queue is empty (default: 1.0)'
+        )
+        parser.add_argument(
+            '--visibility-timeout',
+            type=int,
+            default=None,
+            help=f'Seconds a claimed job is leased (default: JOB_VISIBILITY_TIMEOUT = {settings.JOB_VISIBILITY_TIMEOUT})'
+        )
+        parser.add_argument('--drain', action='store_true', help='Exit once the queue is empty')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1:
+            return self.run_processes(options)
+
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+        purged = purge(settings.JOB_RETENTION_DAYS)
+        if purged:
+            self.stdout.write(f'Purged {purged} finished jobs')
+        # Recurring: each run queues the next one
+        schedule_token_purge(delay=0)
+        schedule_backup()
+
+        workers = [
+            Worker(
+                index,
+                stop,
+                batch_size=options['batch_size'],
+                poll_interval=options['poll_interval'],
+                visibility_timeout=options['visibility_timeout'],
+                drain=options['drain'],
+            )
+            for index in range(options['threads'])
+        ]
+        self.stdout.write(self.style.SUCCESS(f'✓ Started {len(workers)} job worker threads'))
+        start = time.monotonic()
+        for worker in workers:
+            worker.start()
+        while any(worker.is_alive() for worker in workers):
+            for worker in workers:
+                worker.join(timeout=0.5)
+
+        processed = sum(worker.processed for worker in workers)
+        failed = sum(worker.failed for worker in workers)
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ Workers stopped: {processed} jobs done, {failed} failed '
+            f'in {time.monotonic() - start:.1f}s'
+        ))
+
+    def run_processes(self, options):
+        """Start one child `run_workers` process per --processes and wait for them"""
+        args = [
+            sys.executable, sys.argv[0], 'run_workers',
+            '--threads', str(options['threads']),
+            '--batch-size', str(options['batch_size']),
+            '--poll-interval', str(options['poll_interval']),
+        ]
+        if options['visibility_timeout']:
+            args += ['--visibility-timeout', str(options['visibility_timeout'])]
+        if options['drain']:
+            args.append('--drain')
+
+        children = [subprocess.Popen(args) for _ in range(options['processes'])]
+        self.stdout.write(self.style.SUCCESS(f'✓ Started {len(children)} worker processes'))
+
+        def forward(signum, frame):
+            for child in children:
+                child.send_signal(signum)
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, forward)
+        for child in children:
+            child.wait()
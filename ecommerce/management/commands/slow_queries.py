@@ -0,0 +1,58 @@
+import json
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from ecommerce import querylog
+
+
+class Command(BaseCommand):
+    help = (
+        'Dumps the slow-query log, optionally grouped by normalized query fingerprint. '
+        'Reads the shared cache, so it sees web workers\' queries when REDIS_URL is set'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--aggregate', action='store_true', help='Group records by query fingerprint')
+        parser.add_argument('--limit', type=int, default=None, help='Only consider the newest N records')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of a report')
+        parser.add_argument('--clear', action='store_true', help='Empty the log after printing it')
+
+    def handle(self, *args, **options):
+        entries = querylog.records(options['limit'])
+        result = querylog.aggregate(entries) if options['aggregate'] else entries
+
+        if options['json']:
+            self.stdout.write(json.dumps(result, indent=2, default=str))
+        elif not entries:
+            self.stdout.write(f'No queries slower than {settings.SLOW_QUERY_THRESHOLD_MS} ms recorded')
+        elif options['aggregate']:
+            self.write_summary(result)
+        else:
+            self.write_records(result)
+
+        if options['clear']:
+            querylog.clear()
+            self.stdout.write(self.style.SUCCESS('✓ Slow-query log cleared'))
+
+    def write_plan(self, plan):
+        for row in plan or []:
+            self.stdout.write(f'    {row}')
+
+    def write_records(self, entries):
+        for entry in entries:
+            self.stdout.write(self.style.WARNING(
+                f'{entry["time"]}  {entry["duration_ms"]:.1f} ms  [{entry["fingerprint"]}]  '
+                f'{entry["view"] or "-"}  {entry["origin"] or "-"}'
+            ))
+            self.stdout.write(f'  {entry["sql"]}')
+            self.stdout.write(f'  params: {entry["params_shape"]}')
+            self.write_plan(entry['plan'])
+
+    def write_summary(self, groups):
+        self.stdout.write(f'{"fingerprint":<13} {"count":>6} {"total ms":>10} {"avg ms":>9} {"max ms":>9}  views')
+        for group in groups:
+            self.stdout.write(
+                f'{group["fingerprint"]:<13} {group["count"]:>6} {group["total_ms"]:>10.1f} '
+                f'{group["avg_ms"]:>9.1f} {group["max_ms"]:>9.1f}  {", ".join(group["views"]) or "-"}'
+            )
+            self.stdout.write(f'  {group["query"]}')
+            self.write_plan(group['plan'])
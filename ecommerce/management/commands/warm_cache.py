@@ -0,0 +1,39 @@
+import json
+from django.core.management.base import BaseCommand
+from ecommerce.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = (
+        'Warms routes, serializers, database connections and the first catalog pages, '
+        'reporting how long each startup phase takes'
+    )
+    # System checks would import the URLconf first and hide its import time
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=None,
+            help='Product list pages to request (default: WARM_CACHE_PRODUCT_PAGES)'
+        )
+        parser.add_argument(
+            '--search',
+            nargs='*',
+            default=None,
+            help='Search terms to request (default: WARM_CACHE_SEARCH_TERMS)'
+        )
+        parser.add_argument('--json', action='store_true', help='Print the phase timings as JSON')
+
+    def handle(self, *args, **options):
+        report = warm_up(pages=options['pages'], search_terms=options['search'])
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        self.stdout.write(f'{"phase":<14} {"ms":>9}  detail')
+        for entry in report:
+            self.stdout.write(f'{entry["phase"]:<14} {entry["ms"]:>9.1f}  {entry["detail"]}')
+        total = sum(entry['ms'] for entry in report)
+        self.stdout.write(self.style.SUCCESS(f'✓ Warm-up finished in {total:.1f} ms'))
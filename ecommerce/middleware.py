@@ -0,0 +1,246 @@
+import hashlib
+import time
+from importlib import import_module
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.http import JsonResponse
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from . import admission, ratelimit
+from .querylog import current_request
+from .db import begin_request, end_request, is_pinned, pin_to_primary, replica_aliases
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Environ key set on the worker's own warm-up requests (ecommerce.warmup).
+# Clients cannot send it: their headers only reach the environ as HTTP_*.
+WARM_UP_KEY = 'ecommerce.warm_up'
+
+
+def client_key(request):
+    """Identify the client across workers: bearer token, else session cookie"""
+    credential = request.headers.get('Authorization') or request.COOKIES.get('sessionid')
+    if not credential:
+        return None
+    return hashlib.sha1(credential.encode()).hexdigest()
+
+
+def user_id(request):
+    """
+    The authenticated user's id, for per-user rate limits: the ``user_id``
+    claim of a valid bearer token, else the user of the session cookie.
+    Unlike ``client_key`` this cannot be changed by sending a new credential.
+    """
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header is not None else None
+    if raw_token is not None:
+        try:
+            return auth.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+        except (InvalidToken, KeyError):
+            return None
+    session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if session_key:
+        # Runs before SessionMiddleware, so read the session store directly
+        return import_module(settings.SESSION_ENGINE).SessionStore(session_key).get(SESSION_KEY)
+    return None
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe requests read catalog models from replicas unless the client
+    wrote recently, and pins clients to the primary after they write.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def begin(self, request):
+        if not replica_aliases():
+            return None, begin_request(False)
+        key = client_key(request)
+        use_replicas = request.method in SAFE_METHODS and not is_pinned(key)
+        return key, begin_request(use_replicas)
+
+    def end(self, key, token):
+        state = end_request(token)
+        if state.wrote and key:
+            pin_to_primary(key)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key, token = self.begin(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self.end(key, token)
+
+    async def __acall__(self, request):
+        key, token = self.begin(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            self.end(key, token)
+
+
+class RateLimitMiddleware:
+    """
+    Applies the token-bucket budgets in ``settings.RATE_LIMITS`` before the
+    view runs, answering 429 with ``Retry-After`` once a bucket is empty.
+    Requests to other paths only pay for one dict lookup. Warm-up requests
+    are never limited.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = ratelimit.compile_rules(settings.RATE_LIMITS)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def check(self, rule, request):
+        header = settings.RATE_LIMIT_IP_HEADER
+        if header and request.META.get(header):
+            ip = request.META[header].split(',')[0].strip()
+        else:
+            ip = request.META.get('REMOTE_ADDR', '')
+        return ratelimit.check(rule, ip, user_id(request))
+
+    def reject(self, rejected):
+        budget, wait = rejected
+        seconds = ratelimit.retry_after(wait)
+        response = JsonResponse(
+            {'detail': f'Request was throttled. Expected available in {seconds} seconds.'},
+            status=429,
+        )
+        response['Retry-After'] = str(seconds)
+        response['X-RateLimit-Limit'] = budget.rate
+        return response
+
+    def rule(self, request):
+        if request.META.get(WARM_UP_KEY):
+            return None
+        return self.rules.get((request.path_info, request.method))
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        rule = self.rule(request)
+        if rule is not None:
+            rejected = self.check(rule, request)
+            if rejected:
+                return self.reject(rejected)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        rule = self.rule(request)
+        if rule is not None:
+            # Cache backends may block on the network; keep that off the event loop
+            rejected = await sync_to_async(self.check, thread_sensitive=False)(rule, request)
+            if rejected:
+                return self.reject(rejected)
+        return await self.get_response(request)
+
+
+class AdmissionControlMiddleware:
+    """
+    Queues requests per priority class when the process is at
+    ``ADMISSION_CAPACITY`` and sheds them with 503 and ``Retry-After`` when
+    their class's queue is full or its deadline cannot be met. Warm-up
+    requests bypass it.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.routes = admission.compile_routes(settings.ADMISSION_ROUTES)
+        self.gate = admission.get_gate()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def route_class(self, request):
+        if not settings.ADMISSION_CONTROL_ENABLED or request.META.get(WARM_UP_KEY):
+            return None
+        name = admission.classify(
+            self.routes, settings.ADMISSION_DEFAULT_CLASS, request.path_info, request.method
+        )
+        return None if name is None else self.gate.classes[name]
+
+    def reject(self, shed):
+        response = JsonResponse(
+            {'detail': f'Server is busy. Try again in {shed.retry_after} seconds.'},
+            status=503,
+        )
+        response['Retry-After'] = str(shed.retry_after)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        route_class = self.route_class(request)
+        if route_class is None:
+            return self.get_response(request)
+        try:
+            self.gate.acquire(route_class)
+        except admission.Shed as shed:
+            admission.record_shed(shed, request.path_info)
+            return self.reject(shed)
+        start = time.monotonic()
+        try:
+            return self.get_response(request)
+        finally:
+            self.gate.leave(route_class, time.monotonic() - start)
+
+    async def __acall__(self, request):
+        route_class = self.route_class(request)
+        if route_class is None:
+            return await self.get_response(request)
+        try:
+            await self.gate.aacquire(route_class)
+        except admission.Shed as shed:
+            await sync_to_async(admission.record_shed, thread_sensitive=False)(shed, request.path_info)
+            return self.reject(shed)
+        start = time.monotonic()
+        try:
+            return await self.get_response(request)
+        finally:
+            self.gate.leave(route_class, time.monotonic() - start)
+
+
+class QueryLogMiddleware:
+    """Makes the current request available to the slow-query recorder"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = current_request.set(request)
+        try:
+            return self.get_response(request)
+        finally:
+            current_request.reset(token)
+
+    async def __acall__(self, request):
+        token = current_request.set(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            current_request.reset(token)
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0002_cart'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='sku',
+            field=models.CharField(blank=True, help_text='Stable external key used by bulk imports', max_length=64, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0008_order_user_created_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('view', 'View'), ('impression', 'Impression')], max_length=20)),
+                ('period_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('sampled', models.BooleanField(default=False)),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='ecommerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period_start', 'product'], name='product_event_period_idx')],
+            },
+        ),
+    ]
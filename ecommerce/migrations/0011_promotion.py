@@ -0,0 +1,47 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:15
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0010_revoked_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedorder',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='discount_amount',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.CreateModel(
+            name='Promotion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+                ('kind', models.CharField(choices=[('percent', 'Percentage'), ('fixed', 'Fixed amount')], max_length=20)),
+                ('value', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)])),
+                ('scope', models.CharField(choices=[('product', 'Product'), ('category', 'Category'), ('cart', 'Cart')], max_length=20)),
+                ('min_subtotal', models.DecimalField(decimal_places=2, default=0, help_text='Cart promotions only: smallest cart subtotal, after product discounts, they apply to', max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('starts_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('ends_at', models.DateTimeField(blank=True, null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='ecommerce.category')),
+                ('product', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='promotions', to='ecommerce.product')),
+            ],
+            options={
+                'ordering': ['-starts_at'],
+                'indexes': [models.Index(fields=['is_active', 'ends_at'], name='promotion_active_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:19
+
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+from django.conf import settings
+
+
+def stock_into_default_warehouse(apps, schema_editor):
+    """Existing stock becomes the stock of the default warehouse"""
+    Product = apps.get_model('ecommerce', 'Product')
+    Warehouse = apps.get_model('ecommerce', 'Warehouse')
+    WarehouseStock = apps.get_model('ecommerce', 'WarehouseStock')
+    code = settings.DEFAULT_WAREHOUSE_CODE
+    warehouse, _ = Warehouse.objects.get_or_create(code=code, defaults={'name': code.title()})
+    rows = (
+        WarehouseStock(warehouse=warehouse, product_id=product_id, quantity=stock)
+        for product_id, stock in Product.objects.values_list('id', 'stock').iterator(chunk_size=1000)
+    )
+    WarehouseStock.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0011_promotion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Warehouse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('code', models.CharField(max_length=32, unique=True)),
+                ('name', models.CharField(max_length=200)),
+                ('priority', models.IntegerField(default=0)),
+                ('is_active', models.BooleanField(default=True, help_text='Inactive warehouses neither ship nor count towards Product.stock')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['priority', 'code'],
+            },
+        ),
+        migrations.CreateModel(
+            name='WarehouseStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='warehouse_stock', to='ecommerce.product')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock', to='ecommerce.warehouse')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='OrderAllocation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='allocations', to='ecommerce.orderitem')),
+                ('warehouse', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='allocations', to='ecommerce.warehouse')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='warehousestock',
+            constraint=models.UniqueConstraint(fields=('product', 'warehouse'), name='warehouse_stock_unique'),
+        ),
+        migrations.RunPython(stock_into_default_warehouse, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ecommerce', '0012_warehouses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='promotion',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
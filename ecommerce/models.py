@@ -1,5 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 
 
@@ -19,6 +22,7 @@ class Category(models.Model):
 
 class Product(models.Model):
     """Products available in the store"""
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text='Stable external key used by bulk imports')
     name = models.CharField(max_length=200)
     description = models.TextField()
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -31,15 +35,79 @@ class Product(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='product_created_idx'),
+        ]
     
     def __str__(self):
         return self.name
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded stock so saves that edit it reach the warehouses
+        if 'stock' in field_names:
+            instance._loaded_stock = values[field_names.index('stock')]
+        return instance
+
     @property
     def in_stock(self):
         return self.stock > 0
 
 
+class Promotion(models.Model):
+    """
+    Discount on a product, on every product of a category, or on carts from
+    a minimum subtotal, valid between ``starts_at`` and ``ends_at``.
+    Applied by ecommerce.promotions: the best one per product and per cart.
+    """
+    KIND_CHOICES = [
+        ('percent', 'Percentage'),
+        ('fixed', 'Fixed amount'),
+    ]
+    SCOPE_CHOICES = [
+        ('product', 'Product'),
+        ('category', 'Category'),
+        ('cart', 'Cart'),
+    ]
+    
+    name = models.CharField(max_length=200)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    value = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, null=True, blank=True, related_name='promotions')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, null=True, blank=True, related_name='promotions')
+    min_subtotal = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)],
+        help_text='Cart promotions only: smallest cart subtotal, after product discounts, they apply to'
+    )
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(null=True, blank=True)
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Workers compare the latest of these (and the row count) to spot edits
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['-starts_at']
+        indexes = [
+            models.Index(fields=['is_active', 'ends_at'], name='promotion_active_idx'),
+        ]
+    
+    def __str__(self):
+        return self.name
+    
+    def clean(self):
+        targets = {'product': self.product_id, 'category': self.category_id}
+        for scope, target in targets.items():
+            if (self.scope == scope) != (target is not None):
+                raise ValidationError({scope: f"Required for {scope} promotions and only allowed for them"})
+        if self.kind == 'percent' and self.value is not None and self.value > 100:
+            raise ValidationError({'value': "A percentage cannot exceed 100"})
+        if self.ends_at and self.starts_at and self.ends_at <= self.starts_at:
+            raise ValidationError({'ends_at': "Must be after starts_at"})
+
+
 class Order(models.Model):
     """Customer orders"""
     STATUS_CHOICES = [
@@ -53,6 +121,8 @@ class Order(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='orders')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    # Cart promotion taken off the sum of the items; item prices include product promotions
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     shipping_address = models.TextField()
     phone_number = models.CharField(max_length=20)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -60,9 +130,29 @@ class Order(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['created_at'], name='order_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+            models.Index(fields=['user', 'created_at'], name='order_user_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order #{self.id} - {self.user.username}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the loaded status so save() can detect status changes
+        if 'status' in field_names:
+            instance._loaded_status = values[field_names.index('status')]
+        return instance
+    
+    def save(self, *args, **kwargs):
+        status_changed = self.status != getattr(self, '_loaded_status', None)
+        super().save(*args, **kwargs)
+        if status_changed:
+            self._loaded_status = self.status
+            OrderStatusEvent.record(self)
 
 
 class OrderItem(models.Model):
@@ -80,4 +170,339 @@ class OrderItem(models.Model):
     
     @property
     def subtotal(self):
-        return self.quantity * self.price
\ No newline at end of file
+        return self.quantity * self.price
+
+
+class Warehouse(models.Model):
+    """Stock location orders ship from; lower ``priority`` ships first on ties"""
+    code = models.CharField(max_length=32, unique=True)
+    name = models.CharField(max_length=200)
+    priority = models.IntegerField(default=0)
+    is_active = models.BooleanField(default=True, help_text='Inactive warehouses neither ship nor count towards Product.stock')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['priority', 'code']
+
+    def __str__(self):
+        return self.name
+
+
+class WarehouseStock(models.Model):
+    """
+    Units of a product at a warehouse. Product.stock is kept as the total
+    over active warehouses by ecommerce.inventory.
+    """
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, related_name='stock')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='warehouse_stock')
+    quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'warehouse'], name='warehouse_stock_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity}x product #{self.product_id} at {self.warehouse_id}"
+
+
+class OrderAllocation(models.Model):
+    """Units of an order item shipped from a warehouse"""
+    item = models.ForeignKey(OrderItem, on_delete=models.CASCADE, related_name='allocations')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, related_name='allocations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+
+    def __str__(self):
+        return f"{self.quantity}x from {self.warehouse_id}"
+
+
+class ArchivedOrder(models.Model):
+    """Delivered or cancelled order moved out of the hot Order table by archive_orders"""
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_orders')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    discount_amount = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    shipping_address = models.TextField()
+    phone_number = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='archived_order_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Archived order #{self.id}"
+
+
+class ArchivedOrderItem(models.Model):
+    """Line of an archived order; the product name is kept in case the product is deleted"""
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    product_name = models.CharField(max_length=200)
+    quantity = models.IntegerField()
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product_name}"
+    
+    @property
+    def subtotal(self):
+        return self.quantity * self.price
+
+
+class OrderStatusEvent(models.Model):
+    """Order status change, streamed to the order's owner over Server-Sent Events"""
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='status_events')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='order_events')
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['user', 'id'], name='order_event_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Order #{self.order_id} -> {self.status}"
+    
+    @classmethod
+    def record(cls, order):
+        """Store a status change and publish it to live subscribers once committed"""
+        from .events import broker
+        
+        event = cls.objects.create(order=order, user_id=order.user_id, status=order.status)
+        transaction.on_commit(lambda: broker.publish(event))
+        return event
+    
+    def as_dict(self):
+        return {
+            'id': self.id,
+            'order_id': self.order_id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+        }
+
+
+class ProductEvent(models.Model):
+    """
+    Append-only product analytics. Each row is a count of one kind of event
+    for a product within a minute, pre-aggregated by ecommerce.analytics.
+    """
+    KIND_CHOICES = [
+        ('view', 'View'),
+        ('impression', 'Impression'),
+    ]
+    
+    # No FK constraint or cascade: deleting a product must not scan the events
+    product = models.ForeignKey(
+        Product, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    period_start = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    # Counted while the buffer was under backpressure: extrapolated from a sample
+    sampled = models.BooleanField(default=False)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['period_start', 'product'], name='product_event_period_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.count} {self.kind} of product #{self.product_id} at {self.period_start}"
+
+
+class RevokedToken(models.Model):
+    """
+    Refresh token revoked before it expired, by JTI. Workers keep a bloom
+    filter of these (ecommerce.revocation) and follow new rows by id.
+    """
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    revoked_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"Revoked token {self.jti}"
+
+
+class Cart(models.Model):
+    """Server-side shopping cart, one per user.
+
+    ``subtotal`` and ``item_count`` are running totals that are adjusted on
+    every line change instead of being recomputed from all lines.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='cart')
+    subtotal = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    item_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"Cart of {self.user.username}"
+    
+    def _apply_delta(self, amount, count):
+        """Adjust the running totals by the given amount and item count"""
+        if not amount and not count:
+            return
+        Cart.objects.filter(pk=self.pk).update(
+            subtotal=F('subtotal') + amount,
+            item_count=F('item_count') + count,
+            updated_at=timezone.now(),
+        )
+        self.refresh_from_db(fields=['subtotal', 'item_count', 'updated_at'])
+    
+    def refresh_prices(self):
+        """Reprice only the lines whose product changed since they were priced"""
+        stale = self.items.filter(
+            priced_at__lt=F('product__updated_at')
+        ).select_related('product')
+        delta = 0
+        now = timezone.now()
+        for item in stale:
+            delta += (item.product.price - item.unit_price) * item.quantity
+            item.unit_price = item.product.price
+            item.priced_at = now
+            item.save(update_fields=['unit_price', 'priced_at'])
+        self._apply_delta(delta, 0)
+    
+    def set_quantity(self, product, quantity):
+        """Set the quantity of a product in the cart (0 removes the line)"""
+        with transaction.atomic():
+            item = self.items.filter(product=product).first()
+            if item is None:
+                if quantity <= 0:
+                    return None
+                item = self.items.create(
+                    product=product,
+                    quantity=quantity,
+                    unit_price=product.price,
+                    priced_at=timezone.now(),
+                )
+                self._apply_delta(item.subtotal, quantity)
+                return item
+            
+            if quantity <= 0:
+                item.delete()
+                self._apply_delta(-item.subtotal, -item.quantity)
+                return None
+            
+            diff = quantity - item.quantity
+            item.quantity = quantity
+            item.save(update_fields=['quantity'])
+            self._apply_delta(diff * item.unit_price, diff)
+            return item
+    
+    def add_product(self, product, quantity=1):
+        """Add a quantity of a product to the cart; safe against concurrent adds"""
+        for attempt in range(2):
+            try:
+                with transaction.atomic():
+                    # Increment in the database so concurrent adds never lose one
+                    if self.items.filter(product=product).update(quantity=F('quantity') + quantity):
+                        item = self.items.get(product=product)
+                        self._apply_delta(item.unit_price * quantity, quantity)
+                        return item
+                    item = self.items.create(
+                        product=product,
+                        quantity=quantity,
+                        unit_price=product.price,
+                        priced_at=timezone.now(),
+                    )
+                    self._apply_delta(item.subtotal, quantity)
+                    return item
+            except IntegrityError:
+                # A concurrent first add created the line: add to it instead
+                if attempt:
+                    raise
+    
+    def remove_product(self, product):
+        """Remove a product line from the cart"""
+        self.set_quantity(product, 0)
+    
+    def merge(self, items):
+        """
+        Merge a client-side cart (list of product/quantity pairs) into this cart.
+        The larger quantity wins so that merging the same cart twice is harmless.
+        """
+        with transaction.atomic():
+            existing = {item.product_id: item.quantity for item in self.items.all()}
+            for product, quantity in items:
+                if quantity > existing.get(product.id, 0):
+                    self.set_quantity(product, quantity)
+    
+    def clear(self):
+        """Remove all lines and reset the running totals"""
+        self.items.all().delete()
+        Cart.objects.filter(pk=self.pk).update(
+            subtotal=0, item_count=0, updated_at=timezone.now()
+        )
+        self.refresh_from_db(fields=['subtotal', 'item_count', 'updated_at'])
+
+
+class CartItem(models.Model):
+    """A product line in a cart, priced when added or last repriced"""
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
+    priced_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['cart', 'product']
+        ordering = ['id']
+    
+    def __str__(self):
+        return f"{self.quantity}x {self.product.name}"
+    
+    @property
+    def subtotal(self):
+        return self.quantity * self.unit_price
+
+
+class Job(models.Model):
+    """Background job stored in the database and executed by run_workers"""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='queued')
+    dedup_key = models.CharField(max_length=200, null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)
+    locked_by = models.CharField(max_length=100, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+        constraints = [
+            # At most one queued job per dedup key; a running one may be
+            # followed by a new queued one so later changes are not lost
+            models.UniqueConstraint(
+                fields=['dedup_key'],
+                condition=models.Q(status='queued'),
+                name='job_pending_dedup_key',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
@@ -0,0 +1,264 @@
+"""
+Promotions engine.
+
+``Pricing`` compiles the promotions in effect into lookup tables: for every
+product id and category id only the best percentage and the best fixed
+discount are kept, and cart promotions are sorted by threshold with the best
+discount reachable at each one. Pricing a product is then two dict lookups
+however many rules there are, and ``price`` runs a whole page of products
+through them in one pass over integer cents.
+
+A product gets its single best product or category discount; a cart gets
+its single best cart discount, on the subtotal after product discounts.
+
+Compiled pricing holds for the current time only. It records when the next
+promotion starts or ends (``valid_until``) and is recompiled then, or when
+any promotion changes. Changes are spotted from the database itself: the
+latest ``updated_at`` and the row count of ``Promotion`` (``signature``)
+move on every edit, insert and delete. Catalog reads recheck them at most
+every ``PROMOTIONS_RECHECK_SECONDS``; checkout rechecks on every order, so
+what a customer is charged never depends on per-process state. The catalog
+snapshot and single-flight entries embed sale prices, so the same two events
+refresh them: promotion writes through their receivers, window boundaries
+through the ``promotions_window`` job queued by ``schedule_window``.
+"""
+import threading
+import time
+from bisect import bisect_right
+from collections import namedtuple
+from decimal import ROUND_HALF_UP, Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Min, Q
+from django.utils import timezone
+
+from .models import Job, Promotion
+
+
+WINDOW_JOB = 'promotions_window'
+RULE_FIELDS = ['id', 'kind', 'value', 'scope', 'product_id', 'category_id', 'min_subtotal', 'starts_at', 'ends_at']
+
+# (basis points, promotion id, fixed cents, promotion id)
+NO_DISCOUNT = (0, None, 0, None)
+
+Quote = namedtuple('Quote', 'unit_prices promotions subtotal discount total promotion')
+
+
+def to_cents(amount):
+    return int((amount * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def better(best, rule):
+    """``best`` with ``rule`` in it, if it improves either kind of discount"""
+    if rule.kind == 'percent':
+        points = to_cents(rule.value)
+        if points > best[0]:
+            return (points, rule.id, best[2], best[3])
+    else:
+        cents = to_cents(rule.value)
+        if cents > best[2]:
+            return (best[0], best[1], cents, rule.id)
+    return best
+
+
+def discount(cents, best):
+    """(cents off, promotion id) for the larger of the two discounts in ``best``"""
+    percent_off = (cents * best[0] + 5000) // 10000
+    if percent_off >= best[2]:
+        off, promotion_id = percent_off, best[1]
+    else:
+        off, promotion_id = best[2], best[3]
+    off = min(off, cents)
+    return (off, promotion_id) if off else (0, None)
+
+
+class Pricing:
+    """Promotions in effect at ``now``, compiled for lookups by product and category"""
+
+    def __init__(self, rules, now, version=None):
+        self.version = version
+        self.compiled_at = now
+        self.by_product = {}
+        self.by_category = {}
+        self.rule_count = 0
+        boundaries = []
+        cart_rules = []
+        for rule in rules:
+            if rule.starts_at > now:
+                boundaries.append(rule.starts_at)
+                continue
+            if rule.ends_at is not None:
+                if rule.ends_at <= now:
+                    continue
+                boundaries.append(rule.ends_at)
+            self.rule_count += 1
+            if rule.scope == 'cart':
+                cart_rules.append(rule)
+            elif rule.scope == 'product':
+                self.by_product[rule.product_id] = better(self.by_product.get(rule.product_id, NO_DISCOUNT), rule)
+            else:
+                self.by_category[rule.category_id] = better(self.by_category.get(rule.category_id, NO_DISCOUNT), rule)
+        self.valid_until = min(boundaries, default=None)
+
+        # Best cart discount among all thresholds up to each one
+        cart_rules.sort(key=lambda rule: rule.min_subtotal)
+        self.cart_thresholds = []
+        self.cart_best = []
+        best = NO_DISCOUNT
+        for rule in cart_rules:
+            best = better(best, rule)
+            self.cart_thresholds.append(to_cents(rule.min_subtotal))
+            self.cart_best.append(best)
+
+    def is_valid(self, now):
+        return self.valid_until is None or now < self.valid_until
+
+    def price(self, rows):
+        """
+        Sale prices for (product id, category id, price in cents) rows, as
+        [(sale price in cents, promotion id or None)] in the same order.
+        """
+        by_product = self.by_product
+        by_category = self.by_category
+        prices = []
+        append = prices.append
+        for product_id, category_id, cents in rows:
+            own = by_product.get(product_id, NO_DISCOUNT)
+            inherited = by_category.get(category_id, NO_DISCOUNT)
+            if own is NO_DISCOUNT and inherited is NO_DISCOUNT:
+                append((cents, None))
+                continue
+            percent = own[:2] if own[0] >= inherited[0] else inherited[:2]
+            fixed = own[2:] if own[2] >= inherited[2] else inherited[2:]
+            off, promotion_id = discount(cents, percent + fixed)
+            append((cents - off, promotion_id))
+        return prices
+
+    def cart_discount(self, cents):
+        """(cents off, promotion id) for a cart subtotal in cents"""
+        index = bisect_right(self.cart_thresholds, cents) - 1
+        if index < 0:
+            return 0, None
+        return discount(cents, self.cart_best[index])
+
+    def price_products(self, products):
+        """Set ``sale_price`` (None without a discount) and ``promotion_id`` on each product"""
+        prices = self.price([(product.id, product.category_id, to_cents(product.price)) for product in products])
+        for product, (cents, promotion_id) in zip(products, prices):
+            product.sale_price = None if promotion_id is None else from_cents(cents)
+            product.promotion_id = promotion_id
+        return products
+
+    def quote(self, lines):
+        """Price (product, quantity, unit price) lines as an order would be charged"""
+        prices = self.price([
+            (product.id, product.category_id, to_cents(unit_price)) for product, _, unit_price in lines
+        ])
+        subtotal = sum(cents * quantity for (cents, _), (_, quantity, _) in zip(prices, lines))
+        off, promotion_id = self.cart_discount(subtotal)
+        return Quote(
+            unit_prices=[from_cents(cents) for cents, _ in prices],
+            promotions=[line_promotion for _, line_promotion in prices],
+            subtotal=from_cents(subtotal),
+            discount=from_cents(off),
+            total=from_cents(subtotal - off),
+            promotion=promotion_id,
+        )
+
+
+def signature():
+    """(latest updated_at, row count) of Promotion: changes on every edit, insert and delete"""
+    row = Promotion.objects.aggregate(updated=Max('updated_at'), count=Count('id'))
+    return row['updated'], row['count']
+
+
+def load(now, version=None):
+    """Compile the promotions that are in effect or still to come"""
+    rules = (
+        Promotion.objects.filter(is_active=True)
+        .filter(Q(ends_at__isnull=True) | Q(ends_at__gt=now))
+        .only(*RULE_FIELDS)
+    )
+    return Pricing(rules, now, version)
+
+
+_pricing = None
+_checked_at = None
+_lock = threading.Lock()
+
+
+def current(fresh=False):
+    """
+    This process's compiled pricing, recompiled when stale. ``fresh`` checks
+    the database for promotion edits now rather than within
+    PROMOTIONS_RECHECK_SECONDS; checkout passes it.
+    """
+    global _pricing, _checked_at
+    now = timezone.now()
+    pricing = _pricing
+    if (
+        not fresh and pricing is not None and pricing.is_valid(now) and _checked_at is not None
+        and time.monotonic() - _checked_at < settings.PROMOTIONS_RECHECK_SECONDS
+    ):
+        return pricing
+    with _lock:
+        version = signature()
+        _checked_at = time.monotonic()
+        pricing = _pricing
+        if pricing is None or pricing.version != version or not pricing.is_valid(now):
+            pricing = _pricing = load(now, version)
+    return pricing
+
+
+# For the async views, which must not query from the event loop
+acurrent = sync_to_async(current)
+
+
+def for_context(context):
+    """Pricing passed in a serializer context, else the current one"""
+    return context.get('promotions') or current()
+
+
+def next_boundary(now):
+    """When the next active promotion starts or ends, or None"""
+    promotions = Promotion.objects.filter(is_active=True)
+    bounds = promotions.aggregate(
+        start=Min('starts_at', filter=Q(starts_at__gt=now)),
+        end=Min('ends_at', filter=Q(ends_at__gt=now)),
+    )
+    return min((bound for bound in bounds.values() if bound is not None), default=None)
+
+
+def schedule_window():
+    """Queue the promotions_window job for the next start or end, replacing a queued one"""
+    from .jobs import enqueue
+
+    now = timezone.now()
+    boundary = next_boundary(now)
+    with transaction.atomic():
+        Job.objects.filter(name=WINDOW_JOB, status='queued').delete()
+        if boundary is not None:
+            enqueue(WINDOW_JOB, dedup_key='promotions-window', delay=(boundary - now).total_seconds())
+    return boundary
+
+
+def changed():
+    """
+    Recheck at once in this process (others follow within
+    PROMOTIONS_RECHECK_SECONDS, or at their next checkout), and reschedule
+    the next window boundary
+    """
+    global _checked_at
+    _checked_at = None
+    schedule_window()
+
+
+def promotion_changed(sender, **kwargs):
+    """Receiver for Promotion post_save/post_delete"""
+    transaction.on_commit(changed)
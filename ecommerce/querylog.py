@@ -0,0 +1,231 @@
+"""
+Slow-query recorder.
+
+``record_slow_queries`` is installed as a database execute wrapper on every
+connection. Queries slower than ``SLOW_QUERY_THRESHOLD_MS`` are captured with
+their parameter shape, originating view/action, the first project frame
+that issued them and the ``EXPLAIN QUERY PLAN`` output. Records go to a ring
+buffer of ``SLOW_QUERY_LOG_SIZE`` slots in the shared cache, so the staff
+endpoint and the ``slow_queries`` command see queries from every worker.
+"""
+import contextvars
+import hashlib
+import logging
+import re
+import sys
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+SEQUENCE_KEY = 'slowq:seq'
+SQL_MAX_LENGTH = 4000
+PARAMS_SHAPE_MAX = 20
+PLAN_CACHE_SIZE = 256
+
+# Request being served, set by QueryLogMiddleware, for attributing queries to views
+current_request = contextvars.ContextVar('ecommerce_querylog_request', default=None)
+
+_local = threading.local()
+_plans = {}
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:\s*(?:%s|\?|N)\s*,?)+\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+
+
+def get_cache():
+    return caches[getattr(settings, 'SLOW_QUERY_CACHE', 'default')]
+
+
+def normalize(sql):
+    """Replace literals and collapse IN lists so equivalent queries compare equal"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('N', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(sql):
+    return hashlib.sha1(normalize(sql).encode()).hexdigest()[:12]
+
+
+def params_shape(params, many):
+    """Types of the parameters, never their values"""
+    if many:
+        params = list(params or [])
+        return {'rows': len(params), 'row': params_shape(params[0], False) if params else []}
+    if params is None:
+        return []
+    if isinstance(params, dict):
+        return {key: type(value).__name__ for key, value in list(params.items())[:PARAMS_SHAPE_MAX]}
+    shape = [type(value).__name__ for value in list(params)[:PARAMS_SHAPE_MAX]]
+    if len(params) > PARAMS_SHAPE_MAX:
+        shape.append(f'... {len(params) - PARAMS_SHAPE_MAX} more')
+    return shape
+
+
+def view_name(request):
+    """'ProductViewSet.search' for DRF viewsets, the view's dotted name otherwise"""
+    if request is None or request.resolver_match is None:
+        return None
+    func = request.resolver_match.func
+    # Async catalog views wrap the sync viewset that owns the route
+    func = getattr(func, 'sync_view', func)
+    cls = getattr(func, 'cls', None)
+    if cls is None:
+        return request.resolver_match.view_name
+    action = getattr(func, 'actions', {}).get(request.method.lower())
+    return f'{cls.__name__}.{action}' if action else cls.__name__
+
+
+def stack_origin():
+    """First project frame outside this module and third-party packages"""
+    base = str(settings.BASE_DIR)
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if (
+            filename.startswith(base)
+            and filename != __file__
+            and 'site-packages' not in filename
+        ):
+            return f'{filename[len(base) + 1:]}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+def explain(connection, sql, params, key):
+    """Query plan rows, cached per fingerprint and connection vendor"""
+    if sql.lstrip()[:6].upper() not in ('SELECT', 'UPDATE', 'DELETE'):
+        return None
+    if key in _plans:
+        return _plans[key]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    _local.explaining = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            plan = [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as exc:
+        plan = [f'EXPLAIN failed: {exc}']
+    finally:
+        _local.explaining = False
+    if len(_plans) >= PLAN_CACHE_SIZE:
+        _plans.clear()
+    _plans[key] = plan
+    return plan
+
+
+def store(record):
+    """Write a record into the next ring buffer slot"""
+    cache = get_cache()
+    try:
+        sequence = cache.incr(SEQUENCE_KEY)
+    except ValueError:
+        cache.add(SEQUENCE_KEY, 0, timeout=None)
+        sequence = cache.incr(SEQUENCE_KEY)
+    record['seq'] = sequence
+    cache.set(f'slowq:{sequence % settings.SLOW_QUERY_LOG_SIZE}', record, timeout=None)
+
+
+def record_slow_queries(execute, sql, params, many, context):
+    """Execute wrapper timing every query and recording the slow ones"""
+    if getattr(_local, 'explaining', False):
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = (time.perf_counter() - start) * 1000
+        if duration >= settings.SLOW_QUERY_THRESHOLD_MS:
+            try:
+                capture(sql, params, many, context['connection'], duration)
+            except Exception:
+                logger.exception('Failed to record slow query')
+
+
+def capture(sql, params, many, connection, duration):
+    key = fingerprint(sql)
+    request = current_request.get()
+    record = {
+        'time': timezone.now().isoformat(),
+        'duration_ms': round(duration, 2),
+        'alias': connection.alias,
+        'fingerprint': key,
+        'sql': sql[:SQL_MAX_LENGTH],
+        'params_shape': params_shape(params, many),
+        'view': view_name(request),
+        'path': request.path if request is not None else None,
+        'origin': stack_origin(),
+        'plan': None if many or not settings.SLOW_QUERY_EXPLAIN else explain(connection, sql, params, key),
+    }
+    logger.warning('Slow query (%.1f ms) %s from %s', duration, key, record['view'] or record['origin'])
+    store(record)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver adding the recorder to the connection"""
+    if settings.SLOW_QUERY_THRESHOLD_MS is None:
+        return
+    if record_slow_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_slow_queries)
+
+
+def records(limit=None):
+    """Recorded slow queries, newest first"""
+    cache = get_cache()
+    sequence = cache.get(SEQUENCE_KEY) or 0
+    size = settings.SLOW_QUERY_LOG_SIZE
+    first = max(sequence - size + 1, 1)
+    keys = [f'slowq:{seq % size}' for seq in range(sequence, first - 1, -1)]
+    if limit is not None:
+        keys = keys[:limit]
+    found = cache.get_many(keys)
+    return [found[key] for key in keys if key in found]
+
+
+def aggregate(entries):
+    """Group records by fingerprint, slowest total time first"""
+    groups = {}
+    for entry in entries:
+        group = groups.get(entry['fingerprint'])
+        if group is None:
+            group = groups[entry['fingerprint']] = {
+                'fingerprint': entry['fingerprint'],
+                'query': normalize(entry['sql']),
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'views': set(),
+                'origins': set(),
+                'last_seen': entry['time'],
+                'plan': entry['plan'],
+            }
+        group['count'] += 1
+        group['total_ms'] += entry['duration_ms']
+        group['max_ms'] = max(group['max_ms'], entry['duration_ms'])
+        if entry['view']:
+            group['views'].add(entry['view'])
+        if entry['origin']:
+            group['origins'].add(entry['origin'])
+        group['last_seen'] = max(group['last_seen'], entry['time'])
+    summary = sorted(groups.values(), key=lambda group: group['total_ms'], reverse=True)
+    for group in summary:
+        group['total_ms'] = round(group['total_ms'], 2)
+        group['avg_ms'] = round(group['total_ms'] / group['count'], 2)
+        group['views'] = sorted(group['views'])
+        group['origins'] = sorted(group['origins'])
+    return summary
+
+
+def clear():
+    cache = get_cache()
+    cache.delete_many([SEQUENCE_KEY] + [f'slowq:{slot}' for slot in range(settings.SLOW_QUERY_LOG_SIZE)])
+    _plans.clear()
@@ -0,0 +1,158 @@
+"""
+Token-bucket rate limiting for expensive routes.
+
+Each bucket is a single integer in the shared cache: its "theoretical arrival
+time" in milliseconds (GCRA, the cell-rate form of a token bucket). Admitting
+a request is an atomic ``incr`` by the per-token interval; a request that
+would push the value more than one period ahead is rejected and the increment
+rolled back. No locks or read-modify-write round trips are needed, so the
+counters are safe to share between processes and hosts.
+"""
+import logging
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+SCOPES = ('user', 'ip', 'route')
+
+# Buckets outlive their refill period so an idle-then-busy client cannot get
+# a fresh burst from an expired key more than once per this many periods
+KEY_LIFETIME_PERIODS = 10
+
+
+def parse_rate(rate):
+    """'10/min' -> (capacity, period in seconds)"""
+    capacity, _, period = rate.partition('/')
+    count, unit = '', period
+    while unit and unit[0].isdigit():
+        count, unit = count + unit[0], unit[1:]
+    return int(capacity), PERIODS[unit] * int(count or 1)
+
+
+class Budget:
+    """One token bucket definition: ``capacity`` requests per ``period`` seconds"""
+
+    def __init__(self, rule, scope, rate):
+        self.rule = rule
+        self.scope = scope
+        self.rate = rate
+        self.capacity, self.period = parse_rate(rate)
+        self.period_ms = self.period * 1000
+        self.interval_ms = max(self.period_ms // self.capacity, 1)
+        self.timeout = self.period * KEY_LIFETIME_PERIODS
+
+    def consume(self, cache, ident):
+        """Take one token. Returns 0 when admitted, else seconds until a token is free"""
+        key = f'rl:{self.rule}:{self.scope}:{ident}'
+        now = int(time.time() * 1000)
+        interval = self.interval_ms
+        try:
+            tat = cache.incr(key, interval)
+        except ValueError:
+            if cache.add(key, now + interval, timeout=self.timeout):
+                return 0
+            tat = cache.incr(key, interval)
+        if tat - interval < now:
+            # The bucket refilled completely while idle: restart it from now
+            tat = cache.incr(key, now - (tat - interval))
+        if tat - now > self.period_ms:
+            cache.decr(key, interval)
+            return (tat - now - self.period_ms) / 1000
+        return 0
+
+    def refund(self, cache, ident):
+        """Give back a token taken by ``consume``"""
+        try:
+            cache.decr(f'rl:{self.rule}:{self.scope}:{ident}', self.interval_ms)
+        except ValueError:
+            pass
+
+
+class Rule:
+    """The budgets applying to one path, checked in order"""
+
+    def __init__(self, name, config):
+        self.name = name
+        self.path = config['path']
+        self.methods = [method.upper() for method in config.get('methods', ['GET', 'POST'])]
+        self.budgets = [Budget(name, scope, config[scope]) for scope in SCOPES if config.get(scope)]
+
+
+def compile_rules(config):
+    """Index rules by (path, method) so unlimited requests cost one dict lookup"""
+    rules = {}
+    for name, options in config.items():
+        rule = Rule(name, options)
+        for method in rule.methods:
+            rules[(rule.path, method)] = rule
+    return rules
+
+
+def get_cache():
+    return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+
+def check(rule, ip, user_id=None):
+    """
+    Consume a token from every budget of ``rule``. Returns None when the
+    request is admitted, else the budget that rejected it and the wait in
+    seconds; the tokens already taken from earlier budgets are refunded, so
+    a rejected request costs nothing. ``user_id`` is the authenticated
+    user's id, if any.
+    """
+    cache = get_cache()
+    consumed = []
+    for budget in rule.budgets:
+        if budget.scope == 'route':
+            ident = '-'
+        elif budget.scope == 'user':
+            ident = f'u{user_id}' if user_id is not None else ip
+        else:
+            ident = ip
+        wait = budget.consume(cache, ident)
+        if wait:
+            for taken, taken_ident in consumed:
+                taken.refund(cache, taken_ident)
+            record_rejection(cache, budget, ip)
+            return budget, wait
+        consumed.append((budget, ident))
+    return None
+
+
+def rejection_key(rule, scope):
+    return f'rl-rejected:{rule}:{scope}'
+
+
+def record_rejection(cache, budget, ip):
+    key = rejection_key(budget.rule, budget.scope)
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            cache.incr(key)
+    logger.warning('Rate limited %s (%s %s) for %s', budget.rule, budget.scope, budget.rate, ip)
+
+
+def retry_after(wait):
+    return max(math.ceil(wait), 1)
+
+
+def rejection_counts(config=None):
+    """Rejections per rule and scope since the cache was last cleared"""
+    config = settings.RATE_LIMITS if config is None else config
+    keys = {
+        rejection_key(name, scope): (name, scope)
+        for name, options in config.items()
+        for scope in SCOPES if options.get(scope)
+    }
+    counts = get_cache().get_many(list(keys))
+    stats = {}
+    for key, (name, scope) in keys.items():
+        stats.setdefault(name, {})[scope] = counts.get(key, 0)
+    return stats
@@ -0,0 +1,201 @@
+"""
+Refresh token revocation.
+
+Rotating a refresh token revokes the old one by inserting its JTI into
+``RevokedToken``. The unique JTI makes that insert the check-and-set: of two
+concurrent refreshes with the same token, only one gets a new token.
+
+Checking a token does not touch the database in the common case. Each
+process keeps a bloom filter of the revoked JTIs that have not expired yet,
+built from the table on first use (or during warm-up). A JTI the filter does
+not contain was never revoked; only filter hits, revoked tokens and the
+occasional false positive (``TOKEN_REVOCATION_ERROR_RATE``), are confirmed
+with a query.
+
+Other processes' revocations reach the filter incrementally: at most every
+``TOKEN_REVOCATION_SYNC_SECONDS`` a check first reads the rows added since
+the highest id it has seen. A token revoked elsewhere within that window
+still fails at the insert. Expired rows are deleted in bulk by the
+``purge_revoked_tokens`` job, and a filter that outgrows its capacity is
+rebuilt from the remaining rows.
+"""
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import RevokedToken
+
+
+logger = logging.getLogger(__name__)
+
+PURGE_BATCH_SIZE = 1000
+
+
+class BloomFilter:
+    """Fixed-size bit array with ``hashes`` positions per key (double hashing)"""
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = max(int(-self.capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        size = self.size
+        return [(first + i * step) % size for i in range(self.hashes)]
+
+    def add(self, key):
+        bits = self.bits
+        for position in self.positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.positions(key))
+
+
+class RevocationList:
+    """Per-process view of ``RevokedToken``: a bloom filter and the last id read"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.filter = None
+        self.last_id = 0
+        self.synced_at = 0.0
+        self.loaded_at = None
+        self.stats = Counter()
+
+    def load(self):
+        """Rebuild the filter from the revoked tokens that have not expired"""
+        with self.lock:
+            self.rebuild()
+
+    def rebuild(self):
+        # Read the high-water mark first: rows added meanwhile are read again by sync
+        last_id = RevokedToken.objects.aggregate(last=Max('id'))['last'] or 0
+        jtis = RevokedToken.objects.filter(id__lte=last_id, expires_at__gt=timezone.now()).values_list('jti', flat=True)
+        jtis = list(jtis.iterator(chunk_size=PURGE_BATCH_SIZE))
+        bloom = BloomFilter(
+            max(settings.TOKEN_REVOCATION_CAPACITY, len(jtis) * 2),
+            settings.TOKEN_REVOCATION_ERROR_RATE,
+        )
+        for jti in jtis:
+            bloom.add(jti)
+        self.filter, self.last_id = bloom, last_id
+        self.synced_at = self.loaded_at = time.monotonic()
+        self.stats['rebuilds'] += 1
+        logger.info('Loaded %d revoked tokens into a %d KiB bloom filter', len(jtis), len(bloom.bits) // 1024)
+
+    def sync(self, force=False):
+        """Add revocations made by other processes since the last sync"""
+        if self.filter is None:
+            self.load()
+            return
+        if not force and time.monotonic() - self.synced_at < settings.TOKEN_REVOCATION_SYNC_SECONDS:
+            return
+        with self.lock:
+            if not force and time.monotonic() - self.synced_at < settings.TOKEN_REVOCATION_SYNC_SECONDS:
+                return
+            rows = list(RevokedToken.objects.filter(id__gt=self.last_id).order_by('id').values_list('id', 'jti'))
+            self.synced_at = time.monotonic()
+            if not rows:
+                return
+            if self.filter.count + len(rows) > self.filter.capacity:
+                # Full: start over from the rows that have not expired
+                self.rebuild()
+                return
+            for row_id, jti in rows:
+                self.filter.add(jti)
+            self.last_id = rows[-1][0]
+            self.stats['synced'] += len(rows)
+
+    def is_revoked(self, jti):
+        self.sync()
+        if jti not in self.filter:
+            self.stats['negative'] += 1
+            return False
+        if RevokedToken.objects.filter(jti=jti).exists():
+            self.stats['revoked'] += 1
+            return True
+        self.stats['false_positive'] += 1
+        return False
+
+    def revoke(self, jti, expires_at):
+        """Record a revocation. Returns False when the JTI was already revoked"""
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            self.stats['already_revoked'] += 1
+            return False
+        # Locally known at once; other processes pick the row up on their next sync
+        if self.filter is not None:
+            with self.lock:
+                self.filter.add(jti)
+        self.stats['revoked_here'] += 1
+        return True
+
+    def snapshot(self):
+        bloom = self.filter
+        return {
+            'loaded': bloom is not None,
+            'entries': bloom.count if bloom else 0,
+            'capacity': bloom.capacity if bloom else settings.TOKEN_REVOCATION_CAPACITY,
+            'filter_bytes': len(bloom.bits) if bloom else 0,
+            'hashes': bloom.hashes if bloom else 0,
+            'last_id': self.last_id,
+            **self.stats,
+        }
+
+
+revocations = RevocationList()
+
+
+class RevocableRefreshToken(RefreshToken):
+    """Refresh token checked against, and revoked into, ``revocations``"""
+
+    def verify(self):
+        super().verify()
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        """Called by TokenRefreshSerializer on rotation (BLACKLIST_AFTER_ROTATION)"""
+        expires_at = datetime.fromtimestamp(self.payload['exp'], tz=dt_timezone.utc)
+        if not revocations.revoke(self.payload[api_settings.JTI_CLAIM], expires_at):
+            raise TokenError(_('Token is blacklisted'))
+
+
+def purge_expired(batch_size=PURGE_BATCH_SIZE, grace=None):
+    """
+    Delete revocations of tokens that have expired (plus ``grace``, for
+    clock skew), in batches so the table is never locked for long.
+    Returns the number of rows deleted.
+    """
+    grace = timedelta(seconds=settings.TOKEN_REVOCATION_PURGE_GRACE) if grace is None else grace
+    cutoff = timezone.now() - grace
+    deleted = 0
+    while True:
+        ids = list(RevokedToken.objects.filter(expires_at__lt=cutoff).values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,28 @@
+from django.conf import settings
+
+from .db import mark_write, read_alias
+
+
+class ReplicaRouter:
+    """
+    Routes reads of catalog models (REPLICA_READ_MODELS) to a replica alias
+    during safe requests, and everything else to the primary. Any write marks
+    the request so its later reads, and the client's reads for
+    REPLICA_STICKY_SECONDS, stay on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        if model._meta.label in settings.REPLICA_READ_MODELS:
+            return read_alias()
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas are copies of the primary, so rows relate across them
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
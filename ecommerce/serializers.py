@@ -1,6 +1,11 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth.models import User
-from .models import Category, Product, Order, OrderItem
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models, transaction
+from .models import Category, Product, Promotion, Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Cart, CartItem
+from . import inventory, promotions
+from .revocation import RevocableRefreshToken
 
 
 class CategorySerializer(serializers.ModelSerializer):
@@ -12,21 +17,64 @@ class CategorySerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'created_at']
     
     def get_products_count(self, obj):
+        if hasattr(obj, 'active_products_count'):
+            return obj.active_products_count
         return obj.products.filter(is_active=True).count()
 
 
+class ProductListSerializer(serializers.ListSerializer):
+    """Prices the whole list in one pass of the promotions engine"""
+    
+    def to_representation(self, data):
+        products = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        promotions.for_context(self.context).price_products(products)
+        return super().to_representation(products)
+
+
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     in_stock = serializers.BooleanField(read_only=True)
+    sale_price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True, allow_null=True)
+    promotion = serializers.IntegerField(source='promotion_id', read_only=True, allow_null=True)
     
     class Meta:
         model = Product
         fields = [
-            'id', 'name', 'description', 'price', 'category', 
-            'category_name', 'stock', 'image', 'is_active', 
+            'id', 'sku', 'name', 'description', 'price', 'sale_price', 'promotion',
+            'category', 'category_name', 'stock', 'image', 'is_active', 
             'in_stock', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = ProductListSerializer
+    
+    def to_representation(self, instance):
+        if not hasattr(instance, 'sale_price'):
+            promotions.for_context(self.context).price_products([instance])
+        return super().to_representation(instance)
+
+
+class PromotionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Promotion
+        fields = [
+            'id', 'name', 'kind', 'value', 'scope', 'product', 'category',
+            'min_subtotal', 'starts_at', 'ends_at', 'is_active', 'created_at'
+        ]
+        read_only_fields = ['id', 'created_at']
+    
+    def validate(self, attrs):
+        instance = Promotion(**{**self.initial_instance_data(), **attrs})
+        try:
+            instance.clean()
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.message_dict)
+        return attrs
+    
+    def initial_instance_data(self):
+        """Current field values of the promotion being updated, for partial updates"""
+        if self.instance is None:
+            return {}
+        return {field: getattr(self.instance, field) for field in self.Meta.fields if field not in ('id', 'created_at')}
 
 
 class OrderItemSerializer(serializers.ModelSerializer):
@@ -46,13 +94,63 @@ class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
         fields = [
-            'id', 'user', 'user_username', 'status', 'total_amount',
+            'id', 'user', 'user_username', 'status', 'total_amount', 'discount_amount',
             'shipping_address', 'phone_number', 'items',
             'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
 
 
+class OrderSummarySerializer(serializers.Serializer):
+    """Lightweight order row for history lists; items are on the detail endpoint"""
+    id = serializers.IntegerField(read_only=True)
+    status = serializers.CharField(read_only=True)
+    total_amount = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    item_count = serializers.IntegerField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    """Query parameters accepted by the order lists"""
+    status = serializers.CharField(required=False)
+    created_after = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+    created_before = serializers.DateTimeField(required=False, input_formats=['iso-8601', '%Y-%m-%d'])
+    include_archived = serializers.BooleanField(required=False, default=False)
+    
+    def validate_status(self, value):
+        """Comma-separated list of statuses"""
+        statuses = [status.strip() for status in value.split(',') if status.strip()]
+        valid = dict(Order.STATUS_CHOICES)
+        invalid = [status for status in statuses if status not in valid]
+        if invalid:
+            raise serializers.ValidationError(f"Unknown status: {', '.join(invalid)}")
+        return statuses
+
+
+class ArchivedOrderItemSerializer(serializers.ModelSerializer):
+    subtotal = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = ArchivedOrderItem
+        fields = ['id', 'product', 'product_name', 'quantity', 'price', 'subtotal']
+        read_only_fields = fields
+
+
+class ArchivedOrderSerializer(serializers.ModelSerializer):
+    """Same shape as OrderSerializer, so order detail looks the same once archived"""
+    items = ArchivedOrderItemSerializer(many=True, read_only=True)
+    user_username = serializers.CharField(source='user.username', read_only=True)
+    
+    class Meta:
+        model = ArchivedOrder
+        fields = [
+            'id', 'user', 'user_username', 'status', 'total_amount', 'discount_amount',
+            'shipping_address', 'phone_number', 'items',
+            'created_at', 'updated_at'
+        ]
+        read_only_fields = fields
+
+
 class CreateOrderSerializer(serializers.Serializer):
     """Serializer for creating orders with items"""
     shipping_address = serializers.CharField()
@@ -80,9 +178,7 @@ class CreateOrderSerializer(serializers.Serializer):
         items_data = validated_data.pop('items')
         user = self.context['request'].user
         
-        # Calculate total amount
-        total_amount = 0
-        order_items = []
+        lines = []
         
         for item_data in items_data:
             try:
@@ -93,38 +189,224 @@ class CreateOrderSerializer(serializers.Serializer):
             if product.stock < item_data['quantity']:
                 raise serializers.ValidationError(f"Insufficient stock for {product.name}")
             
-            subtotal = product.price * item_data['quantity']
-            total_amount += subtotal
-            
-            order_items.append({
-                'product': product,
-                'quantity': item_data['quantity'],
-                'price': product.price
-            })
+            lines.append((product, item_data['quantity'], product.price))
+        
+        # Price every line and the cart discount in one pass
+        quote = promotions.current(fresh=True).quote(lines)
         
         # Create order
         order = Order.objects.create(
             user=user,
-            total_amount=total_amount,
+            total_amount=quote.total,
+            discount_amount=quote.discount,
             **validated_data
         )
         
-        # Create order items and update stock
-        for item in order_items:
-            OrderItem.objects.create(
+        # Create order items and take their stock from the warehouses
+        items = OrderItem.objects.bulk_create([
+            OrderItem(
                 order=order,
-                product=item['product'],
-                quantity=item['quantity'],
-                price=item['price']
+                product=product,
+                quantity=quantity,
+                price=price
             )
-            item['product'].stock -= item['quantity']
-            item['product'].save()
+            for (product, quantity, _), price in zip(lines, quote.unit_prices)
+        ])
+        allocate(items)
         
         return order
 
 
+def allocate(items):
+    """Allocate order items to warehouses, reporting shortages as validation errors"""
+    try:
+        inventory.allocate(items)
+    except inventory.Unavailable as exc:
+        name = next(item.product.name for item in items if item.product_id == exc.product_id)
+        raise serializers.ValidationError(f"Insufficient stock for {name}")
+
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name']
-        read_only_fields = ['id']
\ No newline at end of file
+        read_only_fields = ['id']
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """Token refresh that revokes the rotated refresh token (see ecommerce.revocation)"""
+    token_class = RevocableRefreshToken
+
+
+class CartItemSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    product_image = serializers.ImageField(source='product.image', read_only=True)
+    category_name = serializers.CharField(source='product.category.name', read_only=True)
+    stock = serializers.IntegerField(source='product.stock', read_only=True)
+    in_stock = serializers.BooleanField(source='product.in_stock', read_only=True)
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+    
+    class Meta:
+        model = CartItem
+        fields = [
+            'id', 'product', 'product_name', 'product_image', 'category_name', 'quantity',
+            'unit_price', 'subtotal', 'stock', 'in_stock'
+        ]
+        read_only_fields = ['id', 'unit_price']
+
+
+class CartSerializer(serializers.ModelSerializer):
+    """
+    The cart at its list prices (``subtotal``), plus what checkout would
+    charge with the current promotions: each item's ``sale_price``, the
+    ``total`` and the ``savings``.
+    """
+    items = CartItemSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = Cart
+        fields = ['id', 'items', 'subtotal', 'item_count', 'updated_at']
+        read_only_fields = fields
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        lines = list(instance.items.all())
+        quote = promotions.for_context(self.context).quote(
+            [(line.product, line.quantity, line.unit_price) for line in lines]
+        )
+        price_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+        for item, price in zip(data['items'], quote.unit_prices):
+            item['sale_price'] = price_field.to_representation(price)
+        data['savings'] = price_field.to_representation(instance.subtotal - quote.total)
+        data['total'] = price_field.to_representation(quote.total)
+        data['promotion'] = quote.promotion
+        return data
+
+
+class CartLineSerializer(serializers.Serializer):
+    """Serializer for a single product/quantity pair sent to the cart"""
+    product_id = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=0, default=1)
+    
+    def validate(self, attrs):
+        try:
+            attrs['product'] = Product.objects.get(id=attrs['product_id'], is_active=True)
+        except Product.DoesNotExist:
+            raise serializers.ValidationError(f"Product {attrs['product_id']} not found")
+        return attrs
+
+
+class MergeCartSerializer(serializers.Serializer):
+    """Serializer for merging a client-side cart into the server cart"""
+    items = serializers.ListField(
+        child=serializers.DictField(
+            child=serializers.IntegerField()
+        )
+    )
+    
+    def validate_items(self, value):
+        for item in value:
+            if 'product_id' not in item or 'quantity' not in item:
+                raise serializers.ValidationError("Each item must have product_id and quantity")
+        
+        ids = [item['product_id'] for item in value]
+        products = Product.objects.in_bulk(ids)
+        lines = []
+        for item in value:
+            product = products.get(item['product_id'])
+            # Products removed since the client cart was built are dropped
+            if product is None or not product.is_active or item['quantity'] <= 0:
+                continue
+            lines.append((product, item['quantity']))
+        return lines
+
+
+class CheckoutCartSerializer(serializers.Serializer):
+    """Serializer for converting the user's cart into an order"""
+    shipping_address = serializers.CharField()
+    phone_number = serializers.CharField(max_length=20)
+    
+    def create(self, validated_data):
+        cart = self.context['cart']
+        
+        with transaction.atomic():
+            cart.refresh_prices()
+            lines = list(cart.items.select_related('product'))
+            if not lines:
+                raise serializers.ValidationError("Cart is empty")
+            
+            for line in lines:
+                if not line.product.is_active:
+                    raise serializers.ValidationError(f"Product {line.product_id} not found")
+                if line.product.stock < line.quantity:
+                    raise serializers.ValidationError(f"Insufficient stock for {line.product.name}")
+            
+            quote = promotions.current(fresh=True).quote([(line.product, line.quantity, line.unit_price) for line in lines])
+            order = Order.objects.create(
+                user=cart.user,
+                total_amount=quote.total,
+                discount_amount=quote.discount,
+                **validated_data
+            )
+            items = OrderItem.objects.bulk_create([
+                OrderItem(
+                    order=order,
+                    product=line.product,
+                    quantity=line.quantity,
+                    price=price
+                )
+                for line, price in zip(lines, quote.unit_prices)
+            ])
+            # Guarded decrements, so a concurrent checkout cannot oversell
+            allocate(items)
+            
+            cart.clear()
+        
+        return order
+
+
+class ProductScopeSerializer(serializers.Serializer):
+    """Filters selecting the products a bulk adjustment applies to"""
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    skus = serializers.ListField(child=serializers.CharField(), required=False)
+    category = serializers.IntegerField(required=False)
+    category_name = serializers.CharField(required=False)
+    is_active = serializers.BooleanField(required=False, allow_null=True, default=None)
+    search = serializers.CharField(required=False)
+    min_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    max_stock = serializers.IntegerField(required=False)
+    all = serializers.BooleanField(required=False, default=False)
+
+
+class BulkAdjustSerializer(serializers.Serializer):
+    """Serializer for filter-scoped bulk price/stock/status adjustments"""
+    filter = ProductScopeSerializer()
+    price_percent = serializers.DecimalField(max_digits=7, decimal_places=2, required=False, min_value=-100)
+    price_amount = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    stock_set = serializers.IntegerField(required=False, min_value=0)
+    stock_delta = serializers.IntegerField(required=False)
+    is_active = serializers.BooleanField(required=False, allow_null=True, default=None)
+    dry_run = serializers.BooleanField(required=False, default=False)
+    
+    def validate_filter(self, value):
+        scoped = {k: v for k, v in value.items() if k != 'all' and v not in (None, '', [])}
+        if not scoped and not value.get('all'):
+            raise serializers.ValidationError("Provide at least one filter, or all=true to adjust every product")
+        return value
+    
+    def validate(self, attrs):
+        if 'price_percent' in attrs and 'price_amount' in attrs:
+            raise serializers.ValidationError("Use either price_percent or price_amount, not both")
+        if 'stock_set' in attrs and 'stock_delta' in attrs:
+            raise serializers.ValidationError("Use either stock_set or stock_delta, not both")
+        operations = ['price_percent', 'price_amount', 'stock_set', 'stock_delta']
+        if not any(op in attrs for op in operations) and attrs.get('is_active') is None:
+            raise serializers.ValidationError("Nothing to adjust")
+        return attrs
+    
+    def adjustment(self):
+        """Keyword arguments for adjust_products()"""
+        data = self.validated_data
+        keys = ['price_percent', 'price_amount', 'stock_set', 'stock_delta', 'is_active']
+        return {key: data.get(key) for key in keys}
@@ -0,0 +1,8 @@
+from django.dispatch import Signal
+
+
+# Sent after product rows are changed with queryset.update()/bulk_update(),
+# which bypass save() and post_save. Receivers get ``pks``, the list of
+# changed product ids, so derived caches can be invalidated, and optionally
+# ``fields``, the names of the only fields that changed.
+products_changed = Signal()
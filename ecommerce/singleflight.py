@@ -0,0 +1,256 @@
+"""
+Single-flight caching for hot catalog reads.
+
+``get_or_compute`` (and ``aget_or_compute`` for the async views) keep one
+computation per key in flight:
+
+- Within a process, concurrent callers for the same key wait for the first
+  one and receive its result (or its exception).
+- Across processes, the computing caller holds a lock added to the shared
+  cache; other processes poll for the value it stores instead of running
+  the same queries.
+- Entries outlive their ``SINGLE_FLIGHT_TTL`` by ``SINGLE_FLIGHT_STALE_SECONDS``.
+  An expired entry, or one from before the last catalog change, is served
+  stale while a single caller refreshes it.
+
+Catalog writes bump a generation number rather than deleting entries, so a
+change never turns into a burst of misses.
+"""
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+import uuid
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'sf:generation'
+POLL_SECONDS = 0.02
+MISSING = object()
+
+# Per-process counters: hit, stale, computed, coalesced, waited
+stats = Counter()
+
+_flights = {}
+_flights_lock = threading.Lock()
+_async_flights = {}
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+def get_cache():
+    return caches[settings.SINGLE_FLIGHT_CACHE]
+
+
+def request_key(name, request):
+    """Key for a response that depends on the full URL (host, page, filters)"""
+    url = request.build_absolute_uri()
+    return f'{name}:{hashlib.sha1(url.encode()).hexdigest()[:16]}'
+
+
+def entry_key(key):
+    return f'sf:{key}'
+
+
+def lock_key(key):
+    return f'sf-lock:{key}'
+
+
+def unpack(found, key):
+    """(value or MISSING, fresh, current generation) from a get_many result"""
+    generation = found.get(GENERATION_KEY, 0)
+    entry = found.get(entry_key(key))
+    if entry is None:
+        return MISSING, False, generation
+    fresh = entry['generation'] == generation and entry['fresh_until'] > time.time()
+    return entry['value'], fresh, generation
+
+
+def pack(value, generation, ttl):
+    return {'value': value, 'generation': generation, 'fresh_until': time.time() + ttl}
+
+
+def entry_timeout(ttl):
+    return ttl + settings.SINGLE_FLIGHT_STALE_SECONDS
+
+
+def invalidate():
+    """Mark every entry stale; each is refreshed once on its next read"""
+    cache = get_cache()
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, 0, timeout=None)
+        cache.incr(GENERATION_KEY)
+
+
+def catalog_changed(sender, **kwargs):
+    """Receiver for catalog writes: post_save/post_delete and products_changed"""
+    transaction.on_commit(invalidate)
+
+
+def release(cache, key, token):
+    if cache.get(lock_key(key)) == token:
+        cache.delete(lock_key(key))
+
+
+def get_or_compute(key, compute, ttl=None):
+    """Cached value for ``key``, computing it at most once at a time"""
+    ttl = settings.SINGLE_FLIGHT_TTL if ttl is None else ttl
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        stats['computed'] += 1
+        return compute()
+
+    cache = get_cache()
+    value, fresh, generation = unpack(cache.get_many([entry_key(key), GENERATION_KEY]), key)
+    if fresh:
+        stats['hit'] += 1
+        return value
+    if value is not MISSING:
+        stats['stale'] += 1
+        token = uuid.uuid4().hex
+        if cache.add(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+            try:
+                stats['computed'] += 1
+                value = compute()
+                cache.set(entry_key(key), pack(value, generation, ttl), timeout=entry_timeout(ttl))
+            except Exception:
+                logger.exception('Refreshing %s failed; serving the stale value', key)
+            finally:
+                release(cache, key, token)
+        return value
+
+    with _flights_lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+    if not leader:
+        stats['coalesced'] += 1
+        flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    try:
+        flight.value = compute_locked(cache, key, compute, generation, ttl)
+        return flight.value
+    except Exception as exc:
+        flight.error = exc
+        raise
+    finally:
+        with _flights_lock:
+            del _flights[key]
+        flight.done.set()
+
+
+def compute_locked(cache, key, compute, generation, ttl):
+    """Compute under the cross-process lock, or take the value its holder stores"""
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_WAIT
+    locked = cache.add(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+    while not locked:
+        stats['waited'] += 1
+        time.sleep(POLL_SECONDS)
+        value, _, _ = unpack(cache.get_many([entry_key(key), GENERATION_KEY]), key)
+        if value is not MISSING:
+            return value
+        if time.monotonic() > deadline:
+            logger.warning('Gave up waiting for %s; computing it without the lock', key)
+            break
+        locked = cache.add(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+    try:
+        stats['computed'] += 1
+        value = compute()
+        cache.set(entry_key(key), pack(value, generation, ttl), timeout=entry_timeout(ttl))
+        return value
+    finally:
+        if locked:
+            release(cache, key, token)
+
+
+async def aget_or_compute(key, compute, ttl=None):
+    """``get_or_compute`` for coroutine functions, coalescing within the event loop"""
+    ttl = settings.SINGLE_FLIGHT_TTL if ttl is None else ttl
+    if not settings.SINGLE_FLIGHT_ENABLED:
+        stats['computed'] += 1
+        return await compute()
+
+    cache = get_cache()
+    value, fresh, generation = unpack(await cache.aget_many([entry_key(key), GENERATION_KEY]), key)
+    if fresh:
+        stats['hit'] += 1
+        return value
+    if value is not MISSING:
+        stats['stale'] += 1
+        token = uuid.uuid4().hex
+        if await cache.aadd(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT):
+            try:
+                stats['computed'] += 1
+                value = await compute()
+                await cache.aset(entry_key(key), pack(value, generation, ttl), timeout=entry_timeout(ttl))
+            except Exception:
+                logger.exception('Refreshing %s failed; serving the stale value', key)
+            finally:
+                if await cache.aget(lock_key(key)) == token:
+                    await cache.adelete(lock_key(key))
+        return value
+
+    flight_key = (id(asyncio.get_running_loop()), key)
+    future = _async_flights.get(flight_key)
+    if future is not None:
+        stats['coalesced'] += 1
+        # Shielded: a disconnecting follower must not cancel the leader's work
+        return await asyncio.shield(future)
+
+    future = _async_flights[flight_key] = asyncio.get_running_loop().create_future()
+    try:
+        value = await acompute_locked(cache, key, compute, generation, ttl)
+        future.set_result(value)
+        return value
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as exc:
+        future.set_exception(exc)
+        # Followers receive it; do not leave it unretrieved when there are none
+        future.exception()
+        raise
+    finally:
+        del _async_flights[flight_key]
+
+
+async def acompute_locked(cache, key, compute, generation, ttl):
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + settings.SINGLE_FLIGHT_LOCK_WAIT
+    locked = await cache.aadd(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+    while not locked:
+        stats['waited'] += 1
+        await asyncio.sleep(POLL_SECONDS)
+        value, _, _ = unpack(await cache.aget_many([entry_key(key), GENERATION_KEY]), key)
+        if value is not MISSING:
+            return value
+        if time.monotonic() > deadline:
+            logger.warning('Gave up waiting for %s; computing it without the lock', key)
+            break
+        locked = await cache.aadd(lock_key(key), token, timeout=settings.SINGLE_FLIGHT_LOCK_TIMEOUT)
+    try:
+        stats['computed'] += 1
+        value = await compute()
+        await cache.aset(entry_key(key), pack(value, generation, ttl), timeout=entry_timeout(ttl))
+        return value
+    finally:
+        if locked and await cache.aget(lock_key(key)) == token:
+            await cache.adelete(lock_key(key))
@@ -0,0 +1,377 @@
+"""
+Shared, memory-mapped catalog snapshot.
+
+``build`` serializes active products and categories once into a single file:
+fixed-size struct records (ids, category ids and blob offsets) followed by a
+blob of pre-encoded JSON fragments, identical to the DRF serializers' output.
+The file is written next to its final name and swapped in with
+``os.replace``, so readers always see a complete version. Every worker maps
+the current file read-only; the OS page cache holds one copy for all of them.
+
+Catalog and promotion writes mark the snapshot stale (readers fall back to
+the database until it is rebuilt) and queue a deduplicated
+``rebuild_catalog_snapshot`` job; so does the start or end of a promotion,
+when its sale prices expire. Stock-only changes from orders are tolerated for up to
+``CATALOG_SNAPSHOT_MAX_LAG`` seconds instead.
+"""
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, Q
+from django.http import HttpResponse
+
+from . import promotions
+from .async_views import FEATURED_COUNT, PAGE_SIZE, page_links
+from .models import Category, Product
+from .serializers import CategorySerializer, ProductSerializer
+
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'MKCAT001'
+PREAMBLE = struct.Struct('<8sI')      # magic, length of the JSON header
+PRODUCT = struct.Struct('<qqII')      # id, category id, blob offset, length; catalog order
+PRODUCT_ID = struct.Struct('<qI')     # id, position in catalog order; sorted by id
+CATEGORY = struct.Struct('<qII')      # id, blob offset, length; category order
+CATEGORY_RANGE = struct.Struct('<qII')  # category id, start and count in POSITIONS; sorted by id
+POSITION = struct.Struct('<I')
+
+# Stands in for scheme://host in image URLs. Encoded JSON never contains a raw
+# NUL byte, so it can be replaced in a whole response body at once.
+ORIGIN = b'\x00'
+
+CHUNK_SIZE = 2000
+
+# Product fields whose changes may be served stale for CATALOG_SNAPSHOT_MAX_LAG
+SOFT_FIELDS = {'stock', 'updated_at'}
+
+
+def encode(data, origin_field=None):
+    """Compact JSON for one serialized record, like DRF's JSONRenderer"""
+    parts = []
+    for key, value in data.items():
+        encoded = json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False, separators=(',', ':'))
+        if key == origin_field and isinstance(value, str) and value.startswith('/'):
+            encoded = '"\x00' + encoded[1:]
+        parts.append(f'{json.dumps(key)}:{encoded}')
+    return ('{' + ','.join(parts) + '}').encode()
+
+
+def build(path=None):
+    """Write a new snapshot from the database and swap it in. Returns its header"""
+    path = str(path or settings.CATALOG_SNAPSHOT_PATH)
+    # Taken before reading, so writes committed during the build still count as newer
+    built_at = time.time()
+    blob = bytearray()
+
+    def add(fragment):
+        offset = len(blob)
+        blob.extend(fragment)
+        return offset, len(fragment)
+
+    categories = Category.objects.annotate(
+        active_products_count=Count('products', filter=Q(products__is_active=True))
+    )
+    category_rows = [
+        CATEGORY.pack(category.id, *add(encode(CategorySerializer(category).data)))
+        for category in categories
+    ]
+
+    product_rows = []
+    product_ids = []
+    by_category = {}
+    pricing = promotions.current()
+    products = Product.objects.filter(is_active=True).select_related('category').iterator(chunk_size=CHUNK_SIZE)
+    while chunk := list(islice(products, CHUNK_SIZE)):
+        # Sale prices for the whole chunk in one pass
+        pricing.price_products(chunk)
+        for product in chunk:
+            position = len(product_rows)
+            fragment = encode(ProductSerializer(product).data, origin_field='image')
+            product_rows.append(PRODUCT.pack(product.id, product.category_id, *add(fragment)))
+            product_ids.append((product.id, position))
+            by_category.setdefault(product.category_id, []).append(position)
+
+    ranges = []
+    positions = []
+    for category_id in sorted(by_category):
+        ranges.append(CATEGORY_RANGE.pack(category_id, len(positions), len(by_category[category_id])))
+        positions.extend(by_category[category_id])
+
+    sections = [
+        ('categories', b''.join(category_rows)),
+        ('products', b''.join(product_rows)),
+        ('product_ids', b''.join(PRODUCT_ID.pack(*row) for row in sorted(product_ids))),
+        ('category_ranges', b''.join(ranges)),
+        ('positions', b''.join(POSITION.pack(position) for position in positions)),
+        ('blob', bytes(blob)),
+    ]
+    header = {
+        'version': time.time_ns(),
+        'built_at': built_at,
+        # Sale prices change when the next promotion starts or ends
+        'prices_valid_until': pricing.valid_until.timestamp() if pricing.valid_until else None,
+        'products': len(product_rows),
+        'categories': len(category_rows),
+        'sections': {},
+    }
+    offset = 0
+    for name, data in sections:
+        header['sections'][name] = [offset, len(data)]
+        offset += len(data)
+    encoded_header = json.dumps(header).encode()
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporary, 'wb') as stream:
+        stream.write(PREAMBLE.pack(MAGIC, len(encoded_header)))
+        stream.write(encoded_header)
+        for _, data in sections:
+            stream.write(data)
+    os.replace(temporary, path)
+    header['size'] = PREAMBLE.size + len(encoded_header) + offset
+    return header
+
+
+def _search(buffer, start, record, count, key):
+    """Binary search for ``key`` in the first field of ``count`` sorted records"""
+    low, high = 0, count
+    while low < high:
+        middle = (low + high) // 2
+        current = record.unpack_from(buffer, start + middle * record.size)
+        if current[0] < key:
+            low = middle + 1
+        elif current[0] > key:
+            high = middle
+        else:
+            return current
+    return None
+
+
+class Snapshot:
+    """One mapped snapshot file. Fragments are sliced straight out of the mapping"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as stream:
+            self.stat = os.fstat(stream.fileno())
+            self.map = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_length = PREAMBLE.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f'{path} is not a catalog snapshot')
+        self.header = json.loads(self.map[PREAMBLE.size:PREAMBLE.size + header_length])
+        base = PREAMBLE.size + header_length
+        self.sections = {name: base + offset for name, (offset, _) in self.header['sections'].items()}
+        self.built_at = self.header['built_at']
+        self.prices_valid_until = self.header.get('prices_valid_until')
+        self.product_count = self.header['products']
+        self.category_count = self.header['categories']
+        self.range_count = self.header['sections']['category_ranges'][1] // CATEGORY_RANGE.size
+
+    def fragment(self, offset, length):
+        start = self.sections['blob'] + offset
+        return self.map[start:start + length]
+
+    def product_at(self, position):
+        _, _, offset, length = PRODUCT.unpack_from(self.map, self.sections['products'] + position * PRODUCT.size)
+        return self.fragment(offset, length)
+
+    def category_at(self, position):
+        _, offset, length = CATEGORY.unpack_from(self.map, self.sections['categories'] + position * CATEGORY.size)
+        return self.fragment(offset, length)
+
+    def product(self, product_id):
+        found = _search(self.map, self.sections['product_ids'], PRODUCT_ID, self.product_count, product_id)
+        return None if found is None else self.product_at(found[1])
+
+    def product_positions(self, category_id=None):
+        """Positions of active products in catalog order, optionally within a category"""
+        if category_id is None:
+            return range(self.product_count)
+        found = _search(self.map, self.sections['category_ranges'], CATEGORY_RANGE, self.range_count, category_id)
+        if found is None:
+            return []
+        start = self.sections['positions'] + found[1] * POSITION.size
+        return [position for (position,) in POSITION.iter_unpack(self.map[start:start + found[2] * POSITION.size])]
+
+
+class SnapshotReader:
+    """Per-process handle on the current snapshot, remapped when the file is swapped"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.snapshot = None
+        self.lock = threading.Lock()
+
+    def current(self):
+        """The mapped snapshot, or None when it is missing or stale"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        snapshot = self.snapshot
+        if snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns):
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot is None or (stat.st_ino, stat.st_mtime_ns) != (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns):
+                    try:
+                        snapshot = self.snapshot = Snapshot(self.path)
+                    except (OSError, ValueError):
+                        logger.exception('Could not map catalog snapshot %s', self.path)
+                        return None
+        if marker_time(self.path, 'dirty') > snapshot.built_at:
+            return None
+        if snapshot.prices_valid_until is not None and time.time() >= snapshot.prices_valid_until:
+            return None
+        pending = marker_time(self.path, 'pending')
+        if pending > snapshot.built_at and time.time() - pending > settings.CATALOG_SNAPSHOT_MAX_LAG:
+            return None
+        return snapshot
+
+
+def marker_time(path, kind):
+    try:
+        return os.stat(f'{path}.{kind}').st_mtime
+    except FileNotFoundError:
+        return 0.0
+
+
+def touch_marker(kind):
+    path = f'{settings.CATALOG_SNAPSHOT_PATH}.{kind}'
+    with open(path, 'a'):
+        os.utime(path, None)
+
+
+_reader = None
+
+
+def get_reader():
+    global _reader
+    if _reader is None or _reader.path != str(settings.CATALOG_SNAPSHOT_PATH):
+        _reader = SnapshotReader(settings.CATALOG_SNAPSHOT_PATH)
+    return _reader
+
+
+def current():
+    if not settings.CATALOG_SNAPSHOT_READS:
+        return None
+    return get_reader().current()
+
+
+def schedule_rebuild(soft=False):
+    """Mark the snapshot stale and queue one rebuild for the burst of changes"""
+    from .jobs import enqueue
+
+    touch_marker('pending' if soft else 'dirty')
+    enqueue(
+        'rebuild_catalog_snapshot',
+        dedup_key='catalog-snapshot',
+        delay=settings.CATALOG_SNAPSHOT_REBUILD_DELAY,
+    )
+
+
+def catalog_changed(sender, **kwargs):
+    """Receiver for catalog writes: post_save/post_delete and products_changed"""
+    changed = kwargs.get('fields') or kwargs.get('update_fields')
+    soft = sender is Product and changed is not None and set(changed) <= SOFT_FIELDS
+    transaction.on_commit(lambda: schedule_rebuild(soft))
+
+
+# Responses. Each returns None when the request needs the database instead.
+
+def page_body(request, fragments, count, page, last_page):
+    next_link, previous_link = page_links(request, page, last_page)
+    return b'{"count":%d,"next":%s,"previous":%s,"results":[%s]}' % (
+        count,
+        json.dumps(next_link).encode(),
+        json.dumps(previous_link).encode(),
+        b','.join(fragments),
+    )
+
+
+def json_bytes_response(request, body):
+    if ORIGIN in body:
+        body = body.replace(ORIGIN, request.build_absolute_uri('/')[:-1].encode())
+    return HttpResponse(body, content_type='application/json')
+
+
+def requested_page(request, count):
+    try:
+        page = int(request.GET.get('page', 1))
+    except ValueError:
+        return None
+    last_page = max((count + PAGE_SIZE - 1) // PAGE_SIZE, 1)
+    if page < 1 or page > last_page:
+        return None
+    return page, last_page, (page - 1) * PAGE_SIZE, PAGE_SIZE
+
+
+def requested_category(request):
+    """(ok, category id or None) for the ?category= filter"""
+    value = request.GET.get('category')
+    if not value:
+        return True, None
+    try:
+        return True, int(value)
+    except ValueError:
+        return False, None
+
+
+def category_list(request):
+    snapshot = current()
+    if snapshot is None or set(request.GET) - {'page'}:
+        return None
+    paging = requested_page(request, snapshot.category_count)
+    if paging is None:
+        return None
+    page, last_page, start, size = paging
+    fragments = [snapshot.category_at(position) for position in range(start, min(start + size, snapshot.category_count))]
+    return json_bytes_response(request, page_body(request, fragments, snapshot.category_count, page, last_page))
+
+
+def product_list(request):
+    snapshot = current()
+    if snapshot is None or set(request.GET) - {'page', 'category'}:
+        return None
+    ok, category_id = requested_category(request)
+    if not ok:
+        return None
+    positions = snapshot.product_positions(category_id)
+    paging = requested_page(request, len(positions))
+    if paging is None:
+        return None
+    page, last_page, start, size = paging
+    fragments = [snapshot.product_at(position) for position in positions[start:start + size]]
+    return json_bytes_response(request, page_body(request, fragments, len(positions), page, last_page))
+
+
+def product_featured(request):
+    snapshot = current()
+    if snapshot is None or set(request.GET) - {'category'}:
+        return None
+    ok, category_id = requested_category(request)
+    if not ok:
+        return None
+    positions = snapshot.product_positions(category_id)[:FEATURED_COUNT]
+    body = b'[' + b','.join(snapshot.product_at(position) for position in positions) + b']'
+    return json_bytes_response(request, body)
+
+
+def product_detail(request, pk):
+    snapshot = current()
+    if snapshot is None or request.GET:
+        return None
+    fragment = snapshot.product(pk)
+    if fragment is None:
+        # Inactive or unknown: let the database path answer
+        return None
+    return json_bytes_response(request, fragment)
@@ -0,0 +1,54 @@
+"""
+Static files storage that writes content-hashed names (via Django's manifest
+storage) plus gzip and, when the ``brotli`` package is installed, brotli
+variants of every compressible file at ``collectstatic`` time, so the asset
+views never compress on the request path.
+"""
+import gzip
+import os
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip variants are written without it
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    '.css', '.js', '.mjs', '.map', '.json', '.svg', '.html', '.txt', '.xml',
+    '.ico', '.ttf', '.otf', '.eot',
+}
+# Skip variants that would save less than this fraction of the original
+MIN_SAVING = 0.05
+
+
+def compress(path):
+    """Write ``path``.gz (and ``path``.br) next to ``path``. Returns the files written"""
+    with open(path, 'rb') as source:
+        data = source.read()
+    variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        variants.append(('.br', brotli.compress(data, quality=11)))
+    written = []
+    for suffix, compressed in variants:
+        if len(compressed) > len(data) * (1 - MIN_SAVING):
+            continue
+        with open(path + suffix, 'wb') as target:
+            target.write(compressed)
+        written.append(path + suffix)
+    return written
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in paths:
+            if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            # Both the hashed copy (served immutable) and the original name
+            for stored in {name, self.stored_name(name)}:
+                for variant in compress(self.path(stored)):
+                    yield name, os.path.relpath(variant, self.location), True
@@ -0,0 +1,91 @@
+"""Follow-up work run by the background job queue (see ecommerce.jobs)"""
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .jobs import enqueue, register
+from .models import Order
+from . import backups, promotions, revocation, singleflight, snapshot
+
+
+@register('send_order_confirmation')
+def send_order_confirmation(order_id):
+    """Email the customer a receipt for a newly placed order"""
+    order = Order.objects.select_related('user').get(pk=order_id)
+    if not order.user.email:
+        return
+    lines = [
+        f"{item.quantity} x {item.product.name} @ KES {item.price}"
+        for item in order.items.select_related('product')
+    ]
+    send_mail(
+        f"Mkuru Shop order #{order.id} received",
+        "Thank you for your order!\n\n" + "\n".join(lines) + f"\n\nTotal: KES {order.total_amount}",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+    )
+
+
+@register('send_order_cancellation')
+def send_order_cancellation(order_id):
+    """Email the customer that their order was cancelled"""
+    order = Order.objects.select_related('user').get(pk=order_id)
+    if not order.user.email:
+        return
+    send_mail(
+        f"Mkuru Shop order #{order.id} cancelled",
+        f"Your order #{order.id} has been cancelled.",
+        settings.DEFAULT_FROM_EMAIL,
+        [order.user.email],
+    )
+
+
+@register('product_changed')
+def product_changed(product_ids):
+    """
+    No longer enqueued: save() already notifies the catalog caches through
+    post_save/post_delete, and the snapshot rebuild is its own job. Kept so
+    jobs queued before that complete instead of failing.
+    """
+
+
+@register('rebuild_catalog_snapshot')
+def rebuild_catalog_snapshot():
+    """Rebuild the shared catalog snapshot after catalog writes"""
+    snapshot.build()
+
+
+@register('promotions_window')
+def promotions_window():
+    """A promotion started or ended: refresh the caches holding sale prices"""
+    snapshot.schedule_rebuild()
+    singleflight.invalidate()
+    promotions.schedule_window()
+
+
+@register('purge_revoked_tokens')
+def purge_revoked_tokens():
+    """Delete revocations of expired refresh tokens, then schedule the next run"""
+    revocation.purge_expired()
+    schedule_token_purge()
+
+
+def schedule_token_purge(delay=None):
+    """Queue the next purge_revoked_tokens run unless one is already queued"""
+    delay = settings.TOKEN_REVOCATION_PURGE_INTERVAL if delay is None else delay
+    return enqueue('purge_revoked_tokens', dedup_key='purge-revoked-tokens', delay=delay)
+
+
+@register('backup_database')
+def backup_database():
+    """Online backup of the database, then schedule the next run"""
+    # Scheduled first, so a failed backup does not stop the schedule
+    schedule_backup()
+    backups.backup()
+
+
+def schedule_backup(delay=None):
+    """Queue the next backup_database run unless one is already queued (BACKUP_INTERVAL 0 disables)"""
+    if not settings.BACKUP_INTERVAL:
+        return None
+    delay = settings.BACKUP_INTERVAL if delay is None else delay
+    return enqueue('backup_database', dedup_key='backup-database', delay=delay)
@@ -1,3 +1,564 @@
-from django.test import TestCase
+import time
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models.query import QuerySet
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import checks, events, inventory, promotions, ratelimit, revocation, singleflight, warmup
+from .async_views import authenticate_stream
+from .adjustments import adjust_products
+from .models import (
+    Cart, Category, Job, Order, OrderAllocation, OrderItem, Product, Promotion, RevokedToken, Warehouse, WarehouseStock,
+)
+
+
+def make_product(category, price, stock=10, **kwargs):
+    return Product.objects.create(
+        name=kwargs.pop('name', f'Product {Product.objects.count() + 1}'),
+        description='',
+        category=category,
+        price=Decimal(price),
+        stock=stock,
+        **kwargs
+    )
+
+
+def make_promotion(name, kind, value, scope, **kwargs):
+    # Already running when the test's "now" was taken
+    kwargs.setdefault('starts_at', timezone.now() - timedelta(hours=1))
+    return Promotion.objects.create(name=name, kind=kind, value=Decimal(value), scope=scope, **kwargs)
+
+
+class PromotionPricingTests(TestCase):
+    """Compiled pricing: which promotion wins, and when promotions apply"""
+
+    def setUp(self):
+        self.now = timezone.now()
+        self.phones = Category.objects.create(name='Phones')
+        self.phone = make_product(self.phones, '100.00')
+
+    def sale_price(self, product, now=None):
+        pricing = promotions.load(now or self.now)
+        return pricing.price_products([Product.objects.get(pk=product.pk)])[0].sale_price
+
+    def test_no_promotion_leaves_the_price(self):
+        self.assertIsNone(self.sale_price(self.phone))
+
+    def test_larger_of_percent_and_fixed_discount_wins(self):
+        make_promotion('10% off', 'percent', '10', 'product', product=self.phone)
+        fixed = make_promotion('15 off', 'fixed', '15', 'product', product=self.phone)
+        dear = make_product(self.phones, '200.00')
+        percent = make_promotion('10% off dear', 'percent', '10', 'product', product=dear)
+        make_promotion('15 off dear', 'fixed', '15', 'product', product=dear)
+
+        pricing = promotions.load(self.now)
+        cheap, expensive = pricing.price_products(
+            list(Product.objects.filter(pk__in=[self.phone.pk, dear.pk]).order_by('price'))
+        )
+        self.assertEqual(cheap.sale_price, Decimal('85.00'))
+        self.assertEqual(cheap.promotion_id, fixed.pk)
+        self.assertEqual(expensive.sale_price, Decimal('180.00'))
+        self.assertEqual(expensive.promotion_id, percent.pk)
+
+    def test_fixed_discount_never_goes_below_zero(self):
+        make_promotion('Too much', 'fixed', '150', 'product', product=self.phone)
+        self.assertEqual(self.sale_price(self.phone), Decimal('0.00'))
+
+    def test_better_category_promotion_beats_product_promotion(self):
+        make_promotion('Product 10%', 'percent', '10', 'product', product=self.phone)
+        category = make_promotion('Phones 25%', 'percent', '25', 'category', category=self.phones)
+        product = promotions.load(self.now).price_products([Product.objects.get(pk=self.phone.pk)])[0]
+        self.assertEqual(product.sale_price, Decimal('75.00'))
+        self.assertEqual(product.promotion_id, category.pk)
+
+    def test_better_product_promotion_beats_category_promotion(self):
+        own = make_promotion('Product 30 off', 'fixed', '30', 'product', product=self.phone)
+        make_promotion('Phones 25%', 'percent', '25', 'category', category=self.phones)
+        other = make_product(self.phones, '100.00')
+        products = promotions.load(self.now).price_products(
+            list(Product.objects.filter(pk__in=[self.phone.pk, other.pk]).order_by('pk'))
+        )
+        self.assertEqual(products[0].sale_price, Decimal('70.00'))
+        self.assertEqual(products[0].promotion_id, own.pk)
+        # The category promotion still covers the rest of the category
+        self.assertEqual(products[1].sale_price, Decimal('75.00'))
+
+    def test_promotion_applies_only_within_its_window(self):
+        starts_at = self.now + timedelta(hours=1)
+        ends_at = self.now + timedelta(hours=2)
+        make_promotion('Flash sale', 'percent', '50', 'product', product=self.phone, starts_at=starts_at, ends_at=ends_at)
+
+        before = promotions.load(self.now)
+        self.assertEqual(before.valid_until, starts_at)
+        self.assertIsNone(self.sale_price(self.phone))
+
+        during = promotions.load(starts_at)
+        self.assertEqual(during.valid_until, ends_at)
+        self.assertEqual(self.sale_price(self.phone, starts_at), Decimal('50.00'))
+        self.assertTrue(during.is_valid(ends_at - timedelta(seconds=1)))
+        self.assertFalse(during.is_valid(ends_at))
+
+        self.assertIsNone(self.sale_price(self.phone, ends_at))
+
+    def test_inactive_promotion_is_ignored(self):
+        make_promotion('Paused', 'percent', '50', 'product', product=self.phone, is_active=False)
+        self.assertIsNone(self.sale_price(self.phone))
+
+    def test_cart_promotion_thresholds(self):
+        make_promotion('5% from 50', 'percent', '5', 'cart', min_subtotal=Decimal('50'))
+        big = make_promotion('30 off from 300', 'fixed', '30', 'cart', min_subtotal=Decimal('300'))
+        pricing = promotions.load(self.now)
+
+        self.assertEqual(pricing.quote([(self.phone, 1, Decimal('40.00'))]).discount, Decimal('0.00'))
+        small = pricing.quote([(self.phone, 1, Decimal('100.00'))])
+        self.assertEqual((small.subtotal, small.discount, small.total), (Decimal('100.00'), Decimal('5.00'), Decimal('95.00')))
+        # Below its threshold the larger promotion does not apply
+        self.assertEqual(pricing.quote([(self.phone, 2, Decimal('100.00'))]).discount, Decimal('10.00'))
+        large = pricing.quote([(self.phone, 4, Decimal('100.00'))])
+        self.assertEqual((large.discount, large.promotion), (Decimal('30.00'), big.pk))
+        # 5% of 1000 is more than the fixed 30 reachable at the same subtotal
+        self.assertEqual(pricing.quote([(self.phone, 10, Decimal('100.00'))]).discount, Decimal('50.00'))
+
+    def test_cart_threshold_counts_the_subtotal_after_product_discounts(self):
+        make_promotion('Product 20%', 'percent', '20', 'product', product=self.phone)
+        make_promotion('10 off from 100', 'fixed', '10', 'cart', min_subtotal=Decimal('100'))
+        quote = promotions.load(self.now).quote([(self.phone, 1, self.phone.price)])
+        self.assertEqual(quote.unit_prices, [Decimal('80.00')])
+        self.assertEqual(quote.discount, Decimal('0.00'))
+        quote = promotions.load(self.now).quote([(self.phone, 2, self.phone.price)])
+        self.assertEqual((quote.subtotal, quote.discount, quote.total), (Decimal('160.00'), Decimal('10.00'), Decimal('150.00')))
+
+
+class PromotionCheckoutTests(TestCase):
+    """Orders are charged the promoted prices, with the cart discount recorded"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='secret-pass-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.phones = Category.objects.create(name='Phones')
+        self.phone = make_product(self.phones, '100.00')
+        self.case = make_product(self.phones, '20.00')
+
+    def place_order(self, *lines):
+        return self.client.post('/api/orders/', {
+            'shipping_address': '1 Main Street',
+            'phone_number': '0700000000',
+            'items': [{'product_id': product.pk, 'quantity': quantity} for product, quantity in lines],
+        }, format='json')
+
+    def test_order_total_and_discount_amount(self):
+        make_promotion('Phone 10%', 'percent', '10', 'product', product=self.phone)
+        make_promotion('5% from 150', 'percent', '5', 'cart', min_subtotal=Decimal('150'))
+
+        response = self.place_order((self.phone, 2), (self.case, 1))
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        # 2 x 90.00 + 20.00 = 200.00, less 5%
+        self.assertEqual(order.discount_amount, Decimal('10.00'))
+        self.assertEqual(order.total_amount, Decimal('190.00'))
+        prices = dict(order.items.values_list('product_id', 'price'))
+        self.assertEqual(prices, {self.phone.pk: Decimal('90.00'), self.case.pk: Decimal('20.00')})
+
+    def test_cart_checkout_total_and_discount_amount(self):
+        make_promotion('Phones 5 off', 'fixed', '5', 'category', category=self.phones)
+        make_promotion('10 off from 100', 'fixed', '10', 'cart', min_subtotal=Decimal('100'))
+        self.client.post('/api/cart/add/', {'product_id': self.phone.pk, 'quantity': 1}, format='json')
+        self.client.post('/api/cart/add/', {'product_id': self.case.pk, 'quantity': 1}, format='json')
+
+        response = self.client.post('/api/cart/checkout/', {
+            'shipping_address': '1 Main Street', 'phone_number': '0700000000',
+        }, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        order = Order.objects.get(pk=response.data['id'])
+        # 95.00 + 15.00 = 110.00, less 10.00
+        self.assertEqual(order.discount_amount, Decimal('10.00'))
+        self.assertEqual(order.total_amount, Decimal('100.00'))
+
+    def test_checkout_sees_promotions_added_by_another_worker(self):
+        promotions.current()
+        # bulk_create sends no signals: like an edit made in another process
+        Promotion.objects.bulk_create([
+            Promotion(name='Half price', kind='percent', value=Decimal('50'), scope='product', product=self.phone),
+        ])
+
+        response = self.place_order((self.phone, 1))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Order.objects.get(pk=response.data['id']).total_amount, Decimal('50.00'))
+
+
+class AllocationTests(TestCase):
+    """Orders ship from as few warehouses as possible and never oversell"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='secret-pass-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.main = inventory.default_warehouse()
+        self.east = Warehouse.objects.create(code='east', name='East', priority=1)
+        self.west = Warehouse.objects.create(code='west', name='West', priority=2)
+        category = Category.objects.create(name='Phones')
+        self.phone = make_product(category, '100.00', stock=0)
+        self.case = make_product(category, '20.00', stock=0)
+
+    def stock(self, product, **quantities):
+        for code, quantity in quantities.items():
+            WarehouseStock.objects.update_or_create(
+                warehouse=getattr(self, code), product=product, defaults={'quantity': quantity}
+            )
+        inventory.refresh_totals([product.pk])
+
+    def units(self, product):
+        return dict(WarehouseStock.objects.filter(product=product).values_list('warehouse__code', 'quantity'))
+
+    def place_order(self, *lines):
+        return self.client.post('/api/orders/', {
+            'shipping_address': '1 Main Street',
+            'phone_number': '0700000000',
+            'items': [{'product_id': product.pk, 'quantity': quantity} for product, quantity in lines],
+        }, format='json')
+
+    def shipped_from(self, order_id):
+        return sorted(
+            OrderAllocation.objects.filter(item__order_id=order_id)
+            .values_list('item__product_id', 'warehouse__code', 'quantity')
+        )
+
+    def test_one_warehouse_covers_the_whole_order(self):
+        self.stock(self.phone, main=2, east=5, west=5)
+        self.stock(self.case, main=1, west=5)
+
+        response = self.place_order((self.phone, 2), (self.case, 2))
+
+        self.assertEqual(response.status_code, 201)
+        # main and east could each ship the phones, but only west ships both lines
+        self.assertEqual(self.shipped_from(response.data['id']), [(self.phone.pk, 'west', 2), (self.case.pk, 'west', 2)])
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).stock, 10)
+
+    def test_priority_breaks_ties_between_warehouses(self):
+        self.stock(self.phone, east=5, west=5)
+
+        response = self.place_order((self.phone, 3))
+
+        self.assertEqual(self.shipped_from(response.data['id']), [(self.phone.pk, 'east', 3)])
+
+    def test_line_no_warehouse_holds_is_split(self):
+        self.stock(self.phone, main=1, east=5, west=3)
+
+        response = self.place_order((self.phone, 7))
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.shipped_from(response.data['id']), [(self.phone.pk, 'east', 5), (self.phone.pk, 'west', 2)])
+        self.assertEqual(self.units(self.phone), {'main': 1, 'east': 0, 'west': 1})
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).stock, 2)
+
+    def test_inactive_warehouse_does_not_ship(self):
+        self.stock(self.phone, east=5, west=2)
+        self.east.is_active = False
+        self.east.save()
+        inventory.refresh_totals([self.phone.pk])
+
+        response = self.place_order((self.phone, 3))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.units(self.phone)['east'], 5)
+
+    def test_order_beyond_total_stock_is_rejected(self):
+        self.stock(self.phone, east=2, west=2)
+
+        response = self.place_order((self.phone, 5))
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(self.units(self.phone), {'main': 0, 'east': 2, 'west': 2})
+
+    def test_stock_taken_after_planning_is_not_oversold(self):
+        self.stock(self.phone, east=5)
+        order = Order.objects.create(user=self.user, total_amount=Decimal('300.00'), shipping_address='x', phone_number='1')
+        item = OrderItem.objects.create(order=order, product=self.phone, quantity=3, price=Decimal('100.00'))
+        load_availability = inventory.load_availability
+
+        def then_sold_elsewhere(product_ids):
+            availability = load_availability(product_ids)
+            # A concurrent order takes the stock between reading and reserving it
+            WarehouseStock.objects.filter(warehouse=self.east, product=self.phone).update(quantity=1)
+            return availability
+
+        with mock.patch.object(inventory, 'load_availability', then_sold_elsewhere):
+            with self.assertRaises(inventory.Unavailable):
+                with transaction.atomic():
+                    inventory.allocate([item])
+        # The whole order rolled back, the concurrent sale with it in this test
+        self.assertEqual(self.units(self.phone)['east'], 5)
+        self.assertFalse(OrderAllocation.objects.exists())
+
+    def test_cancel_returns_stock_to_the_warehouses_it_shipped_from(self):
+        self.stock(self.phone, main=1, east=5, west=3)
+        order_id = self.place_order((self.phone, 7)).data['id']
+
+        response = self.client.patch(f'/api/orders/{order_id}/cancel/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.units(self.phone), {'main': 1, 'east': 5, 'west': 3})
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).stock, 9)
+
+    def test_cancel_into_inactive_warehouse_is_not_sellable(self):
+        self.stock(self.phone, main=2, east=5)
+        order_id = self.place_order((self.phone, 4)).data['id']
+        self.east.is_active = False
+        self.east.save()
+        inventory.refresh_totals([self.phone.pk])
+
+        self.client.patch(f'/api/orders/{order_id}/cancel/')
+
+        self.assertEqual(self.units(self.phone), {'main': 2, 'east': 5})
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).stock, 2)
+
+    def test_stock_set_to_zero_empties_every_active_warehouse(self):
+        self.stock(self.phone, main=2, east=5, west=3)
+
+        adjust_products(Product.objects.filter(pk=self.phone.pk), stock_set=0)
+
+        self.assertEqual(self.units(self.phone), {'main': 0, 'east': 0, 'west': 0})
+        self.assertEqual(Product.objects.get(pk=self.phone.pk).stock, 0)
+        self.assertEqual(self.place_order((self.phone, 1)).status_code, 400)
+
+    def test_stock_edit_below_other_warehouses_drains_the_last_to_ship_first(self):
+        self.stock(self.phone, main=2, east=5, west=3)
+        Product.objects.filter(pk=self.phone.pk).update(stock=6)
+
+        totals = inventory.absorb_stock_edits([self.phone.pk])
+
+        self.assertEqual(totals, {self.phone.pk: 6})
+        self.assertEqual(self.units(self.phone), {'main': 0, 'east': 5, 'west': 1})
+
+    def test_stock_edit_leaves_inactive_warehouses_alone(self):
+        self.stock(self.phone, east=5, west=3)
+        self.west.is_active = False
+        self.west.save()
+        Product.objects.filter(pk=self.phone.pk).update(stock=2)
+
+        self.assertEqual(inventory.absorb_stock_edits([self.phone.pk]), {self.phone.pk: 2})
+        self.assertEqual(self.units(self.phone), {'main': 0, 'east': 2, 'west': 3})
+
+
+class RefreshTokenRotationTests(TestCase):
+    """A rotated refresh token is revoked and cannot be replayed"""
+
+    def setUp(self):
+        User.objects.create_user('shopper', password='secret-pass-1')
+        self.client = APIClient()
+        response = self.client.post('/api/token/', {'username': 'shopper', 'password': 'secret-pass-1'}, format='json')
+        self.refresh_token = response.data['refresh']
+
+    def refresh(self, token):
+        return self.client.post('/api/token/refresh/', {'refresh': token}, format='json')
+
+    def test_rotation_issues_a_new_refresh_token(self):
+        response = self.refresh(self.refresh_token)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.data['refresh'], self.refresh_token)
+        self.assertEqual(RevokedToken.objects.count(), 1)
+        self.assertEqual(self.refresh(response.data['refresh']).status_code, 200)
+
+    def test_replayed_refresh_token_is_rejected(self):
+        self.assertEqual(self.refresh(self.refresh_token).status_code, 200)
+
+        response = self.refresh(self.refresh_token)
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_replay_is_rejected_by_a_worker_that_did_not_rotate_it(self):
+        self.assertEqual(self.refresh(self.refresh_token).status_code, 200)
+
+        # A fresh revocation list, as in another process, loads it from the table
+        with mock.patch.object(revocation, 'revocations', revocation.RevocationList()):
+            response = self.refresh(self.refresh_token)
+
+        self.assertEqual(response.status_code, 401)
+
+
+class CartTests(TestCase):
+    """The server-side cart API"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('shopper', password='secret-pass-1')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.phone = make_product(Category.objects.create(name='Phones'), '100.00')
+
+    def test_non_numeric_product_id_is_not_found(self):
+        self.assertEqual(self.client.delete('/api/cart/abc/').status_code, 404)
+        self.assertEqual(self.client.patch('/api/cart/abc/', {'quantity': 1}, format='json').status_code, 404)
+
+    def test_remove_product_not_in_cart_is_not_found(self):
+        self.assertEqual(self.client.delete(f'/api/cart/{self.phone.pk}/').status_code, 404)
+
+    def test_adds_accumulate_with_running_totals(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.add_product(self.phone, 2)
+        cart.add_product(self.phone, 3)
+
+        self.assertEqual(cart.items.get().quantity, 5)
+        self.assertEqual((cart.subtotal, cart.item_count), (Decimal('500.00'), 5))
+
+    def test_add_racing_a_concurrent_first_add_joins_its_line(self):
+        cart = Cart.objects.create(user=self.user)
+        cart.add_product(self.phone, 1)
+        update = QuerySet.update
+        calls = []
+
+        def missed_the_line_once(queryset, **kwargs):
+            # The first increment runs before the other request's line exists
+            calls.append(kwargs)
+            return 0 if len(calls) == 1 else update(queryset, **kwargs)
+
+        with mock.patch.object(QuerySet, 'update', missed_the_line_once):
+            cart.add_product(self.phone, 2)
+
+        self.assertEqual(cart.items.get().quantity, 3)
+        cart.refresh_from_db()
+        self.assertEqual((cart.subtotal, cart.item_count), (Decimal('300.00'), 3))
+
+
+class OrderEventsTicketTests(TestCase):
+    """The SSE stream is opened with a short-lived ticket, not the JWT"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('events', password='pw')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def stream_user(self, **params):
+        return async_to_sync(authenticate_stream)(RequestFactory().get('/api/orders/events/', params))
+
+    def test_ticket_authenticates_stream(self):
+        response = self.client.post('/api/orders/events/ticket/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.stream_user(ticket=response.data['ticket']), self.user)
+
+    def test_raw_token_in_query_is_rejected(self):
+        token = str(AccessToken.for_user(self.user))
+        self.assertIsNone(self.stream_user(token=token))
+        self.assertIsNone(self.stream_user(ticket=token))
+
+    def test_expired_ticket_is_rejected(self):
+        ticket = events.issue_ticket(self.user)
+        with mock.patch('django.core.signing.time.time', return_value=time.time() + events.TICKET_MAX_AGE + 1):
+            self.assertIsNone(self.stream_user(ticket=ticket))
+
+
+class ProductImportTests(TestCase):
+    """Uploaded import files are decoded as UTF-8, with or without a BOM"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('admin', is_staff=True))
+
+    def upload(self, content):
+        upload = SimpleUploadedFile('products.csv', content, content_type='text/csv')
+        return self.client.post('/api/products/import/', {'file': upload}, format='multipart')
+
+    def test_excel_bom_is_ignored(self):
+        response = self.upload('sku,name,category,price,stock\r\nA-1,Café,Drinks,2.50,4\r\n'.encode('utf-8-sig'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Product.objects.get(sku='A-1').name, 'Café')
+
+    def test_invalid_utf8_is_reported(self):
+        response = self.upload('sku,name,category,price,stock\nA-1,Café,Drinks,2.50,4\n'.encode('latin-1'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['created'], 0)
+        self.assertEqual(response.data['errors'], [{'line': 1, 'error': 'file is not valid UTF-8, import stopped'}])
+
+
+@override_settings(RATE_LIMITS={'order-create': {'path': '/api/orders/', 'methods': ['POST'], 'user': '1/min'}})
+class RateLimitTests(TestCase):
+    """Per-user budgets follow the user, not the credential"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('limited')
+
+    def create_order(self, token):
+        return APIClient().post('/api/orders/', {}, format='json', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_new_token_does_not_reset_user_budget(self):
+        self.assertNotEqual(self.create_order(AccessToken.for_user(self.user)).status_code, 429)
+
+        with self.assertLogs('ecommerce.ratelimit', 'WARNING'):
+            response = self.create_order(AccessToken.for_user(self.user))
+
+        self.assertEqual(response.status_code, 429)
+
+    def test_invalid_token_is_limited_by_ip(self):
+        self.assertNotEqual(self.create_order('garbage-1').status_code, 429)
+        with self.assertLogs('ecommerce.ratelimit', 'WARNING'):
+            self.assertEqual(self.create_order('garbage-2').status_code, 429)
+
+    @override_settings(RATE_LIMITS={'search': {'path': '/api/products/search/', 'methods': ['GET'], 'route': '1/min'}})
+    def test_warm_up_requests_are_not_limited(self):
+        count, failed = warmup.warm_catalog(pages=0, search_terms=['a', 'b', 'c'])
+
+        self.assertEqual((count, failed), (5, []))
+        self.assertIsNone(ratelimit.check(ratelimit.Rule('search', settings.RATE_LIMITS['search']), '127.0.0.1'))
+
+    def test_rejected_request_keeps_earlier_budgets(self):
+        rule = ratelimit.Rule('search', {'path': '/api/products/search/', 'user': '2/min', 'ip': '1/min'})
+        self.assertIsNone(ratelimit.check(rule, '10.0.0.1', self.user.pk))
+
+        # The IP budget rejects; the user token taken before it is given back
+        with self.assertLogs('ecommerce.ratelimit', 'WARNING'):
+            self.assertIsNotNone(ratelimit.check(rule, '10.0.0.1', self.user.pk))
+
+        self.assertIsNone(ratelimit.check(rule, '10.0.0.2', self.user.pk))
+
+
+class SharedCacheCheckTests(TestCase):
+    """Process-local shared caches are deploy check errors"""
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_cache_is_reported(self):
+        errors = checks.check_shared_caches(None)
+
+        self.assertEqual({error.id for error in errors}, {'ecommerce.E001'})
+        self.assertEqual(len(errors), len(checks.SHARED_CACHES))
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache'}})
+    def test_shared_cache_passes(self):
+        self.assertEqual(checks.check_shared_caches(None), [])
+
+
+class ProductWriteTests(TestCase):
+    """Product API writes notify the catalog caches once, when they commit"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('editor', is_staff=True))
+        self.product = make_product(Category.objects.create(name='Phones'), '100.00')
+
+    def test_update_invalidates_once_without_a_job(self):
+        with mock.patch.object(singleflight, 'invalidate') as invalidate:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.patch(f'/api/products/{self.product.pk}/', {'price': '90.00'}, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        invalidate.assert_called_once_with()
+        self.assertFalse(Job.objects.filter(name='product_changed').exists())
@@ -1,6 +1,11 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, ProductViewSet, OrderViewSet, UserViewSet
+from .views import (
+    CategoryViewSet, ProductViewSet, OrderViewSet, UserViewSet, CartViewSet,
+    PromotionViewSet, EventViewSet, ExportViewSet, RateLimitViewSet, AdmissionViewSet, SlowQueryViewSet
+)
+from . import async_views, snapshot
+from .async_views import read_async
 
 # Create router and register viewsets
 router = DefaultRouter()
@@ -8,9 +13,50 @@ router.register(r'categories', CategoryViewSet, basename='category')
 router.register(r'products', ProductViewSet, basename='product')
 router.register(r'orders', OrderViewSet, basename='order')
 router.register(r'users', UserViewSet, basename='user')
+router.register(r'cart', CartViewSet, basename='cart')
+router.register(r'promotions', PromotionViewSet, basename='promotion')
+router.register(r'events', EventViewSet, basename='event')
+router.register(r'export', ExportViewSet, basename='export')
+router.register(r'rate-limits', RateLimitViewSet, basename='rate-limit')
+router.register(r'admission', AdmissionViewSet, basename='admission')
+router.register(r'slow-queries', SlowQueryViewSet, basename='slow-query')
 
 app_name = 'ecommerce'
 
-urlpatterns = [
+# Catalog reads are served from the mapped snapshot when fresh, else by async
+# views; writes fall through to the viewsets
+async_catalog_urls = [
+    path('categories/', read_async(
+        async_views.category_list,
+        CategoryViewSet.as_view({'get': 'list', 'post': 'create'}, basename='category', detail=False),
+        snapshot.category_list,
+    )),
+    path('products/', read_async(
+        async_views.product_list,
+        ProductViewSet.as_view({'get': 'list', 'post': 'create'}, basename='product', detail=False),
+        snapshot.product_list,
+    )),
+    path('products/featured/', read_async(
+        async_views.product_featured,
+        ProductViewSet.as_view({'get': 'featured'}, basename='product', detail=False),
+        snapshot.product_featured,
+    )),
+    path('products/search/', read_async(
+        async_views.product_search,
+        ProductViewSet.as_view({'get': 'search'}, basename='product', detail=False)
+    )),
+    path('products/<int:pk>/', read_async(
+        async_views.product_detail,
+        ProductViewSet.as_view({
+            'get': 'retrieve', 'put': 'update',
+            'patch': 'partial_update', 'delete': 'destroy'
+        }, basename='product', detail=True),
+        snapshot.product_detail,
+    )),
+]
+
+urlpatterns = async_catalog_urls + [
+    # Before the router so "events" is not taken for an order id
+    path('orders/events/', async_views.order_events, name='order-events'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -1,12 +1,34 @@
+import io
+from datetime import timedelta
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny
+from rest_framework.parsers import MultiPartParser
+from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly, AllowAny, IsAdminUser
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Category, Product, Order, OrderItem
+from django.db import transaction
+from django.db.models import Prefetch, Count, Q
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from .models import Category, Product, Promotion, Order, OrderItem, ArchivedOrder, Cart, CartItem
+from .archive import filter_orders, order_summaries
+from .exports import EXPORTS, EXPORT_FORMATS, CONTENT_TYPES, stream_export
+from .imports import IMPORT_ENCODING, IMPORT_FORMATS, import_products
+from .inventory import restock
+from .adjustments import adjust_products, filter_products
+from .events import TICKET_MAX_AGE, issue_ticket
+from .jobs import enqueue
+from .ratelimit import SCOPES, rejection_counts
+from . import admission, analytics, querylog, singleflight
 from .serializers import (
     CategorySerializer, ProductSerializer, OrderSerializer,
-    OrderItemSerializer, CreateOrderSerializer, UserSerializer
+    OrderItemSerializer, CreateOrderSerializer, UserSerializer,
+    ArchivedOrderSerializer, OrderSummarySerializer, OrderFilterSerializer,
+    CartSerializer, CartLineSerializer, MergeCartSerializer,
+    CheckoutCartSerializer, BulkAdjustSerializer, PromotionSerializer
 )
 
 
@@ -19,10 +41,22 @@ class CategoryViewSet(viewsets.ModelViewSet):
     PUT/PATCH /api/categories/{id}/ - Update category (admin only)
     DELETE /api/categories/{id}/ - Delete category (admin only)
     """
-    queryset = Category.objects.all()
+    queryset = Category.objects.annotate(
+        active_products_count=Count('products', filter=Q(products__is_active=True))
+    )
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
+    def list(self, request, *args, **kwargs):
+        data = singleflight.get_or_compute(
+            singleflight.request_key('categories', request),
+            lambda: super(CategoryViewSet, self).list(request, *args, **kwargs).data
+        )
+        if data is None:
+            # Cached by the async view for an out-of-range page
+            raise NotFound('Invalid page.')
+        return Response(data)
+    
     @action(detail=True, methods=['get'])
     def products(self, request, pk=None):
         """Get all products in a category"""
@@ -40,8 +74,10 @@ class ProductViewSet(viewsets.ModelViewSet):
     GET /api/products/{id}/ - Retrieve product
     PUT/PATCH /api/products/{id}/ - Update product (admin only)
     DELETE /api/products/{id}/ - Delete product (admin only)
+    POST /api/products/import/ - Bulk upsert products from CSV/NDJSON (admin only)
+    POST /api/products/bulk_adjust/ - Filter-scoped price/stock/status changes (admin only)
     """
-    queryset = Product.objects.filter(is_active=True)
+    queryset = Product.objects.filter(is_active=True).select_related('category')
     serializer_class = ProductSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
     
@@ -57,9 +93,12 @@ class ProductViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def featured(self, request):
         """Get featured products (newest  8 products)"""
-        featured_products = self.get_queryset()[:8]
-        serializer = self.get_serializer(featured_products, many=True)
-        return Response(serializer.data)
+        def compute():
+            featured_products = self.get_queryset()[:8]
+            return self.get_serializer(featured_products, many=True).data
+        
+        data = singleflight.get_or_compute(singleflight.request_key('featured', request), compute)
+        return Response(data)
     
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -76,15 +115,64 @@ class ProductViewSet(viewsets.ModelViewSet):
         
         serializer = self.get_serializer(products, many=True)
         return Response(serializer.data)
+    
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='import',
+        permission_classes=[IsAdminUser],
+        parser_classes=[MultiPartParser]
+    )
+    def bulk_import(self, request):
+        """Upsert products by sku from an uploaded CSV or NDJSON file"""
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({'error': 'A file upload is required'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        import_format = request.data.get('import_format')
+        if not import_format:
+            import_format = 'ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv'
+        if import_format not in IMPORT_FORMATS:
+            return Response(
+                {'error': f'Unknown format. Choose from: {", ".join(IMPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        dry_run = request.query_params.get('dry_run', '').lower() in ('1', 'true', 'yes')
+        stream = io.TextIOWrapper(upload.file, encoding=IMPORT_ENCODING, newline='')
+        report = import_products(stream, import_format, dry_run=dry_run)
+        return Response(report.as_dict())
+    
+    @action(detail=False, methods=['post'], permission_classes=[IsAdminUser])
+    def bulk_adjust(self, request):
+        """Adjust price, stock or status of all products matching a filter"""
+        serializer = BulkAdjustSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        # Inactive products are in scope too, unlike the public listing
+        products = filter_products(Product.objects.all(), serializer.validated_data['filter'])
+        matched = products.count()
+        if serializer.validated_data['dry_run']:
+            return Response({'matched': matched, 'updated': 0, 'dry_run': True})
+        
+        updated = adjust_products(products, **serializer.adjustment())
+        return Response({'matched': matched, 'updated': updated, 'dry_run': False})
 
 
 class OrderViewSet(viewsets.ModelViewSet):
     """
     ViewSet for Order model
-    GET /api/orders/ - List user's orders
+    GET /api/orders/ - List user's orders (summaries)
     POST /api/orders/ - Create new order
-    GET /api/orders/{id}/ - Retrieve order
+    GET /api/orders/{id}/ - Retrieve order with items
     PATCH /api/orders/{id}/ - Update order status (admin only)
+    POST /api/orders/events/ticket/ - Ticket for the order events stream
+    
+    Lists return paginated summary rows and accept ?status=a,b,
+    ?created_after= and ?created_before= (ISO date or datetime).
+    They read from both the hot and the archive tables (staff lists only
+    include archived orders with ?include_archived=true); updates and
+    cancellation only ever touch hot orders.
     """
     serializer_class = OrderSerializer
     permission_classes = [IsAuthenticated]
@@ -95,21 +183,67 @@ class OrderViewSet(viewsets.ModelViewSet):
             return Order.objects.all()
         return Order.objects.filter(user=user)
     
+    def get_archive_queryset(self):
+        user = self.request.user
+        if user.is_staff:
+            return ArchivedOrder.objects.all()
+        return ArchivedOrder.objects.filter(user=user)
+    
+    def get_filters(self):
+        serializer = OrderFilterSerializer(data=self.request.query_params)
+        serializer.is_valid(raise_exception=True)
+        return serializer.validated_data
+    
+    def summary_response(self, hot, archived, filters):
+        """Paginated summary rows; one LIMITed query per page plus the count"""
+        hot = filter_orders(hot, filters)
+        if archived is not None:
+            archived = filter_orders(archived, filters)
+        page = self.paginate_queryset(order_summaries(hot, archived))
+        return self.get_paginated_response(self.get_serializer(page, many=True).data)
+    
+    def list(self, request, *args, **kwargs):
+        """List order summaries; staff see operational (hot) orders unless ?include_archived=true"""
+        filters = self.get_filters()
+        if request.user.is_staff and not filters['include_archived']:
+            return self.summary_response(self.get_queryset(), None, filters)
+        return self.summary_response(self.get_queryset(), self.get_archive_queryset(), filters)
+    
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve an order, falling back to the archive"""
+        try:
+            return super().retrieve(request, *args, **kwargs)
+        except Http404:
+            order = get_object_or_404(
+                self.get_archive_queryset().select_related('user').prefetch_related('items'),
+                pk=kwargs['pk']
+            )
+            return Response(ArchivedOrderSerializer(order, context=self.get_serializer_context()).data)
+    
     def get_serializer_class(self):
         if self.action == 'create':
             return CreateOrderSerializer
+        if self.action in ('list', 'my_orders'):
+            return OrderSummarySerializer
         return OrderSerializer
     
     def create(self, request, *args, **kwargs):
         """Create a new order"""
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        order = serializer.save()
+        with transaction.atomic():
+            order = serializer.save()
+            enqueue('send_order_confirmation', {'order_id': order.id}, dedup_key=f'order-confirmation:{order.id}')
         
         # Return order with full details
         order_serializer = OrderSerializer(order)
         return Response(order_serializer.data, status=status.HTTP_201_CREATED)
     
+    @action(detail=False, methods=['post'], url_path='events/ticket')
+    def events_ticket(self, request):
+        """Ticket for opening GET /api/orders/events/ with EventSource"""
+        return Response({'ticket': issue_ticket(request.user), 'expires_in': TICKET_MAX_AGE})
+    
     @action(detail=True, methods=['patch'])
     def cancel(self, request, pk=None):
         """Cancel an order (user can only cancel their own pending orders)"""
@@ -127,23 +261,25 @@ class OrderViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        # Restore stock
-        for item in order.items.all():
-            item.product.stock += item.quantity
-            item.product.save()
-        
-        order.status = 'cancelled'
-        order.save()
+        with transaction.atomic():
+            # Return the stock to the warehouses it was allocated from
+            restock(order.items.all())
+            
+            order.status = 'cancelled'
+            order.save()
+            enqueue('send_order_cancellation', {'order_id': order.id}, dedup_key=f'order-cancellation:{order.id}')
         
         serializer = self.get_serializer(order)
         return Response(serializer.data)
     
     @action(detail=False, methods=['get'])
     def my_orders(self, request):
-        """Get current user's orders"""
-        orders = Order.objects.filter(user=request.user)
-        serializer = self.get_serializer(orders, many=True)
-        return Response(serializer.data)
+        """Get current user's order summaries, hot and archived"""
+        return self.summary_response(
+            Order.objects.filter(user=request.user),
+            ArchivedOrder.objects.filter(user=request.user),
+            self.get_filters()
+        )
 
 
 class UserViewSet(viewsets.ReadOnlyModelViewSet):
@@ -161,4 +297,264 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     def me(self, request):
         """Get current user information"""
         serializer = self.get_serializer(request.user)
-        return Response(serializer.data)
\ No newline at end of file
+        return Response(serializer.data)
+
+
+class CartViewSet(viewsets.ViewSet):
+    """
+    ViewSet for the current user's server-side cart
+    GET /api/cart/ - Retrieve cart with running totals
+    POST /api/cart/add/ - Add a product ({product_id, quantity})
+    PATCH /api/cart/{product_id}/ - Set the quantity of a product ({quantity})
+    DELETE /api/cart/{product_id}/ - Remove a product
+    POST /api/cart/merge/ - Merge a client-side cart after login ({items})
+    POST /api/cart/clear/ - Remove all products
+    POST /api/cart/checkout/ - Convert the cart into an order
+    """
+    permission_classes = [IsAuthenticated]
+    # Product ids only: /api/cart/abc/ is a 404, not a failed int lookup
+    lookup_value_regex = '[0-9]+'
+    
+    def get_cart(self):
+        cart, _ = Cart.objects.get_or_create(user=self.request.user)
+        return cart
+    
+    def cart_response(self, cart, status_code=status.HTTP_200_OK):
+        cart.refresh_prices()
+        cart = Cart.objects.prefetch_related(
+            Prefetch('items', queryset=CartItem.objects.select_related('product__category'))
+        ).get(pk=cart.pk)
+        serializer = CartSerializer(cart, context={'request': self.request})
+        return Response(serializer.data, status=status_code)
+    
+    def list(self, request):
+        """Get the current user's cart"""
+        return self.cart_response(self.get_cart())
+    
+    @action(detail=False, methods=['post'])
+    def add(self, request):
+        """Add a product to the cart"""
+        serializer = CartLineSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart()
+        cart.add_product(
+            serializer.validated_data['product'],
+            serializer.validated_data['quantity']
+        )
+        return self.cart_response(cart)
+    
+    def partial_update(self, request, pk=None):
+        """Set the quantity of a product in the cart"""
+        serializer = CartLineSerializer(data={
+            'product_id': pk,
+            'quantity': request.data.get('quantity'),
+        })
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart()
+        cart.set_quantity(
+            serializer.validated_data['product'],
+            serializer.validated_data['quantity']
+        )
+        return self.cart_response(cart)
+    
+    def destroy(self, request, pk=None):
+        """Remove a product from the cart"""
+        cart = self.get_cart()
+        item = get_object_or_404(cart.items.select_related('product'), product_id=pk)
+        cart.remove_product(item.product)
+        return self.cart_response(cart)
+    
+    @action(detail=False, methods=['post'])
+    def merge(self, request):
+        """Merge a client-side cart into the server cart"""
+        serializer = MergeCartSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        cart = self.get_cart()
+        cart.merge(serializer.validated_data['items'])
+        return self.cart_response(cart)
+    
+    @action(detail=False, methods=['post'])
+    def clear(self, request):
+        """Remove all products from the cart"""
+        cart = self.get_cart()
+        cart.clear()
+        return self.cart_response(cart)
+    
+    @action(detail=False, methods=['post'])
+    def checkout(self, request):
+        """Place an order from the validated cart"""
+        serializer = CheckoutCartSerializer(
+            data=request.data,
+            context={'request': request, 'cart': self.get_cart()}
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            order = serializer.save()
+            enqueue('send_order_confirmation', {'order_id': order.id}, dedup_key=f'order-confirmation:{order.id}')
+        
+        order_serializer = OrderSerializer(order)
+        return Response(order_serializer.data, status=status.HTTP_201_CREATED)
+
+
+class PromotionViewSet(viewsets.ModelViewSet):
+    """
+    Promotions (admin only)
+    GET /api/promotions/ - List promotions, newest start first
+    POST /api/promotions/ - Create a product, category or cart promotion
+    GET/PUT/PATCH/DELETE /api/promotions/{id}/ - Manage a promotion
+    """
+    queryset = Promotion.objects.all()
+    serializer_class = PromotionSerializer
+    permission_classes = [IsAdminUser]
+
+
+class EventViewSet(viewsets.ViewSet):
+    """
+    Product analytics events
+    POST /api/events/ - Ingest a batch: {"view": [product ids], "impression": [product ids]}
+    GET /api/events/?hours=24 - Most viewed products and this worker's buffer stats (admin only)
+    """
+    
+    def get_permissions(self):
+        if self.action == 'create':
+            return [AllowAny()]
+        return [IsAdminUser()]
+    
+    def get_authenticators(self):
+        # Ingestion is anonymous; skip token decoding on the hot path. The
+        # action is not resolved yet when authenticators are built
+        if self.request.method == 'POST':
+            return []
+        return super().get_authenticators()
+    
+    def create(self, request):
+        try:
+            events = analytics.parse_events(request.data)
+        except ValueError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        accepted, dropped = analytics.buffer.add(events)
+        return Response({'accepted': accepted, 'dropped': dropped}, status=status.HTTP_202_ACCEPTED)
+    
+    def list(self, request):
+        try:
+            hours = max(int(request.query_params.get('hours', 24)), 1)
+        except ValueError:
+            return Response({'error': 'hours must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+        since = timezone.now() - timedelta(hours=hours)
+        return Response({
+            'hours': hours,
+            'top_products': analytics.top_products(since),
+            'buffer': analytics.buffer.snapshot(),
+        })
+
+
+class ExportViewSet(viewsets.ViewSet):
+    """
+    Streaming bulk export (admin only)
+    GET /api/export/ - List exportable resources
+    GET /api/export/{resource}/?export_format=ndjson|csv - Stream products, orders or order_items
+    Output is gzip-compressed when the client sends Accept-Encoding: gzip.
+    """
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        """List exportable resources and formats"""
+        return Response({'resources': list(EXPORTS), 'formats': list(EXPORT_FORMATS)})
+    
+    def retrieve(self, request, pk=None):
+        """Stream a resource as NDJSON or CSV"""
+        export_format = request.query_params.get('export_format', 'ndjson')
+        if pk not in EXPORTS:
+            return Response(
+                {'error': f'Unknown resource. Choose from: {", ".join(EXPORTS)}'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if export_format not in EXPORT_FORMATS:
+            return Response(
+                {'error': f'Unknown format. Choose from: {", ".join(EXPORT_FORMATS)}'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        compress = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = StreamingHttpResponse(
+            stream_export(pk, export_format, compress=compress),
+            content_type=CONTENT_TYPES[export_format]
+        )
+        extension = 'csv' if export_format == 'csv' else 'ndjson'
+        response['Content-Disposition'] = f'attachment; filename="{pk}.{extension}"'
+        if compress:
+            response['Content-Encoding'] = 'gzip'
+        response['Vary'] = 'Accept-Encoding'
+        return response
+
+
+class RateLimitViewSet(viewsets.ViewSet):
+    """
+    Rate limit configuration and rejection counters (admin only)
+    GET /api/rate-limits/ - Budgets per route and how many requests each rejected
+    """
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        rejected = rejection_counts()
+        return Response({
+            name: {
+                'path': rule['path'],
+                'methods': rule.get('methods', ['GET', 'POST']),
+                'budgets': {scope: rule[scope] for scope in SCOPES if rule.get(scope)},
+                'rejected': rejected.get(name, {}),
+            }
+            for name, rule in settings.RATE_LIMITS.items()
+        })
+
+
+class AdmissionViewSet(viewsets.ViewSet):
+    """
+    Admission control gauges and shed counters (admin only)
+    GET /api/admission/ - Per-class limits, this worker's in-flight and queue
+    depth, and requests shed by every worker
+    """
+    permission_classes = [IsAdminUser]
+    
+    def list(self, request):
+        gate = admission.get_gate()
+        snapshot = gate.snapshot()
+        shed = admission.shed_counts()
+        for name, stats in snapshot['classes'].items():
+            stats['shed_all_workers'] = shed.get(name, {})
+        snapshot['enabled'] = settings.ADMISSION_CONTROL_ENABLED
+        return Response(snapshot)
+
+
+class SlowQueryViewSet(viewsets.ViewSet):
+    """
+    Slow-query log (admin only)
+    GET /api/slow-queries/?limit=N - Recorded slow queries, newest first
+    GET /api/slow-queries/summary/ - Recorded queries grouped by fingerprint
+    DELETE /api/slow-queries/clear/ - Empty the log
+    """
+    permission_classes = [IsAdminUser]
+    
+    def get_limit(self, request):
+        try:
+            return int(request.query_params['limit'])
+        except (KeyError, ValueError):
+            return None
+    
+    def list(self, request):
+        return Response({
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'results': querylog.records(self.get_limit(request)),
+        })
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        return Response({
+            'threshold_ms': settings.SLOW_QUERY_THRESHOLD_MS,
+            'results': querylog.aggregate(querylog.records(self.get_limit(request))),
+        })
+    
+    @action(detail=False, methods=['delete'])
+    def clear(self, request):
+        querylog.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
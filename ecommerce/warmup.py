@@ -0,0 +1,221 @@
+"""
+Worker warm-up.
+
+``warm_up`` pays the one-off costs a fresh worker would otherwise put on its
+first requests: importing the URLconf and views, compiling URL patterns,
+building serializer fields (which fills Django's model ``_meta`` caches),
+opening database connections, loading the revoked refresh token filter,
+mapping the catalog snapshot and reading the catalog pages clients hit first. Each phase is timed so cold-start
+regressions show up in the report.
+"""
+import inspect
+import logging
+import os
+import time
+from importlib import import_module
+from io import BytesIO
+
+from django.conf import settings
+from django.db import connections
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework import serializers
+
+
+logger = logging.getLogger(__name__)
+
+
+class Phase:
+    def __init__(self, name):
+        self.name = name
+        self.detail = ''
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+
+    def as_dict(self):
+        return {'phase': self.name, 'ms': round(self.seconds * 1000, 1), 'detail': self.detail}
+
+
+def iter_patterns(resolver):
+    for pattern in resolver.url_patterns:
+        if isinstance(pattern, URLResolver):
+            yield pattern
+            yield from iter_patterns(pattern)
+        elif isinstance(pattern, URLPattern):
+            yield pattern
+
+
+def warm_routes():
+    """Compile every URL pattern and build the reverse lookup tables"""
+    resolver = get_resolver()
+    count = 0
+    for pattern in iter_patterns(resolver):
+        pattern.pattern.regex
+        count += 1
+    resolver.reverse_dict
+    return count
+
+
+def serializer_classes():
+    module = import_module('ecommerce.serializers')
+    for _, cls in inspect.getmembers(module, inspect.isclass):
+        if not issubclass(cls, serializers.BaseSerializer) or cls.__module__ != module.__name__:
+            continue
+        # List serializers need a child and have no fields of their own; the
+        # child class is warmed on its own
+        if issubclass(cls, serializers.ListSerializer):
+            continue
+        yield cls
+
+
+def warm_serializers():
+    """Build each serializer's fields once; ModelSerializers introspect their model"""
+    count = 0
+    for cls in serializer_classes():
+        try:
+            cls().fields
+        except Exception:
+            logger.warning('Could not build fields of %s during warm-up', cls.__name__, exc_info=True)
+            continue
+        count += 1
+    return count
+
+
+def warm_connections():
+    """Open each database connection, running the connection_created setup"""
+    for alias in settings.DATABASES:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    return len(settings.DATABASES)
+
+
+def warm_snapshot():
+    """Map the catalog snapshot, building it first when none exists yet"""
+    from . import snapshot
+
+    if not settings.CATALOG_SNAPSHOT_READS:
+        return 'disabled'
+    detail = 'mapped'
+    if not os.path.exists(settings.CATALOG_SNAPSHOT_PATH):
+        snapshot.build()
+        detail = 'built'
+    current = snapshot.current()
+    if current is None:
+        return f'{detail}, stale'
+    return f'{detail}, {current.product_count} products'
+
+
+def warm_revocations():
+    """Build the bloom filter of revoked refresh tokens"""
+    from .revocation import revocations
+
+    revocations.load()
+    return f'{revocations.filter.count} revoked tokens'
+
+
+def catalog_requests(pages, search_terms):
+    yield '/api/categories/', ''
+    yield '/api/products/featured/', ''
+    for page in range(1, pages + 1):
+        yield '/api/products/', f'page={page}' if page > 1 else ''
+    for term in search_terms:
+        yield '/api/products/search/', f'q={term}'
+
+
+def warm_catalog(pages, search_terms):
+    """
+    GET the first catalog pages through the full handler and middleware
+    stack, marked so rate limits and admission control let them through
+    """
+    from django.core.handlers.wsgi import WSGIHandler
+
+    from .middleware import WARM_UP_KEY
+
+    handler = WSGIHandler()
+    failed = []
+    count = 0
+    for path, query in catalog_requests(pages, search_terms):
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'REMOTE_ADDR': '127.0.0.1',
+            'HTTP_ACCEPT': 'application/json',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': BytesIO(),
+            'wsgi.errors': BytesIO(),
+            WARM_UP_KEY: True,
+        }
+        statuses = []
+        response = handler(environ, lambda status, headers: statuses.append(status))
+        b''.join(response)
+        response.close()
+        count += 1
+        if not statuses[0].startswith('200'):
+            failed.append(f'{path}?{query} -> {statuses[0]}')
+    return count, failed
+
+
+def warm_up(pages=None, search_terms=None, setup_seconds=None, close_connections=True):
+    """
+    Run every warm-up phase and return their timings. ``setup_seconds`` is
+    the time the caller spent in django.setup(), reported as its own phase.
+    """
+    pages = settings.WARM_CACHE_PRODUCT_PAGES if pages is None else pages
+    search_terms = settings.WARM_CACHE_SEARCH_TERMS if search_terms is None else search_terms
+    phases = []
+
+    if setup_seconds is not None:
+        setup = Phase('django setup')
+        setup.seconds = setup_seconds
+        setup.detail = f'{len(settings.INSTALLED_APPS)} apps'
+        phases.append(setup)
+
+    with Phase('imports') as phase:
+        import_module(settings.ROOT_URLCONF)
+        phase.detail = settings.ROOT_URLCONF
+    phases.append(phase)
+
+    with Phase('routes') as phase:
+        phase.detail = f'{warm_routes()} patterns'
+    phases.append(phase)
+
+    with Phase('serializers') as phase:
+        phase.detail = f'{warm_serializers()} serializers'
+    phases.append(phase)
+
+    with Phase('connections') as phase:
+        phase.detail = f'{warm_connections()} databases'
+    phases.append(phase)
+
+    with Phase('revocations') as phase:
+        phase.detail = warm_revocations()
+    phases.append(phase)
+
+    with Phase('snapshot') as phase:
+        phase.detail = warm_snapshot()
+    phases.append(phase)
+
+    with Phase('catalog') as phase:
+        count, failed = warm_catalog(pages, search_terms)
+        phase.detail = f'{count} requests' + (f', failed: {"; ".join(failed)}' if failed else '')
+    phases.append(phase)
+
+    if close_connections:
+        # Do not hand connections opened here to forked workers (gunicorn --preload)
+        connections.close_all()
+
+    report = [phase.as_dict() for phase in phases]
+    logger.info(
+        'Warm-up finished in %.1f ms: %s',
+        sum(phase.seconds for phase in phases) * 1000,
+        ', '.join(f'{entry["phase"]} {entry["ms"]} ms' for entry in report),
+    )
+    return report
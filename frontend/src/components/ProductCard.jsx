@@ -1,9 +1,29 @@
+import { useEffect, useRef } from 'react';
 import { Link } from 'react-router-dom';
+import { eventsAPI } from '../services/api';
 import '../ProductCard.css';
 
 const ProductCard = ({ product }) => {
+  const cardRef = useRef(null);
+
+  // Count an impression once the card is at least half on screen
+  useEffect(() => {
+    const card = cardRef.current;
+    if (!card || typeof IntersectionObserver === 'undefined') {
+      return undefined;
+    }
+    const observer = new IntersectionObserver((entries) => {
+      if (entries.some((entry) => entry.isIntersecting)) {
+        eventsAPI.track('impression', product.id);
+        observer.disconnect();
+      }
+    }, { threshold: 0.5 });
+    observer.observe(card);
+    return () => observer.disconnect();
+  }, [product.id]);
+
   return (
-    <div className="product-card">
+    <div className="product-card" ref={cardRef}>
       <Link to={`/products/${product.id}`} className="product-link">
         <div className="product-image-container">
           {product.image ? (
@@ -40,12 +60,12 @@ const ProductCard = ({ product }) => {
           <div className="product-price-section">
             <p className="product-price">
               <span className="currency">KSh</span>
-              {product.price?.toLocaleString()}
+              {(product.sale_price ?? product.price)?.toLocaleString()}
             </p>
             
-            {product.old_price && (
+            {product.sale_price != null && (
               <p className="product-old-price">
-                KSh {product.old_price?.toLocaleString()}
+                KSh {product.price?.toLocaleString()}
               </p>
             )}
           </div>
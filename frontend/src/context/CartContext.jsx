@@ -1,4 +1,6 @@
 import { createContext, useContext, useState, useEffect } from 'react';
+import { useAuth } from './AuthContext';
+import { cartAPI } from '../services/api';
 
 const CartContext = createContext(null);
 
@@ -10,23 +12,76 @@ export const useCart = () => {
   return context;
 };
 
+const loadLocalCart = () => {
+  try {
+    return JSON.parse(localStorage.getItem('cart')) || [];
+  } catch {
+    return [];
+  }
+};
+
+// Server cart lines in the shape the pages use for local ones
+const toCartItem = (item) => ({
+  id: item.product,
+  name: item.product_name,
+  image: item.product_image,
+  category_name: item.category_name,
+  stock: item.stock,
+  price: Number(item.sale_price ?? item.unit_price),
+  quantity: item.quantity,
+});
+
 export const CartProvider = ({ children }) => {
-  const [cart, setCart] = useState([]);
+  const { isAuthenticated } = useAuth();
+  // Guests keep the cart in localStorage; logged-in users use the server cart
+  const [cart, setCart] = useState(loadLocalCart);
+  const [serverTotals, setServerTotals] = useState(null);
+
+  const applyServerCart = (data) => {
+    setCart(data.items.map(toCartItem));
+    setServerTotals({ total: Number(data.total), savings: Number(data.savings) });
+    return data;
+  };
 
-  // Load cart from localStorage on mount
+  // After login, merge the guest cart into the server cart and switch to it
   useEffect(() => {
-    const savedCart = localStorage.getItem('cart');
-    if (savedCart) {
-      setCart(JSON.parse(savedCart));
+    if (!isAuthenticated) {
+      setServerTotals(null);
+      setCart(loadLocalCart());
+      return;
     }
-  }, []);
-
-  // Save cart to localStorage whenever it changes
+    const local = loadLocalCart();
+    const request = local.length
+      ? cartAPI.merge(local.map((item) => ({ product_id: item.id, quantity: item.quantity })))
+      : cartAPI.get();
+    request
+      .then((data) => {
+        localStorage.removeItem('cart');
+        applyServerCart(data);
+      })
+      .catch((error) => console.error('Error loading cart:', error));
+  }, [isAuthenticated]);
+
+  // Save the guest cart to localStorage whenever it changes
   useEffect(() => {
-    localStorage.setItem('cart', JSON.stringify(cart));
-  }, [cart]);
+    if (!isAuthenticated) {
+      localStorage.setItem('cart', JSON.stringify(cart));
+    }
+  }, [cart, isAuthenticated]);
+
+  const syncServerCart = async (request) => {
+    try {
+      return applyServerCart(await request());
+    } catch (error) {
+      console.error('Error updating cart:', error);
+      throw error;
+    }
+  };
 
   const addToCart = (product, quantity = 1) => {
+    if (isAuthenticated) {
+      return syncServerCart(() => cartAPI.add(product.id, quantity));
+    }
     setCart((prevCart) => {
       const existingItem = prevCart.find((item) => item.id === product.id);
 
@@ -43,13 +98,18 @@ export const CartProvider = ({ children }) => {
   };
 
   const removeFromCart = (productId) => {
+    if (isAuthenticated) {
+      return syncServerCart(() => cartAPI.remove(productId));
+    }
     setCart((prevCart) => prevCart.filter((item) => item.id !== productId));
   };
 
   const updateQuantity = (productId, quantity) => {
     if (quantity <= 0) {
-      removeFromCart(productId);
-      return;
+      return removeFromCart(productId);
+    }
+    if (isAuthenticated) {
+      return syncServerCart(() => cartAPI.update(productId, quantity));
     }
 
     setCart((prevCart) =>
@@ -60,13 +120,32 @@ export const CartProvider = ({ children }) => {
   };
 
   const clearCart = () => {
+    if (isAuthenticated) {
+      return syncServerCart(() => cartAPI.clear());
+    }
     setCart([]);
   };
 
+  // Places the order from the server cart, which the server then empties
+  const checkout = async (checkoutData) => {
+    const order = await cartAPI.checkout(checkoutData);
+    setCart([]);
+    setServerTotals({ total: 0, savings: 0 });
+    return order;
+  };
+
+  // What checkout charges: promotions included for the server cart
   const getCartTotal = () => {
+    if (serverTotals) {
+      return serverTotals.total;
+    }
     return cart.reduce((total, item) => total + item.price * item.quantity, 0);
   };
 
+  const getCartSavings = () => {
+    return serverTotals ? serverTotals.savings : 0;
+  };
+
   const getCartCount = () => {
     return cart.reduce((count, item) => count + item.quantity, 0);
   };
@@ -77,9 +156,11 @@ export const CartProvider = ({ children }) => {
     removeFromCart,
     updateQuantity,
     clearCart,
+    checkout,
     getCartTotal,
+    getCartSavings,
     getCartCount,
   };
 
   return <CartContext.Provider value={value}>{children}</CartContext.Provider>;
-};
\ No newline at end of file
+};
@@ -2,12 +2,11 @@ import { useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { useCart } from '../context/CartContext';
 import { useAuth } from '../context/AuthContext';
-import { ordersAPI } from '../services/api';
 import '../Checkout.css'; // Import the CSS file
 
 const Checkout = () => {
   const navigate = useNavigate();
-  const { cart, getCartTotal, clearCart } = useCart();
+  const { cart, getCartTotal, getCartSavings, checkout } = useCart();
   const { isAuthenticated } = useAuth();
   const [loading, setLoading] = useState(false);
   const [formData, setFormData] = useState({
@@ -61,23 +60,16 @@ const Checkout = () => {
     setLoading(true);
 
     try {
-      const orderData = {
-        ...formData,
-        items: cart.map((item) => ({
-          product_id: item.id,
-          quantity: item.quantity,
-        })),
-      };
-
-      const order = await ordersAPI.create(orderData);
-      clearCart();
+      // The server prices and allocates the cart it holds for this user
+      const order = await checkout(formData);
       
       // Show success message
       alert('Order placed successfully!');
       navigate(`/orders/${order.id}`);
     } catch (error) {
       console.error('Error creating order:', error);
-      alert(error.response?.data?.error || 'Failed to create order');
+      const data = error.response?.data;
+      alert(data?.error || (Array.isArray(data) ? data[0] : data?.non_field_errors?.[0]) || 'Failed to create order');
     } finally {
       setLoading(false);
     }
@@ -226,7 +218,7 @@ const Checkout = () => {
             <div className="summary-calculations">
               <div className="summary-row">
                 <span>Subtotal</span>
-                <span>{formatPrice(getCartTotal())}</span>
+                <span>{formatPrice(getCartTotal() + getCartSavings())}</span>
               </div>
               <div className="summary-row">
                 <span>Shipping</span>
@@ -234,7 +226,7 @@ const Checkout = () => {
               </div>
               <div className="summary-row discount">
                 <span>Discount</span>
-                <span>- {formatPrice(0)}</span>
+                <span>- {formatPrice(getCartSavings())}</span>
               </div>
             </div>
 
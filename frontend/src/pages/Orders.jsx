@@ -7,7 +7,10 @@ import '../Orders.css'; // Import the CSS file
 const Orders = () => {
   const { isAuthenticated } = useAuth();
   const [orders, setOrders] = useState([]);
+  const [totalCount, setTotalCount] = useState(0);
+  const [nextPage, setNextPage] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [cancellingId, setCancellingId] = useState(null);
 
   useEffect(() => {
@@ -16,10 +19,26 @@ const Orders = () => {
     }
   }, [isAuthenticated]);
 
+  // Apply status changes pushed by the server instead of refetching
+  useEffect(() => {
+    if (!isAuthenticated) {
+      return undefined;
+    }
+    return ordersAPI.subscribeToStatus(({ order_id, status }) => {
+      setOrders((prevOrders) =>
+        prevOrders.map((order) =>
+          order.id === order_id ? { ...order, status } : order
+        )
+      );
+    });
+  }, [isAuthenticated]);
+
   const fetchOrders = async () => {
     try {
       const data = await ordersAPI.getMyOrders();
-      setOrders(data);
+      setOrders(data.results);
+      setTotalCount(data.count);
+      setNextPage(data.next ? 2 : null);
     } catch (error) {
       console.error('Error fetching orders:', error);
     } finally {
@@ -27,6 +46,20 @@ const Orders = () => {
     }
   };
 
+  const loadMoreOrders = async () => {
+    setLoadingMore(true);
+    try {
+      const data = await ordersAPI.getMyOrders({ page: nextPage });
+      setOrders((prevOrders) => [...prevOrders, ...data.results]);
+      setTotalCount(data.count);
+      setNextPage(data.next ? nextPage + 1 : null);
+    } catch (error) {
+      console.error('Error fetching orders:', error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleCancelOrder = async (orderId) => {
     if (window.confirm('Are you sure you want to cancel this order?')) {
       setCancellingId(orderId);
@@ -155,7 +188,7 @@ const Orders = () => {
       <div className="orders-header">
         <div className="header-content">
           <h1>My Orders</h1>
-          <p className="orders-count">You have {orders.length} {orders.length === 1 ? 'order' : 'orders'}</p>
+          <p className="orders-count">You have {totalCount} {totalCount === 1 ? 'order' : 'orders'}</p>
         </div>
         <Link to="/products" className="btn-shop">
           <i className="fas fa-plus"></i>
@@ -185,39 +218,12 @@ const Orders = () => {
               </div>
             </div>
 
-            {/* Order Items */}
-            <div className="order-items">
-              {order.items?.map((item) => (
-                <div key={item.id} className="order-item">
-                  <div className="item-info">
-                    <div className="item-image">
-                      {item.product_image ? (
-                        <img src={item.product_image} alt={item.product_name} />
-                      ) : (
-                        <i className="fas fa-box"></i>
-                      )}
-                    </div>
-                    <div className="item-details">
-                      <h4>{item.product_name}</h4>
-                      <p className="item-meta">
-                        <span>Qty: {item.quantity}</span>
-                        <span className="item-price">{formatPrice(item.price)}</span>
-                      </p>
-                    </div>
-                  </div>
-                  <div className="item-subtotal">
-                    {formatPrice(item.subtotal)}
-                  </div>
-                </div>
-              ))}
-            </div>
-
             {/* Order Footer */}
             <div className="order-footer">
               <div className="order-summary">
                 <div className="summary-row">
                   <span>Total Items:</span>
-                  <span>{order.items?.length || 0}</span>
+                  <span>{order.item_count}</span>
                 </div>
                 <div className="summary-row">
                   <span>Shipping:</span>
@@ -277,6 +283,14 @@ const Orders = () => {
         ))}
       </div>
 
+      {nextPage && (
+        <div className="orders-load-more">
+          <button onClick={loadMoreOrders} className="btn-view" disabled={loadingMore}>
+            {loadingMore ? 'Loading...' : 'Load more orders'}
+          </button>
+        </div>
+      )}
+
       {/* Order Statistics */}
       <div className="order-stats">
         <div className="stat-card">
@@ -284,7 +298,7 @@ const Orders = () => {
             <i className="fas fa-shopping-bag"></i>
           </div>
           <div className="stat-details">
-            <span className="stat-value">{orders.length}</span>
+            <span className="stat-value">{totalCount}</span>
             <span className="stat-label">Total Orders</span>
           </div>
         </div>
@@ -1,6 +1,6 @@
 import { useState, useEffect } from 'react';
 import { useParams, useNavigate, Link } from 'react-router-dom';
-import { productsAPI } from '../services/api';
+import { productsAPI, eventsAPI } from '../services/api';
 import { useCart } from '../context/CartContext';
 import { useAuth } from '../context/AuthContext';
 import '../ProductDetail.css'; // Import the CSS file
@@ -24,6 +24,7 @@ const ProductDetail = () => {
     try {
       const data = await productsAPI.getById(id);
       setProduct(data);
+      eventsAPI.track('view', data.id);
     } catch (error) {
       console.error('Error fetching product:', error);
     } finally {
@@ -137,7 +138,10 @@ const ProductDetail = () => {
           <div className="price-section">
             <div className="price-main">
               <span className="price-label">Price:</span>
-              <span className="price-amount">{formatPrice(product.price)}</span>
+              <span className="price-amount">{formatPrice(product.sale_price ?? product.price)}</span>
+              {product.sale_price != null && (
+                <span className="price-old">{formatPrice(product.price)}</span>
+              )}
             </div>
             {product.in_stock && (
               <div className="stock-badge in-stock">
@@ -225,7 +229,7 @@ const ProductDetail = () => {
               {/* Subtotal */}
               <div className="subtotal">
                 <span>Subtotal:</span>
-                <span className="subtotal-amount">{formatPrice(product.price * quantity)}</span>
+                <span className="subtotal-amount">{formatPrice((product.sale_price ?? product.price) * quantity)}</span>
               </div>
 
               {/* Action Buttons */}
@@ -137,10 +137,134 @@ export const ordersAPI = {
     return response.data;
   },
   
-  getMyOrders: async () => {
-    const response = await api.get('/orders/my_orders/');
+  // Paginated summaries ({id, status, total_amount, item_count, created_at});
+  // params: page, status, created_after, created_before
+  getMyOrders: async (params = {}) => {
+    const response = await api.get('/orders/my_orders/', { params });
     return response.data;
   },
+  
+  // Server-Sent Events stream of status changes (EventSource cannot send
+  // headers, so the access token goes in the query string)
+  // EventSource cannot send headers, so the stream is opened with a
+  // short-lived ticket; a fresh one is fetched whenever it reconnects
+  subscribeToStatus: (onStatus) => {
+    let source = null;
+    let closed = false;
+    let lastEventId = null;
+
+    const connect = async () => {
+      const response = await api.post('/orders/events/ticket/');
+      if (closed) {
+        return;
+      }
+      const params = new URLSearchParams({ ticket: response.data.ticket });
+      if (lastEventId) {
+        params.set('last_event_id', lastEventId);
+      }
+      source = new EventSource(`${API_BASE_URL}/orders/events/?${params}`);
+      source.addEventListener('order_status', (event) => {
+        lastEventId = event.lastEventId;
+        onStatus(JSON.parse(event.data));
+      });
+      // The browser retries with the same URL, whose ticket has expired
+      source.onerror = () => {
+        if (source.readyState === EventSource.CLOSED && !closed) {
+          setTimeout(reconnect, 3000);
+        }
+      };
+    };
+
+    const reconnect = () => connect().catch(() => setTimeout(reconnect, 3000));
+
+    reconnect();
+    return () => {
+      closed = true;
+      if (source) {
+        source.close();
+      }
+    };
+  },
+};
+
+// Cart API
+export const cartAPI = {
+  get: async () => {
+    const response = await api.get('/cart/');
+    return response.data;
+  },
+  
+  add: async (productId, quantity = 1) => {
+    const response = await api.post('/cart/add/', {
+      product_id: productId,
+      quantity,
+    });
+    return response.data;
+  },
+  
+  update: async (productId, quantity) => {
+    const response = await api.patch(`/cart/${productId}/`, { quantity });
+    return response.data;
+  },
+  
+  remove: async (productId) => {
+    const response = await api.delete(`/cart/${productId}/`);
+    return response.data;
+  },
+  
+  merge: async (items) => {
+    const response = await api.post('/cart/merge/', { items });
+    return response.data;
+  },
+  
+  clear: async () => {
+    const response = await api.post('/cart/clear/');
+    return response.data;
+  },
+  
+  checkout: async (checkoutData) => {
+    const response = await api.post('/cart/checkout/', checkoutData);
+    return response.data;
+  },
+};
+
+// Analytics events: product views and impressions are queued and sent in
+// batches ({view: [ids], impression: [ids]}) rather than one request each
+const EVENT_FLUSH_INTERVAL = 5000;
+const EVENT_FLUSH_SIZE = 200;
+let eventQueue = { view: [], impression: [] };
+let eventTimer = null;
+
+const flushEvents = () => {
+  clearTimeout(eventTimer);
+  eventTimer = null;
+  if (!eventQueue.view.length && !eventQueue.impression.length) {
+    return;
+  }
+  const body = JSON.stringify(eventQueue);
+  eventQueue = { view: [], impression: [] };
+  // keepalive lets the last batch go out while the page unloads
+  fetch(`${API_BASE_URL}/events/`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body,
+    keepalive: true,
+  }).catch(() => {});
+};
+
+if (typeof window !== 'undefined') {
+  window.addEventListener('pagehide', flushEvents);
+}
+
+export const eventsAPI = {
+  track: (kind, productId) => {
+    eventQueue[kind].push(productId);
+    if (eventQueue.view.length + eventQueue.impression.length >= EVENT_FLUSH_SIZE) {
+      flushEvents();
+    } else if (!eventTimer) {
+      eventTimer = setTimeout(flushEvents, EVENT_FLUSH_INTERVAL);
+    }
+  },
 };
 
 export default api;
\ No newline at end of file
@@ -8,9 +8,39 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
 import os
+import time
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mkuru_shop.settings')
+# Persistent connections are not closed under ASGI (see DATABASE_CONN_MAX_AGE)
+os.environ.setdefault('DATABASE_CONN_MAX_AGE', '0')
+# Async catalog views only pay off on an event loop (see ASYNC_CATALOG_READS)
+os.environ.setdefault('ASYNC_CATALOG_READS', 'true')
 
+_setup_started = time.perf_counter()
 application = get_asgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_ON_STARTUP:
+    import threading  # noqa: E402
+
+    from ecommerce.warmup import warm_up  # noqa: E402
+
+    _warm_errors = []
+
+    def _warm():
+        try:
+            warm_up(setup_seconds=time.perf_counter() - _setup_started)
+        except Exception as exc:
+            _warm_errors.append(exc)
+
+    # ASGI servers may import this module inside a running event loop, where
+    # the ORM raises SynchronousOnlyOperation: warm up on a plain thread and
+    # wait for it before the application is served.
+    _warm_thread = threading.Thread(target=_warm, name='asgi-warm-up')
+    _warm_thread.start()
+    _warm_thread.join()
+    if _warm_errors:
+        raise _warm_errors[0]
@@ -38,8 +38,12 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # CORS middleware
+    'ecommerce.middleware.RateLimitMiddleware',  # Token buckets for expensive routes
+    'ecommerce.middleware.AdmissionControlMiddleware',  # Priority queues / load shedding
+    'ecommerce.middleware.QueryLogMiddleware',  # Attributes slow queries to views
+    'ecommerce.middleware.ReplicaRoutingMiddleware',  # Replica reads / read-your-writes
+    'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
@@ -65,18 +69,125 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'mkuru_shop.wsgi.application'
+ASGI_APPLICATION = 'mkuru_shop.asgi.application'
+
+# Serve catalog GET endpoints from the async views in ecommerce/async_views.py.
+# Only pays off under ASGI servers (e.g. `uvicorn mkuru_shop.asgi:application`),
+# so asgi.py turns it on; under WSGI async views add per-request overhead.
+ASYNC_CATALOG_READS = os.environ.get('ASYNC_CATALOG_READS', 'false').lower() == 'true'
+
+# Shared catalog snapshot (ecommerce.snapshot): a memory-mapped file every
+# worker on the host reads categories and active products from. Catalog
+# writes queue a rebuild after CATALOG_SNAPSHOT_REBUILD_DELAY seconds and
+# fall back to the database meanwhile; stock-only changes may be served
+# stale for up to CATALOG_SNAPSHOT_MAX_LAG seconds.
+CATALOG_SNAPSHOT_READS = os.environ.get('CATALOG_SNAPSHOT_READS', 'true').lower() == 'true'
+CATALOG_SNAPSHOT_PATH = os.environ.get('CATALOG_SNAPSHOT_PATH', str(BASE_DIR / 'catalog.snapshot'))
+CATALOG_SNAPSHOT_REBUILD_DELAY = 2
+CATALOG_SNAPSHOT_MAX_LAG = 30
+
+# Single-flight caching (ecommerce.singleflight) of the category list and
+# featured products: one computation per key at a time across all workers
+# (the lock and the catalog generation live in SINGLE_FLIGHT_CACHE, which
+# every worker must share via REDIS_URL; see ecommerce.checks), and
+# expired or invalidated entries are served stale for up to
+# SINGLE_FLIGHT_STALE_SECONDS while one request refreshes them.
+SINGLE_FLIGHT_ENABLED = os.environ.get('SINGLE_FLIGHT_ENABLED', 'true').lower() == 'true'
+SINGLE_FLIGHT_CACHE = 'default'
+SINGLE_FLIGHT_TTL = 30
+SINGLE_FLIGHT_STALE_SECONDS = 300
+SINGLE_FLIGHT_LOCK_TIMEOUT = 10
+SINGLE_FLIGHT_LOCK_WAIT = 5
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Seconds a connection is reused across requests. asgi.py defaults this to 0:
+# under ASGI the request signals that close expired connections do not run on
+# the threads sync views use, so persistent connections would never be closed.
+DATABASE_CONN_MAX_AGE = int(os.environ.get('DATABASE_CONN_MAX_AGE', '600'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'timeout': 20,
+        },
+    }
+}
+
+# Read replicas, as a comma-separated list of SQLite files kept in sync with
+# `python manage.py refresh_replicas`. Each becomes alias replica1, replica2, ...
+DATABASE_REPLICAS = [path for path in os.environ.get('DATABASE_REPLICAS', '').split(',') if path]
+
+for index, path in enumerate(DATABASE_REPLICAS, start=1):
+    DATABASES[f'replica{index}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'CONN_MAX_AGE': DATABASE_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
     }
+
+DATABASE_ROUTERS = ['ecommerce.routers.ReplicaRouter']
+
+# Models whose reads may be served by replicas during safe requests
+REPLICA_READ_MODELS = ['ecommerce.Category', 'ecommerce.Product']
+
+# After a write, the client's reads stay on the primary for this long. The
+# pin lives in REPLICA_PIN_CACHE, which every worker must share (REDIS_URL).
+REPLICA_STICKY_SECONDS = 10
+REPLICA_PIN_CACHE = 'default'
+
+# Applied to every new SQLite connection (see ecommerce.db.configure_sqlite)
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'cache_size': -20000,  # KiB
+    'mmap_size': 134217728,
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
 }
 
+# Online backups (ecommerce.backups, `python manage.py backup_db`): the
+# database is copied BACKUP_PAGES_PER_STEP pages at a time with
+# BACKUP_STEP_SLEEP seconds between steps, checked, gzipped and rotated down
+# to the newest BACKUP_KEEP files. run_workers schedules one every
+# BACKUP_INTERVAL seconds (0 disables). While a backup runs, the write lock
+# is probed every BACKUP_PROBE_INTERVAL seconds to measure writer stalls.
+BACKUP_DIR = os.environ.get('BACKUP_DIR', str(BASE_DIR / 'backups'))
+BACKUP_PAGES_PER_STEP = 256
+BACKUP_STEP_SLEEP = 0.005
+BACKUP_COMPRESS = True
+BACKUP_KEEP = 7
+BACKUP_INTERVAL = int(os.environ.get('BACKUP_INTERVAL', '86400'))
+BACKUP_PROBE_INTERVAL = 0.01
+
+
+# Cache shared by all workers (replica pins, rate limit buckets). Set REDIS_URL
+# in production: the local-memory fallback is private to each process, and
+# `manage.py check --deploy` reports it as an error (ecommerce.checks).
+REDIS_URL = os.environ.get('REDIS_URL')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -115,6 +226,23 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# collectstatic writes content-hashed names plus .gz (and .br with the brotli
+# package) variants; see ecommerce.storage
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'ecommerce.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Serve STATIC_ROOT and MEDIA_ROOT from Django (ecommerce.assets). Turn off
+# when a web server or CDN in front of the app serves them instead.
+SERVE_ASSETS = os.environ.get('SERVE_ASSETS', 'true').lower() == 'true'
+STATIC_MAX_AGE = 60 * 60  # unhashed static names; hashed ones are immutable
+MEDIA_MAX_AGE = 24 * 60 * 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -160,6 +288,9 @@ SIMPLE_JWT = {
     
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
+    
+    # Rotation revokes the old refresh token without the token_blacklist app
+    'TOKEN_REFRESH_SERIALIZER': 'ecommerce.serializers.RevocableTokenRefreshSerializer',
 }
 
 
@@ -192,4 +323,139 @@ CORS_ALLOW_HEADERS = [
     'user-agent',
     'x-csrftoken',
     'x-requested-with',
-]
\ No newline at end of file
+]
+
+
+# Background jobs (ecommerce.jobs, run with `python manage.py run_workers`)
+JOB_VISIBILITY_TIMEOUT = 300  # seconds a claimed job is leased before redelivery
+JOB_MAX_ATTEMPTS = 5
+JOB_RETRY_BACKOFF = 10  # seconds, doubled on every retry
+JOB_RETRY_BACKOFF_MAX = 3600
+JOB_RETENTION_DAYS = 7
+
+
+# Email (order notifications are sent by background jobs)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = 'orders@mkurushop.com'
+
+
+# Order archive (moved by `python manage.py archive_orders`)
+ORDER_ARCHIVE_AFTER_DAYS = 180  # delivered/cancelled orders untouched for this long
+
+
+# Token-bucket rate limits (ecommerce.ratelimit), keyed by exact path. Each
+# budget is "capacity/period": bursts of up to capacity requests, refilled
+# evenly over the period. "user" buckets key on the user id of a valid bearer
+# token or session and fall back to the client IP; "route" is one bucket
+# shared by everyone.
+RATE_LIMITS = {
+    'auth-token': {
+        'path': '/api/token/',
+        'methods': ['POST'],
+        'ip': '10/min',
+        'route': '600/min',
+    },
+    'product-search': {
+        'path': '/api/products/search/',
+        'methods': ['GET'],
+        'user': '30/min',
+        'ip': '120/min',
+    },
+    'order-create': {
+        'path': '/api/orders/',
+        'methods': ['POST'],
+        'user': '10/min',
+        'ip': '30/min',
+    },
+}
+RATE_LIMIT_CACHE = 'default'
+# Behind a reverse proxy, e.g. 'HTTP_X_FORWARDED_FOR' (first address is used)
+RATE_LIMIT_IP_HEADER = os.environ.get('RATE_LIMIT_IP_HEADER')
+
+
+# Admission control (ecommerce.admission): each worker process admits at most
+# ADMISSION_CAPACITY requests at once; keep it below the worker's threads so
+# the excess waits in priority order instead of for a thread. Classes have a
+# concurrency limit, a bounded queue and a queue timeout in seconds, and
+# "reserved" slots only higher-priority classes use. ADMISSION_ROUTES map
+# path regexes (and methods) to classes, first match wins; class None
+# bypasses admission control (long-lived streams, static files).
+ADMISSION_CONTROL_ENABLED = os.environ.get('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+ADMISSION_CAPACITY = int(os.environ.get('ADMISSION_CAPACITY', '16'))
+ADMISSION_CLASSES = {
+    'critical': {'priority': 0, 'limit': 16, 'reserved': 4, 'queue': 64, 'timeout': 5.0},
+    'default': {'priority': 1, 'limit': 12, 'queue': 32, 'timeout': 2.0},
+    'browse': {'priority': 2, 'limit': 8, 'queue': 32, 'timeout': 0.5},
+}
+ADMISSION_ROUTES = [
+    {'path': r'^/api/orders/events/$', 'class': None},
+    {'path': r'^/(static|media)/', 'class': None},
+    {'path': r'^/api/orders/$', 'methods': ['POST'], 'class': 'critical'},
+    {'path': r'^/api/cart/checkout/$', 'methods': ['POST'], 'class': 'critical'},
+    {'path': r'^/api/token/(refresh/)?$', 'methods': ['POST'], 'class': 'critical'},
+    {'path': r'^/api/(products|categories)/', 'methods': ['GET', 'HEAD'], 'class': 'browse'},
+    {'path': r'^/api/events/$', 'methods': ['POST'], 'class': 'browse'},
+]
+ADMISSION_DEFAULT_CLASS = 'default'
+# Shed counts for all workers; must be shared (ecommerce.checks)
+ADMISSION_CACHE = 'default'
+
+
+# Product view/impression ingestion (ecommerce.analytics): events are counted
+# in memory per product, kind and minute and bulk inserted into ProductEvent
+# every ANALYTICS_FLUSH_SECONDS, or sooner after ANALYTICS_FLUSH_EVENTS
+# events. Past ANALYTICS_SAMPLE_ABOVE of ANALYTICS_MAX_KEYS buffered counters,
+# new counters are sampled 1 in ANALYTICS_SAMPLE_RATE; at the limit, dropped.
+ANALYTICS_FLUSH_SECONDS = 5
+ANALYTICS_FLUSH_EVENTS = 50000
+ANALYTICS_MAX_KEYS = 100000
+ANALYTICS_SAMPLE_ABOVE = 0.75
+ANALYTICS_SAMPLE_RATE = 10
+ANALYTICS_MAX_BATCH = 1000
+
+
+# Promotions (ecommerce.promotions): each process compiles the active
+# promotions into lookup tables and recompiles when one starts or ends, or
+# when the promotions in the database change. Catalog reads check for changes
+# at most every PROMOTIONS_RECHECK_SECONDS; checkout checks on every order.
+PROMOTIONS_RECHECK_SECONDS = 2
+
+
+# Warehouses (ecommerce.inventory): orders are allocated to as few warehouses
+# as possible, searching every combination while there are at most
+# ALLOCATION_EXACT_LIMIT of a given size and greedily beyond that. Direct
+# edits of Product.stock apply to the DEFAULT_WAREHOUSE_CODE warehouse.
+DEFAULT_WAREHOUSE_CODE = 'main'
+ALLOCATION_EXACT_LIMIT = 5000
+
+
+# Refresh token revocation (ecommerce.revocation): rotation revokes the old
+# refresh token in RevokedToken; each process checks JTIs against a bloom
+# filter sized for TOKEN_REVOCATION_CAPACITY entries at the given false
+# positive rate, reads new revocations every TOKEN_REVOCATION_SYNC_SECONDS,
+# and the purge_revoked_tokens job deletes expired rows every
+# TOKEN_REVOCATION_PURGE_INTERVAL seconds.
+TOKEN_REVOCATION_CAPACITY = 100000
+TOKEN_REVOCATION_ERROR_RATE = 0.001
+TOKEN_REVOCATION_SYNC_SECONDS = 5
+TOKEN_REVOCATION_PURGE_INTERVAL = 3600
+TOKEN_REVOCATION_PURGE_GRACE = 300
+
+
+# Slow-query log (ecommerce.querylog): queries at or above the threshold are
+# recorded with their EXPLAIN QUERY PLAN into a ring buffer in the cache,
+# which must be shared for `manage.py slow_queries` to see the web workers'.
+# Set SLOW_QUERY_THRESHOLD_MS to "off" to disable the recorder.
+_slow_query_threshold = os.environ.get('SLOW_QUERY_THRESHOLD_MS', '100')
+SLOW_QUERY_THRESHOLD_MS = None if _slow_query_threshold == 'off' else float(_slow_query_threshold)
+SLOW_QUERY_LOG_SIZE = 500
+SLOW_QUERY_EXPLAIN = True
+SLOW_QUERY_CACHE = 'default'
+
+
+# Worker warm-up (ecommerce.warmup). With WARM_ON_STARTUP=true the WSGI/ASGI
+# entry points warm each worker before it serves traffic; `python manage.py
+# warm_cache` runs the same phases and prints their timings.
+WARM_ON_STARTUP = os.environ.get('WARM_ON_STARTUP', 'false').lower() == 'true'
+WARM_CACHE_PRODUCT_PAGES = 3
+WARM_CACHE_SEARCH_TERMS = ['samsung', 'laptop', 'tv', 'dress', 'sneakers']
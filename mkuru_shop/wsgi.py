@@ -8,9 +8,18 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
 import os
+import time
 
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mkuru_shop.settings')
 
+_setup_started = time.perf_counter()
 application = get_wsgi_application()
+
+from django.conf import settings  # noqa: E402
+
+if settings.WARM_ON_STARTUP:
+    from ecommerce.warmup import warm_up  # noqa: E402
+
+    warm_up(setup_seconds=time.perf_counter() - _setup_started)